@@ -1,10 +1,15 @@
+import asyncio
 import logging
+import re
+import threading
 import time
-from contextlib import contextmanager
-from typing import Optional, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 import oracledb
 
+from utils.cache import MapaIdentidad
+
 
 logger = logging.getLogger(__name__)
 
@@ -15,15 +20,191 @@ if not logger.handlers:
     logger.setLevel(logging.INFO)
 
 
+ORA_UNICO = 1
+ORA_SIN_PADRE = 2291
+MAX_IN = 1000
+
+CREADO = "creado"
+DUPLICADO = "duplicado"
+ERROR = "error"
+
+
+class ResultadoGuardado(NamedTuple):
+    estado: str
+    id: Any
+    mensaje: str = ""
+
+    @property
+    def creado(self) -> bool:
+        return self.estado == CREADO
+
+
+def codigo_error_oracle(e: BaseException) -> Optional[int]:
+    if isinstance(e, oracledb.DatabaseError) and e.args:
+        return getattr(e.args[0], "code", None)
+    return None
+
+
+# "ORA-00001: unique constraint (ESQUEMA.RESTRICCION) violated"
+_RESTRICCION = re.compile(r"\(([^.()]+)\.([^.()]+)\)")
+_TABLA_DESTINO = re.compile(r"\binto\s+(\w+)", re.IGNORECASE)
+
+CONSULTA_TIPO_RESTRICCION = "SELECT constraint_type FROM all_constraints WHERE owner = :1 AND constraint_name = :2"
+
+
+def restriccion_violada(e: BaseException) -> Optional[Tuple[str, str]]:
+    # (dueño, nombre) de la restricción que nombra el mensaje de Oracle
+    coincidencia = _RESTRICCION.search(str(e))
+    return coincidencia.groups() if coincidencia else None
+
+
+def tabla_destino(consulta: str) -> Optional[str]:
+    # tabla del primer INSERT/MERGE INTO de la consulta
+    coincidencia = _TABLA_DESTINO.search(consulta)
+    return coincidencia.group(1).lower() if coincidencia else None
+
+
+def mensaje_id_en_uso(tabla: Optional[str]) -> str:
+    return f"El id generado para {tabla} ya estaba en uso; la secuencia quedó atrás de los ids cargados"
+
+
+def resultado_error(
+    e: BaseException,
+    id_item: Any,
+    mensaje_duplicado: str,
+    mensaje_sin_padre: Optional[str] = None,
+) -> ResultadoGuardado:
+    codigo = codigo_error_oracle(e)
+    if codigo == ORA_UNICO:
+        return ResultadoGuardado(DUPLICADO, id_item, mensaje_duplicado)
+    if codigo == ORA_SIN_PADRE and mensaje_sin_padre:
+        return ResultadoGuardado(ERROR, id_item, mensaje_sin_padre)
+    return ResultadoGuardado(ERROR, id_item, str(e))
+
+
+# consulta: SELECT ... FROM ... [JOIN ...] sin WHERE ni ORDER BY propios
+def sql_pagina(consulta: str, columna_orden: str, pagina: int, limite: int) -> Tuple[str, Tuple[Any, ...]]:
+    pagina = max(1, int(pagina))
+    limite = max(1, int(limite))
+    sql = f"{consulta} ORDER BY {columna_orden} OFFSET :1 ROWS FETCH NEXT :2 ROWS ONLY"
+    return sql, ((pagina - 1) * limite, limite)
+
+
+def sql_desde(consulta: str, columna_id: str, ultimo_id: Any, limite: int) -> Tuple[str, Tuple[Any, ...]]:
+    limite = max(1, int(limite))
+    if ultimo_id is None:
+        return f"{consulta} ORDER BY {columna_id} FETCH FIRST :1 ROWS ONLY", (limite,)
+    sql = f"{consulta} WHERE {columna_id} > :1 ORDER BY {columna_id} FETCH FIRST :2 ROWS ONLY"
+    return sql, (ultimo_id, limite)
+
+
+def sql_por_ids(consulta: str, columna_id: str, ids: Sequence[Any]) -> Tuple[str, Tuple[Any, ...]]:
+    # la lista de binds se rellena hasta la siguiente potencia de 2 (tope MAX_IN)
+    # repitiendo el último id: así hay pocas formas de sentencia y el cursor se reutiliza
+    n = 1
+    while n < len(ids):
+        n *= 2
+    n = min(n, MAX_IN)
+    parametros = tuple(ids) + (ids[-1],) * (n - len(ids))
+    binds = ", ".join(f":{i + 1}" for i in range(n))
+    return f"{consulta} WHERE {columna_id} IN ({binds})", parametros
+
+
+def valor_retornado(var) -> Optional[int]:
+    # valor de un bind RETURNING INTO (viene como lista de una fila)
+    valor = var.getvalue()
+    if isinstance(valor, list):
+        valor = valor[0] if valor else None
+    return None if valor is None else int(valor)
+
+
+def _hay_pendiente(conn: Any) -> bool:
+    # sin el atributo (drivers antiguos) se asume que sí: nunca se activa
+    # autocommit sobre escrituras ajenas
+    return bool(getattr(conn, "transaction_in_progress", True))
+
+
+@contextmanager
+def _autocommit(conn: oracledb.Connection, autocommit: bool) -> Iterator[None]:
+    # el flag vuelve a False aunque el execute falle, antes de cualquier rollback
+    activado = autocommit and not _hay_pendiente(conn)
+    if activado:
+        conn.autocommit = True
+    try:
+        yield
+    finally:
+        if activado:
+            conn.autocommit = False
+    if autocommit and not activado:
+        conn.commit()
+
+
+class Transaccion:
+    # estado de una unidad de trabajo abierta con conexion_oracle.transaccion()
+    def __init__(self, commit_cada: int = 0):
+        self.commit_cada = max(0, int(commit_cada))
+        self.pendientes = 0
+        self.cancelada = False
+        self.niveles = 1
+        # acciones a correr sólo cuando lo escrito quede confirmado
+        self.al_confirmar: List[Callable[[], None]] = []
+
+    def deshacer(self) -> None:
+        # marca la unidad para rollback al salir del bloque más externo
+        self.cancelada = True
+
+
 class conexion_oracle:
-    def __init__(self, usuario: str, password: str, url: str, connect_retries: int = 1, retry_delay: float = 1.0):
+    def __init__(
+        self,
+        usuario: str,
+        password: str,
+        url: str,
+        connect_retries: int = 1,
+        retry_delay: float = 1.0,
+        usar_pool: bool = False,
+        pool_min: int = 1,
+        pool_max: int = 4,
+        pool_increment: int = 1,
+        pool_timeout: float = 5.0,
+        ping_interval: int = 60,
+        max_lifetime_session: int = 3600,
+        idle_timeout: int = 300,
+    ):
         self.usuario = usuario
         self.password = password
         self.url = url
-        self.connection: Optional[oracledb.Connection] = None
         self.connect_retries = max(1, int(connect_retries))
         self.retry_delay = float(retry_delay)
 
+        # modo pool: cada operación toma una sesión y la devuelve al terminar
+        self.usar_pool = bool(usar_pool)
+        self.pool_min = max(0, int(pool_min))
+        self.pool_max = max(1, int(pool_max), self.pool_min)
+        self.pool_increment = max(1, int(pool_increment))
+        self.pool_timeout = float(pool_timeout)
+        self.ping_interval = int(ping_interval)
+        self.max_lifetime_session = int(max_lifetime_session)
+        self.idle_timeout = int(idle_timeout)
+        self.pool: Optional[oracledb.ConnectionPool] = None
+        self._local = threading.local()
+        self._connection: Optional[oracledb.Connection] = None
+        # por tabla, el id más alto que su secuencia ya dejó atrás
+        self._secuencias_al_dia: Dict[str, int] = {}
+
+    @property
+    def connection(self) -> Optional[oracledb.Connection]:
+        if self.usar_pool:
+            return getattr(self._local, "connection", None)
+        return self._connection
+
+    @connection.setter
+    def connection(self, valor: Optional[oracledb.Connection]) -> None:
+        if self.usar_pool:
+            self._local.connection = valor
+        else:
+            self._connection = valor
+
     def __enter__(self) -> "conexion_oracle":
         self.conectar()
         return self
@@ -38,12 +219,28 @@ class conexion_oracle:
         last_exc: Optional[Exception] = None
         for attempt in range(1, self.connect_retries + 1):
             try:
-                self.connection = oracledb.connect(
-                    user=self.usuario,
-                    password=self.password,
-                    dsn=self.url
-                )
-                logger.info("Conectado a BD correctamente.")
+                if self.usar_pool:
+                    self.pool = oracledb.create_pool(
+                        user=self.usuario,
+                        password=self.password,
+                        dsn=self.url,
+                        min=self.pool_min,
+                        max=self.pool_max,
+                        increment=self.pool_increment,
+                        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                        wait_timeout=int(self.pool_timeout * 1000),
+                        ping_interval=self.ping_interval,
+                        max_lifetime_session=self.max_lifetime_session,
+                        timeout=self.idle_timeout,
+                    )
+                    logger.info("Pool de conexiones creado (min=%d, max=%d).", self.pool_min, self.pool_max)
+                else:
+                    self.connection = oracledb.connect(
+                        user=self.usuario,
+                        password=self.password,
+                        dsn=self.url
+                    )
+                    logger.info("Conectado a BD correctamente.")
                 return
             except oracledb.Error as e:
                 last_exc = e
@@ -56,6 +253,18 @@ class conexion_oracle:
             raise last_exc
 
     def desconectar(self) -> None:
+        if self.usar_pool:
+            try:
+                self.liberar()
+            finally:
+                if self.pool:
+                    try:
+                        self.pool.close(force=True)
+                        logger.info("Pool de conexiones cerrado correctamente.")
+                    finally:
+                        self.pool = None
+            return
+
         if self.connection:
             try:
                 self.connection.close()
@@ -63,30 +272,868 @@ class conexion_oracle:
             finally:
                 self.connection = None
 
-    def obtener_cursor(self):
-        if not self.connection:
+    def adquirir(self) -> oracledb.Connection:
+        if not self.usar_pool:
+            if not self.connection:
+                self.conectar()
+            if not self.connection:
+                raise RuntimeError("No se pudo establecer conexión a la BD")
+            return self.connection
+
+        if self.connection:
+            return self.connection
+
+        if not self.pool:
             self.conectar()
+        if not self.pool:
+            raise RuntimeError("No se pudo crear el pool de conexiones")
+
+        self.connection = self.pool.acquire()
+        return self.connection
+
+    def liberar(self) -> None:
+        if not self.usar_pool:
+            return
+
+        conn = self.connection
+        self.connection = None
+        if conn is None:
+            return
+        try:
+            if self.pool:
+                self.pool.release(conn)
+            else:
+                conn.close()
+        except Exception:
+            logger.exception("Error devolviendo la conexión al pool")
+
+    @property
+    def mapa_activo(self) -> Optional[MapaIdentidad]:
+        return getattr(self._local, "mapa", None)
+
+    @contextmanager
+    def operacion(self) -> Iterator[MapaIdentidad]:
+        # mientras dure el bloque, obtener_por_ids no repite lecturas de un mismo id;
+        # cualquier escritura (confirmar / escritura_confirmada) vacía el mapa
+        actual = self.mapa_activo
+        if actual is not None:
+            yield actual
+            return
+        mapa = MapaIdentidad()
+        self._local.mapa = mapa
+        try:
+            yield mapa
+        finally:
+            self._local.mapa = None
+
+    @property
+    def transaccion_activa(self) -> Optional[Transaccion]:
+        return getattr(self._local, "transaccion", None)
+
+    @contextmanager
+    def transaccion(self, commit_cada: int = 0) -> Iterator[Transaccion]:
+        # dentro del bloque los modelos no confirman: confirmar() sólo cuenta
+        # escrituras y el commit (o rollback) ocurre una vez al salir.
+        # commit_cada > 0 confirma cada N escrituras en cargas masivas.
+        # Un bloque anidado se suma a la transacción exterior.
+        actual = self.transaccion_activa
+        if actual is not None:
+            actual.niveles += 1
+            try:
+                yield actual
+            except Exception:
+                actual.cancelada = True
+                raise
+            finally:
+                actual.niveles -= 1
+            return
+
+        prestada = self.usar_pool and self.connection is None
+        conn = self.adquirir()
+        tx = Transaccion(commit_cada)
+        self._local.transaccion = tx
+        try:
+            with self.operacion():
+                yield tx
+            if tx.cancelada:
+                conn.rollback()
+                self._olvidar_leidos()
+            else:
+                conn.commit()
+                self._correr_al_confirmar(tx)
+        except Exception:
+            self._olvidar_leidos()
+            try:
+                conn.rollback()
+            except Exception:
+                logger.exception("Error ejecutando rollback")
+            raise
+        finally:
+            self._local.transaccion = None
+            if prestada:
+                self.liberar()
+
+    def confirmar(self, filas: int = 1) -> None:
+        self._olvidar_leidos()
+        tx = self.transaccion_activa
+        if tx is None:
+            if self.connection:
+                self.connection.commit()
+            return
+        tx.pendientes += filas
+        if tx.commit_cada and tx.pendientes >= tx.commit_cada and not tx.cancelada:
+            self.connection.commit()
+            tx.pendientes = 0
+            self._correr_al_confirmar(tx)
 
-        if not self.connection:
-            raise RuntimeError("No se pudo establecer conexión a la BD")
+    def despues_de_confirmar(self, accion: Callable[[], None]) -> None:
+        # fuera de una transacción la escritura ya está confirmada: corre de inmediato;
+        # dentro, espera al commit y se descarta si la transacción se deshace
+        tx = self.transaccion_activa
+        if tx is None:
+            accion()
+        else:
+            tx.al_confirmar.append(accion)
 
-        return self.connection.cursor()
+    @staticmethod
+    def _correr_al_confirmar(tx: Transaccion) -> None:
+        acciones, tx.al_confirmar = tx.al_confirmar, []
+        for accion in acciones:
+            try:
+                accion()
+            except Exception:
+                logger.exception("Error en una acción posterior al commit")
+
+    def escritura_confirmada(self, filas: int = 1) -> None:
+        # tras un execute con cursor(autocommit=True): fuera de una transacción
+        # ya quedó confirmado; dentro, cuenta como escritura pendiente
+        if self.transaccion_activa is not None:
+            self.confirmar(filas)
+        else:
+            self._olvidar_leidos()
+
+    def _olvidar_leidos(self) -> None:
+        mapa = self.mapa_activo
+        if mapa is not None:
+            mapa.olvidar()
+
+    def obtener_cursor(self):
+        # en modo pool la sesión queda tomada hasta llamar a liberar();
+        # para operaciones puntuales usar el context manager cursor()
+        return self.adquirir().cursor()
 
     @contextmanager
-    def cursor(self) -> Iterator[oracledb.Cursor]:
+    def cursor(self, autocommit: bool = False) -> Iterator[oracledb.Cursor]:
+        # autocommit=True confirma junto con el execute, sin un viaje extra para commit;
+        # dentro de una transacción se ignora y el error sólo deshace la sentencia.
+        # Si la sesión ya tenía trabajo sin confirmar (sin pool la comparten todos
+        # los modelos) no se activa: se confirma con commit() al cerrar el bloque
+        en_transaccion = self.transaccion_activa is not None
+        autocommit = autocommit and not en_transaccion
+        prestada = self.usar_pool and self.connection is None
         cur = None
         try:
             cur = self.obtener_cursor()
-            yield cur
+            with _autocommit(cur.connection, autocommit):
+                yield cur
+        except Exception:
+            if self.connection and not en_transaccion:
+                try:
+                    self.connection.rollback()
+                except Exception:
+                    logger.exception("Error ejecutando rollback")
+            raise
+        finally:
+            if cur:
+                try:
+                    cur.close()
+                except Exception:
+                    logger.exception("Error cerrando el cursor")
+            if prestada:
+                self.liberar()
+
+    def listar_pagina(self, consulta: str, columna_orden: str, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        sql, parametros = sql_pagina(consulta, columna_orden, pagina, limite)
+        with self.cursor() as cur:
+            cur.arraysize = parametros[-1]
+            cur.prefetchrows = parametros[-1] + 1
+            cur.execute(sql, parametros)
+            return cur.fetchall()
+
+    def listar_desde(self, consulta: str, columna_id: str, ultimo_id: Any = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        sql, parametros = sql_desde(consulta, columna_id, ultimo_id, limite)
+        with self.cursor() as cur:
+            cur.arraysize = parametros[-1]
+            cur.prefetchrows = parametros[-1] + 1
+            cur.execute(sql, parametros)
+            return cur.fetchall()
+
+    def iterar(self, consulta: str, parametros: Sequence[Any] = (), tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        # la sesión queda tomada mientras el generador no se agote o se cierre
+        tam_lote = max(1, int(tam_lote))
+        with self.cursor() as cur:
+            cur.arraysize = tam_lote
+            cur.prefetchrows = tam_lote + 1
+            cur.execute(consulta, parametros)
+            while True:
+                filas = cur.fetchmany(tam_lote)
+                if not filas:
+                    break
+                yield from filas
+
+    def obtener_por_ids(self, consulta: str, columna_id: str, ids: Iterable[Any]) -> Dict[Any, Tuple[Any, ...]]:
+        # consulta: como en sql_desde, con la clave primaria como primera columna.
+        # Devuelve {id: fila} sólo con los ids que existen; dentro de operacion()
+        # los ids ya leídos (o ya sabidos inexistentes) no vuelven a la BD
+        pedidos = list(dict.fromkeys(ids))
+        mapa = self.mapa_activo
+        # cada consulta tiene su propia forma de fila: no comparten entradas
+        espacio = (consulta, columna_id)
+        filas: Dict[Any, Tuple[Any, ...]] = {}
+        faltantes = pedidos
+        if mapa is not None:
+            filas, faltantes = mapa.buscar(espacio, pedidos)
+
+        if faltantes:
+            leidas: Dict[Any, Tuple[Any, ...]] = {}
+            with self.cursor() as cur:
+                for inicio in range(0, len(faltantes), MAX_IN):
+                    sql, parametros = sql_por_ids(consulta, columna_id, faltantes[inicio:inicio + MAX_IN])
+                    cur.arraysize = len(parametros)
+                    cur.prefetchrows = len(parametros) + 1
+                    cur.execute(sql, parametros)
+                    for fila in cur.fetchall():
+                        leidas[fila[0]] = fila
+            if mapa is not None:
+                for id_item in faltantes:
+                    mapa.guardar(espacio, id_item, leidas.get(id_item))
+            filas.update(leidas)
+
+        return {id_item: filas[id_item] for id_item in pedidos if filas.get(id_item) is not None}
+
+    def insertar_si_no_existe(
+        self,
+        consulta_merge: str,
+        parametros: Sequence[Any],
+        id_item: Any,
+        mensaje_duplicado: str,
+        mensaje_sin_padre: Optional[str] = None,
+    ) -> ResultadoGuardado:
+        # consulta_merge debe ser un MERGE ... WHEN NOT MATCHED THEN INSERT:
+        # rowcount 0 significa que la fila ya existía. Una violación de
+        # unicidad concurrente (ORA-00001) también se informa como duplicado.
+        try:
+            with self.cursor(autocommit=True) as cur:
+                cur.execute(consulta_merge, parametros)
+                if cur.rowcount == 0:
+                    return ResultadoGuardado(DUPLICADO, id_item, mensaje_duplicado)
+                self.escritura_confirmada()
+        except Exception as e:
+            return resultado_error(e, id_item, mensaje_duplicado, mensaje_sin_padre)
+        self.avanzar_secuencia(tabla_destino(consulta_merge), id_item)
+        return ResultadoGuardado(CREADO, id_item)
+
+    def insertar_con_id(
+        self,
+        consulta: str,
+        parametros: Sequence[Any],
+        mensaje_duplicado: str,
+        mensaje_sin_padre: Optional[str] = None,
+    ) -> ResultadoGuardado:
+        # consulta: INSERT ... VALUES (secuencia.nextval, ...) RETURNING id INTO :n
+        # (o un bloque que asigne el id al último bind, o null si no insertó).
+        # El id generado vuelve en el mismo viaje que el insert y el commit.
+        # Si el choque es con la clave primaria la secuencia quedó atrás de ids
+        # cargados a mano: se adelanta y se reintenta una vez
+        tabla = tabla_destino(consulta)
+        for intento in range(2):
+            try:
+                with self.cursor(autocommit=True) as cur:
+                    id_var = cur.var(oracledb.DB_TYPE_NUMBER)
+                    cur.execute(consulta, list(parametros) + [id_var])
+                    nuevo_id = valor_retornado(id_var)
+                    if nuevo_id is None:
+                        return ResultadoGuardado(DUPLICADO, None, mensaje_duplicado)
+                    self.escritura_confirmada()
+                    return ResultadoGuardado(CREADO, nuevo_id)
+            except Exception as e:
+                if codigo_error_oracle(e) != ORA_UNICO or not self.es_clave_primaria(e):
+                    return resultado_error(e, None, mensaje_duplicado, mensaje_sin_padre)
+                if intento or not self.avanzar_secuencia(tabla, forzar=True):
+                    return ResultadoGuardado(ERROR, None, mensaje_id_en_uso(tabla))
+        return ResultadoGuardado(ERROR, None, mensaje_id_en_uso(tabla))
+
+    def es_clave_primaria(self, e: BaseException) -> bool:
+        restriccion = restriccion_violada(e)
+        if restriccion is None:
+            return False
+        try:
+            with self.cursor() as cur:
+                cur.execute(CONSULTA_TIPO_RESTRICCION, restriccion)
+                fila = cur.fetchone()
+        except Exception:
+            logger.exception("Error leyendo la restricción %s.%s", *restriccion)
+            return False
+        return fila is not None and fila[0] == "P"
+
+    def avanzar_secuencia(self, tabla: Optional[str], maximo: Any = None, forzar: bool = False) -> bool:
+        # tras insertar ids explícitos la secuencia de la tabla debe quedar por
+        # encima de ellos, o el próximo nextval choca con la clave primaria.
+        # maximo cubre filas que esta sesión todavía no confirmó
+        secuencia = SECUENCIA_POR_TABLA.get(tabla)
+        if secuencia is None:
+            return False
+        try:
+            maximo = None if maximo is None else int(maximo)
+        except (TypeError, ValueError):
+            maximo = None
+        if not forzar and maximo is not None and maximo <= self._secuencias_al_dia.get(tabla, 0):
+            return True
+        with self.cursor() as cur:
+            try:
+                cur.execute(sentencia_avanzar_secuencia(*secuencia), {"maximo": maximo})
+            except Exception as e:
+                logger.warning("No se pudo adelantar %s -> %s", secuencia[0], e)
+                return False
+        if maximo is not None:
+            self._secuencias_al_dia[tabla] = max(maximo, self._secuencias_al_dia.get(tabla, 0))
+        return True
+
+
+class conexion_oracle_async:
+    # contraparte asyncio de conexion_oracle (modo thin): cada operación toma
+    # una sesión del pool sólo mientras espera a la BD, así unos pocos hilos
+    # sostienen cientos de operaciones concurrentes
+    def __init__(
+        self,
+        usuario: str,
+        password: str,
+        url: str,
+        connect_retries: int = 1,
+        retry_delay: float = 1.0,
+        usar_pool: bool = True,
+        pool_min: int = 1,
+        pool_max: int = 8,
+        pool_increment: int = 1,
+        pool_timeout: float = 5.0,
+        ping_interval: int = 60,
+        max_lifetime_session: int = 3600,
+        idle_timeout: int = 300,
+    ):
+        self.usuario = usuario
+        self.password = password
+        self.url = url
+        self.connect_retries = max(1, int(connect_retries))
+        self.retry_delay = float(retry_delay)
+
+        self.usar_pool = bool(usar_pool)
+        self.pool_min = max(0, int(pool_min))
+        self.pool_max = max(1, int(pool_max), self.pool_min)
+        self.pool_increment = max(1, int(pool_increment))
+        self.pool_timeout = float(pool_timeout)
+        self.ping_interval = int(ping_interval)
+        self.max_lifetime_session = int(max_lifetime_session)
+        self.idle_timeout = int(idle_timeout)
+        self.pool: Optional[oracledb.AsyncConnectionPool] = None
+        self.connection: Optional[oracledb.AsyncConnection] = None
+        # sin pool hay una sola sesión: las tareas la usan de a una
+        self._candado = asyncio.Lock()
+        self._secuencias_al_dia: Dict[str, int] = {}
+
+    async def __aenter__(self) -> "conexion_oracle_async":
+        await self.conectar()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            await self.desconectar()
+        except Exception:
+            logger.exception("Error al desconectar en __aexit__")
+
+    async def conectar(self) -> None:
+        last_exc: Optional[Exception] = None
+        for attempt in range(1, self.connect_retries + 1):
+            try:
+                if self.usar_pool:
+                    self.pool = oracledb.create_pool_async(
+                        user=self.usuario,
+                        password=self.password,
+                        dsn=self.url,
+                        min=self.pool_min,
+                        max=self.pool_max,
+                        increment=self.pool_increment,
+                        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                        wait_timeout=int(self.pool_timeout * 1000),
+                        ping_interval=self.ping_interval,
+                        max_lifetime_session=self.max_lifetime_session,
+                        timeout=self.idle_timeout,
+                    )
+                    logger.info("Pool async de conexiones creado (min=%d, max=%d).", self.pool_min, self.pool_max)
+                else:
+                    self.connection = await oracledb.connect_async(
+                        user=self.usuario,
+                        password=self.password,
+                        dsn=self.url
+                    )
+                    logger.info("Conectado a BD (async) correctamente.")
+                return
+            except oracledb.Error as e:
+                last_exc = e
+                logger.warning("Intento %d/%d: no se pudo conectar -> %s", attempt, self.connect_retries, e)
+                if attempt < self.connect_retries:
+                    await asyncio.sleep(self.retry_delay)
+
+        logger.error("No se pudo conectar a la BD después de %d intentos.", self.connect_retries)
+        if last_exc:
+            raise last_exc
+
+    async def desconectar(self) -> None:
+        if self.pool:
+            try:
+                await self.pool.close(force=True)
+                logger.info("Pool async de conexiones cerrado correctamente.")
+            finally:
+                self.pool = None
+        if self.connection:
+            try:
+                await self.connection.close()
+                logger.info("Conexión async a BD cerrada correctamente.")
+            finally:
+                self.connection = None
+
+    async def adquirir(self) -> oracledb.AsyncConnection:
+        if self.usar_pool:
+            if not self.pool:
+                await self.conectar()
+            if not self.pool:
+                raise RuntimeError("No se pudo crear el pool de conexiones")
+            return await self.pool.acquire()
+
+        await self._candado.acquire()
+        try:
+            if not self.connection:
+                await self.conectar()
+            if not self.connection:
+                raise RuntimeError("No se pudo establecer conexión a la BD")
+        except Exception:
+            self._candado.release()
+            raise
+        return self.connection
+
+    async def liberar(self, conn: oracledb.AsyncConnection) -> None:
+        if not self.usar_pool:
+            self._candado.release()
+            return
+        try:
+            if self.pool:
+                await self.pool.release(conn)
+            else:
+                await conn.close()
+        except Exception:
+            logger.exception("Error devolviendo la conexión al pool")
+
+    @asynccontextmanager
+    async def cursor(self, autocommit: bool = False) -> AsyncIterator[oracledb.AsyncCursor]:
+        conn = await self.adquirir()
+        cur = None
+        try:
+            cur = conn.cursor()
+            activado = autocommit and not _hay_pendiente(conn)
+            if activado:
+                conn.autocommit = True
+            try:
+                yield cur
+            finally:
+                if activado:
+                    conn.autocommit = False
+            if autocommit and not activado:
+                await conn.commit()
+        except Exception:
+            try:
+                await conn.rollback()
+            except Exception:
+                logger.exception("Error ejecutando rollback")
+            raise
         finally:
             if cur:
                 try:
                     cur.close()
                 except Exception:
                     logger.exception("Error cerrando el cursor")
+            await self.liberar(conn)
+
+    @asynccontextmanager
+    async def transaccion(self) -> AsyncIterator[oracledb.AsyncCursor]:
+        # varias sentencias en una misma sesión: commit al salir del bloque,
+        # rollback (desde cursor()) si algo falla; los FOR UPDATE duran hasta ahí
+        async with self.cursor() as cur:
+            yield cur
+            await cur.connection.commit()
+
+    async def listar_pagina(self, consulta: str, columna_orden: str, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        sql, parametros = sql_pagina(consulta, columna_orden, pagina, limite)
+        async with self.cursor() as cur:
+            cur.arraysize = parametros[-1]
+            cur.prefetchrows = parametros[-1] + 1
+            await cur.execute(sql, parametros)
+            return await cur.fetchall()
+
+    async def listar_desde(self, consulta: str, columna_id: str, ultimo_id: Any = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        sql, parametros = sql_desde(consulta, columna_id, ultimo_id, limite)
+        async with self.cursor() as cur:
+            cur.arraysize = parametros[-1]
+            cur.prefetchrows = parametros[-1] + 1
+            await cur.execute(sql, parametros)
+            return await cur.fetchall()
+
+    async def iterar(self, consulta: str, parametros: Sequence[Any] = (), tam_lote: int = 1000) -> AsyncIterator[Tuple[Any, ...]]:
+        tam_lote = max(1, int(tam_lote))
+        async with self.cursor() as cur:
+            cur.arraysize = tam_lote
+            cur.prefetchrows = tam_lote + 1
+            await cur.execute(consulta, parametros)
+            while True:
+                filas = await cur.fetchmany(tam_lote)
+                if not filas:
+                    break
+                for fila in filas:
+                    yield fila
+
+    async def ejecutar(self, consulta: str, parametros: Sequence[Any] = ()) -> int:
+        # una sentencia DML con commit en el mismo viaje; devuelve filas afectadas
+        async with self.cursor(autocommit=True) as cur:
+            await cur.execute(consulta, parametros)
+            return cur.rowcount
+
+    async def insertar_si_no_existe(
+        self,
+        consulta_merge: str,
+        parametros: Sequence[Any],
+        id_item: Any,
+        mensaje_duplicado: str,
+        mensaje_sin_padre: Optional[str] = None,
+    ) -> ResultadoGuardado:
+        try:
+            filas = await self.ejecutar(consulta_merge, parametros)
+            if filas == 0:
+                return ResultadoGuardado(DUPLICADO, id_item, mensaje_duplicado)
+        except Exception as e:
+            return resultado_error(e, id_item, mensaje_duplicado, mensaje_sin_padre)
+        await self.avanzar_secuencia(tabla_destino(consulta_merge), id_item)
+        return ResultadoGuardado(CREADO, id_item)
+
+    async def insertar_con_id(
+        self,
+        consulta: str,
+        parametros: Sequence[Any],
+        mensaje_duplicado: str,
+        mensaje_sin_padre: Optional[str] = None,
+    ) -> ResultadoGuardado:
+        tabla = tabla_destino(consulta)
+        for intento in range(2):
+            try:
+                async with self.cursor(autocommit=True) as cur:
+                    id_var = cur.var(oracledb.DB_TYPE_NUMBER)
+                    await cur.execute(consulta, list(parametros) + [id_var])
+                    nuevo_id = valor_retornado(id_var)
+                    if nuevo_id is None:
+                        return ResultadoGuardado(DUPLICADO, None, mensaje_duplicado)
+                    return ResultadoGuardado(CREADO, nuevo_id)
+            except Exception as e:
+                if codigo_error_oracle(e) != ORA_UNICO or not await self.es_clave_primaria(e):
+                    return resultado_error(e, None, mensaje_duplicado, mensaje_sin_padre)
+                if intento or not await self.avanzar_secuencia(tabla, forzar=True):
+                    return ResultadoGuardado(ERROR, None, mensaje_id_en_uso(tabla))
+        return ResultadoGuardado(ERROR, None, mensaje_id_en_uso(tabla))
+
+    async def es_clave_primaria(self, e: BaseException) -> bool:
+        restriccion = restriccion_violada(e)
+        if restriccion is None:
+            return False
+        try:
+            async with self.cursor() as cur:
+                await cur.execute(CONSULTA_TIPO_RESTRICCION, restriccion)
+                fila = await cur.fetchone()
+        except Exception:
+            logger.exception("Error leyendo la restricción %s.%s", *restriccion)
+            return False
+        return fila is not None and fila[0] == "P"
+
+    async def avanzar_secuencia(self, tabla: Optional[str], maximo: Any = None, forzar: bool = False) -> bool:
+        # ver conexion_oracle.avanzar_secuencia
+        secuencia = SECUENCIA_POR_TABLA.get(tabla)
+        if secuencia is None:
+            return False
+        try:
+            maximo = None if maximo is None else int(maximo)
+        except (TypeError, ValueError):
+            maximo = None
+        if not forzar and maximo is not None and maximo <= self._secuencias_al_dia.get(tabla, 0):
+            return True
+        try:
+            async with self.cursor() as cur:
+                await cur.execute(sentencia_avanzar_secuencia(*secuencia), {"maximo": maximo})
+        except Exception as e:
+            logger.warning("No se pudo adelantar %s -> %s", secuencia[0], e)
+            return False
+        if maximo is not None:
+            self._secuencias_al_dia[tabla] = max(maximo, self._secuencias_al_dia.get(tabla, 0))
+        return True
+
+
+# índices para los accesos que hace la aplicación (login, duplicados, FKs, agenda por médico)
+INDICES = [
+    "create unique index ux_usuario_nombre_usuario on tv_usuario(nombre_usuario)",
+    "create index ix_insumos_nombre on tv_insumos(nombre)",
+    "create index ix_recetas_paciente on tv_recetas(id_paciente)",
+    "create index ix_recetas_medico on tv_recetas(id_medico)",
+    "create index ix_consultas_paciente on tv_consultas(id_paciente)",
+    "create index ix_consultas_medico on tv_consultas(id_medico)",
+    "create index ix_consultas_receta on tv_consultas(id_receta)",
+    "create index ix_consultas_fecha on tv_consultas(fecha)",
+    "create index ix_agenda_paciente on tv_agenda(id_paciente)",
+    "create index ix_agenda_medico_fecha on tv_agenda(id_medico, fecha_consulta)",
+]
+
+
+def indice_esperado(ddl: str) -> Tuple[str, str, bool]:
+    # "create [unique] index nombre on tabla(a, b)" -> ("TABLA", "A,B", unico)
+    cabecera, _, resto = ddl.partition(" on ")
+    tabla, _, columnas = resto.partition("(")
+    lista = ",".join(c.strip().upper() for c in columnas.rstrip(") ").split(","))
+    return tabla.strip().upper(), lista, cabecera.startswith("create unique ")
+
+
+def sentencia_indice(ddl: str) -> str:
+    # -955: nombre ya usado, -1408: esa lista de columnas ya está indexada.
+    # Si lo indexado es un índice no único y se pedía uno único, la unicidad
+    # se agrega como restricción, que Oracle apoya en ese mismo índice
+    # (-2261: ya hay una restricción unique sobre esas columnas)
+    tabla, columnas, unico = indice_esperado(ddl)
+    restriccion = ""
+    if unico:
+        restriccion = f"""
+            if sqlcode = -1408 then
+                begin
+                    execute immediate 'alter table {tabla} add constraint {nombre_indice(ddl)} unique ({columnas})';
+                exception
+                    when others then
+                        if sqlcode not in (-2261, -2264) then
+                            raise;
+                        end if;
+                end;
+            end if;"""
+    return f"""
+    begin
+        execute immediate '{ddl}';
+    exception
+        when others then
+            if sqlcode not in (-955, -1408) then
+                raise;
+            end if;{restriccion}
+    end;
+    """
+
+
+TABLAS = [
+    "TV_USUARIO",
+    "TV_PACIENTE",
+    "TV_MEDICO",
+    "TV_ADMINISTRADOR",
+    "TV_INSUMOS",
+    "TV_RECETAS",
+    "TV_CONSULTAS",
+    "TV_AGENDA",
+    "TV_ESQUEMA",
+]
+
+# secuencias para ids generados en el servidor: (secuencia, tabla, columna)
+SECUENCIAS = [
+    ("sq_usuario", "tv_usuario", "id_usuario"),
+    ("sq_insumos", "tv_insumos", "id_insumo"),
+    ("sq_recetas", "tv_recetas", "id_receta"),
+    ("sq_consultas", "tv_consultas", "id_consulta"),
+    ("sq_agenda", "tv_agenda", "id_agenda"),
+]
+
+
+def sentencia_secuencia(secuencia: str, tabla: str, columna: str) -> str:
+    # parte después del id más alto ya cargado a mano
+    return f"""
+    declare
+        v_inicio number;
+    begin
+        select nvl(max({columna}), 0) + 1 into v_inicio from {tabla};
+        execute immediate 'create sequence {secuencia} start with ' || v_inicio || ' cache 100';
+    exception
+        when others then
+            if sqlcode != -955 then
+                raise;
+            end if;
+    end;
+    """
+
 
+SECUENCIA_POR_TABLA = {secuencia[1]: secuencia for secuencia in SECUENCIAS}
 
-def validar_tablas(db: conexion_oracle) -> None:
+
+def sentencia_avanzar_secuencia(secuencia: str, tabla: str, columna: str) -> str:
+    # autónoma: el DDL no confirma la transacción de quien la llama.
+    # :maximo cubre ids que esa transacción insertó y todavía no confirmó
+    return f"""
+    declare
+        pragma autonomous_transaction;
+        v_maximo number;
+        v_siguiente number;
+    begin
+        select greatest(nvl(max({columna}), 0), nvl(:maximo, 0)) into v_maximo from {tabla};
+        select {secuencia}.nextval into v_siguiente from dual;
+        if v_siguiente <= v_maximo then
+            execute immediate 'alter sequence {secuencia} restart start with ' || (v_maximo + 1);
+        end if;
+        commit;
+    end;
+    """
+
+
+def sentencia_columna(tabla: str, definicion: str) -> str:
+    # -1430: la columna ya existe
+    return f"""
+    begin
+        execute immediate 'alter table {tabla} add {definicion}';
+    exception
+        when others then
+            if sqlcode != -1430 then
+                raise;
+            end if;
+    end;
+    """
+
+
+CONSULTA_USUARIOS_DUPLICADOS = """
+    SELECT id_usuario, nombre_usuario FROM (
+        SELECT id_usuario, nombre_usuario,
+               row_number() OVER (PARTITION BY nombre_usuario ORDER BY id_usuario) AS orden
+        FROM tv_usuario
+    )
+    WHERE orden > 1
+    ORDER BY nombre_usuario, id_usuario
+"""
+
+
+def resolver_usuarios_duplicados(cursor) -> None:
+    # antes de ux_usuario_nombre_usuario: el usuario con el id más bajo conserva
+    # el nombre y los demás pasan a nombre_id (tope de 50 caracteres de la columna)
+    cursor.execute(CONSULTA_USUARIOS_DUPLICADOS)
+    duplicados = cursor.fetchall()
+    if not duplicados:
+        return
+    renombres = []
+    for id_usuario, nombre_usuario in duplicados:
+        sufijo = f"_{id_usuario}"
+        nuevo = nombre_usuario[: 50 - len(sufijo)] + sufijo
+        logger.warning("nombre_usuario duplicado '%s': el usuario id %s pasa a '%s'", nombre_usuario, id_usuario, nuevo)
+        renombres.append((nuevo, id_usuario))
+    cursor.executemany("UPDATE tv_usuario SET nombre_usuario = :1 WHERE id_usuario = :2", renombres)
+
+
+# versión 1: tablas e índices base. Cada versión nueva agrega aquí sus
+# sentencias (idempotentes) y sube VERSION_ESQUEMA. Una sentencia puede ser
+# una función que recibe el cursor cuando necesita leer antes de escribir.
+# Las migraciones corren antes que los índices
+VERSION_ESQUEMA = 4
+MIGRACIONES: Dict[int, List[Union[str, Callable[[Any], None]]]] = {
+    2: [sentencia_secuencia(*secuencia) for secuencia in SECUENCIAS],
+    # umbral de alerta por insumo (MonitorStock)
+    3: [sentencia_columna("tv_insumos", "stock_minimo NUMBER DEFAULT 10 NOT NULL")],
+    # el índice único sobre nombre_usuario no se puede crear con duplicados
+    4: [resolver_usuarios_duplicados],
+}
+
+
+def nombre_indice(ddl: str) -> str:
+    return ddl.split(" index ", 1)[1].split()[0].upper()
+
+
+def _indices_esperados() -> str:
+    return "\n        union all ".join(
+        f"select '{tabla}' tabla, '{columnas}' columnas, {int(unico)} unico from dual"
+        for tabla, columnas, unico in map(indice_esperado, INDICES)
+    )
+
+
+# un solo viaje: cuenta tablas e índices esperados y lee la versión registrada.
+# Los índices se buscan por tabla y columnas, no por nombre: uno que ya existía
+# con otro nombre (-1408 al crearlo) también cuenta; un único se cumple con un
+# índice unique o con una restricción unique/primary key sobre esas columnas
+CONSULTA_ESTADO_ESQUEMA = f"""
+declare
+    v_version number := 0;
+begin
+    select count(*) into :1 from user_tables
+    where table_name in ({", ".join(f"'{t}'" for t in TABLAS)});
+
+    select count(*) into :2 from (
+        {_indices_esperados()}
+    ) e
+    where exists (
+        select 1 from user_indexes x
+        join (
+            select index_name, listagg(column_name, ',') within group (order by column_position) columnas
+            from user_ind_columns group by index_name
+        ) c on c.index_name = x.index_name
+        where x.table_name = e.tabla and c.columnas = e.columnas
+          and (e.unico = 0 or x.uniqueness = 'UNIQUE')
+    )
+    or (e.unico = 1 and exists (
+        select 1 from user_constraints k
+        join (
+            select constraint_name, listagg(column_name, ',') within group (order by position) columnas
+            from user_cons_columns group by constraint_name
+        ) c on c.constraint_name = k.constraint_name
+        where k.table_name = e.tabla and k.constraint_type in ('U', 'P') and c.columnas = e.columnas
+    ));
+
+    begin
+        execute immediate 'select nvl(max(version), 0) from tv_esquema' into v_version;
+    exception
+        when others then
+            v_version := 0;
+    end;
+    :3 := v_version;
+end;
+"""
+
+
+def estado_esquema(db: conexion_oracle) -> Tuple[int, int, int]:
+    with db.cursor() as cursor:
+        tablas = cursor.var(int)
+        indices = cursor.var(int)
+        version = cursor.var(int)
+        cursor.execute(CONSULTA_ESTADO_ESQUEMA, [tablas, indices, version])
+        return int(tablas.getvalue() or 0), int(indices.getvalue() or 0), int(version.getvalue() or 0)
+
+
+def validar_tablas(db: conexion_oracle, forzar: bool = False) -> None:
+    version_actual = 0
+    if not forzar:
+        try:
+            tablas, indices, version_actual = estado_esquema(db)
+            if tablas == len(TABLAS) and indices == len(INDICES) and version_actual >= VERSION_ESQUEMA:
+                logger.info("Esquema al día (versión %d), sin DDL", version_actual)
+                return
+            if tablas < len(TABLAS):
+                # una tabla recreada desde el DDL base no tiene lo que agregaron
+                # las migraciones: se vuelven a correr todas (son idempotentes)
+                logger.warning("Faltan %d tablas, se reaplican las migraciones", len(TABLAS) - tablas)
+                version_actual = 0
+        except Exception as e:
+            logger.warning("No se pudo leer el estado del esquema, se valida completo -> %s", e)
+
+    crear_tablas(db, version_actual)
+
+
+def crear_tablas(db: conexion_oracle, version_actual: int = 0) -> None:
     tv_usuario = """
     begin
         execute immediate '
@@ -167,7 +1214,8 @@ def validar_tablas(db: conexion_oracle) -> None:
                 nombre VARCHAR2(50) NOT NULL,
                 tipo VARCHAR2(50) NOT NULL,
                 stock NUMBER NOT NULL,
-                costo_usd NUMBER NOT NULL
+                costo_usd NUMBER NOT NULL,
+                stock_minimo NUMBER DEFAULT 10 NOT NULL
             )';
     exception
         when others then
@@ -241,7 +1289,23 @@ def validar_tablas(db: conexion_oracle) -> None:
     end;
     """
 
+    tv_esquema = """
+    begin
+        execute immediate '
+            create table tv_esquema(
+                version NUMBER PRIMARY KEY,
+                aplicado DATE DEFAULT SYSDATE NOT NULL
+            )';
+    exception
+        when others then
+            if sqlcode != -955 then
+                raise;
+            end if;
+    end;
+    """
+
     sentencias = [
+        tv_esquema,
         tv_usuario,
         tv_paciente,
         tv_medico,
@@ -252,35 +1316,33 @@ def validar_tablas(db: conexion_oracle) -> None:
         tv_agenda
     ]
 
-    cursor = None
-    try:
-        cursor = db.obtener_cursor()
-        for idx, sql in enumerate(sentencias, start=1):
-            try:
-                cursor.execute(sql)
-                logger.debug("Sentencia %d ejecutada correctamente.", idx)
-            except Exception:
-                logger.exception("Error ejecutando la sentencia %d:", idx)
-                raise
+    for version in sorted(MIGRACIONES):
+        if version > version_actual:
+            sentencias.extend(MIGRACIONES[version])
+    sentencias.extend(sentencia_indice(ddl) for ddl in INDICES)
 
+    try:
+        with db.cursor() as cursor:
+            for idx, sql in enumerate(sentencias, start=1):
+                try:
+                    if callable(sql):
+                        sql(cursor)
+                    else:
+                        cursor.execute(sql)
+                    logger.debug("Sentencia %d ejecutada correctamente.", idx)
+                except Exception:
+                    logger.exception("Error ejecutando la sentencia %d:", idx)
+                    raise
 
-        if db.connection:
-            db.connection.commit()
-        logger.info("Tablas validadas/creadas correctamente")
+            cursor.execute(
+                "insert into tv_esquema (version) select :1 from dual "
+                "where not exists (select 1 from tv_esquema where version = :2)",
+                (VERSION_ESQUEMA, VERSION_ESQUEMA),
+            )
+            if db.connection:
+                db.connection.commit()
+        logger.info("Tablas validadas/creadas correctamente (versión de esquema %d)", VERSION_ESQUEMA)
 
     except Exception as e:
-
-        if db.connection:
-            try:
-                db.connection.rollback()
-                logger.info("Rollback ejecutado tras error al crear tablas")
-            except Exception:
-                logger.exception("Error ejecutando rollback")
         logger.error("Error al crear/validar tablas: %s", e)
         raise
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except Exception:
-                logger.exception("Error cerrando cursor en validar_tablas")
\ No newline at end of file
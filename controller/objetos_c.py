@@ -1,182 +1,279 @@
-import re
-from datetime import date
-from typing import Any, Dict, List
-
-from model.objetos_m import InsumosModel, RecetasModel, ConsultasModel, AgendaModel
-
-
-SUS_KEYS = [
-    r";", r"--", r"/\*", r"\bOR\b", r"\bAND\b", r"\bUNION\b",
-    r"\bSELECT\b", r"\bINSERT\b", r"\bUPDATE\b", r"\bDELETE\b",
-    r"\bDROP\b", r"\bEXEC\b"
-]
-patron = re.compile("|".join(SUS_KEYS), re.IGNORECASE)
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.db_config import CREADO, DUPLICADO, ERROR
+from model.objetos_m import InsumosModel, RecetasModel, ConsultasModel, AgendaModel, ResultadoStock, CONFLICTO
+from model.disponibilidad_m import IndiceAgenda
+from model.alertas_m import MonitorStock
+from utils.esquemas import Esquema, Campo, ENTERO, DECIMAL, TEXTO, FECHA
+from utils.esquemas import SUS_KEYS, patron  # noqa: F401 (antes se definían aquí)
+
+
+# esquemas de entrada: el id es opcional al registrar (lo asigna la secuencia)
+# y obligatorio al editar
+ESQUEMA_INSUMO_NUEVO = Esquema(
+    [
+        Campo("id_insumo", ENTERO, opcional=True),
+        Campo("nombre", TEXTO, vacio=True, sql=True),
+        Campo("tipo", TEXTO, vacio=True, sql=True),
+        Campo("stock", ENTERO, minimo=0, error="Stock inválido"),
+        Campo("costo_usd", DECIMAL, minimo=0, error="costo_usd inválido"),
+    ],
+    conversion="id_insumo y stock deben ser números enteros. costo_usd debe ser numérico.",
+)
+ESQUEMA_INSUMO = ESQUEMA_INSUMO_NUEVO.requerido("id_insumo")
+
+ESQUEMA_RECETA_NUEVA = Esquema(
+    [
+        Campo("id_receta", ENTERO, opcional=True),
+        Campo("id_paciente", ENTERO),
+        Campo("id_medico", ENTERO),
+        Campo("descripcion", TEXTO, sql=True, error="Descripción inválida."),
+        Campo("medicamentos_recetados", TEXTO, sql=True, error="Medicamentos recetados inválidos."),
+        Campo("costo_clp", DECIMAL, minimo=0, error="costo_clp inválido"),
+    ],
+    conversion="id_receta, id_paciente e id_medico deben ser números enteros. costo_clp debe ser numérico.",
+    sql="No se puede ingresar código SQL en la descripción o medicamentos.",
+)
+ESQUEMA_RECETA = ESQUEMA_RECETA_NUEVA.requerido("id_receta")
+
+_IDS_INVALIDOS = "IDs inválidos (deben ser >= 0)."
+
+ESQUEMA_CONSULTA_NUEVA = Esquema(
+    [
+        Campo("id_consulta", ENTERO, opcional=True, minimo=0, error=_IDS_INVALIDOS),
+        Campo("id_paciente", ENTERO, minimo=0, error=_IDS_INVALIDOS),
+        Campo("id_medico", ENTERO, minimo=0, error=_IDS_INVALIDOS),
+        Campo("id_receta", ENTERO, opcional=True, minimo=0, error="id_receta inválido"),
+        Campo("fecha", FECHA, error="Fecha inválida"),
+        Campo("comentarios", TEXTO, vacio=True, sql=True, error="Comentarios inválidos"),
+        Campo("valor", DECIMAL, minimo=0, error="Valor inválido"),
+    ],
+    conversion="id_consulta, id_paciente e id_medico deben ser números enteros. valor debe ser numérico.",
+)
+ESQUEMA_CONSULTA = ESQUEMA_CONSULTA_NUEVA.requerido("id_consulta")
+
+ESQUEMA_AGENDA_NUEVA = Esquema(
+    [
+        Campo("id_agenda", ENTERO, opcional=True, minimo=0, error=_IDS_INVALIDOS),
+        Campo("id_paciente", ENTERO, minimo=0, error=_IDS_INVALIDOS),
+        Campo("id_medico", ENTERO, minimo=0, error=_IDS_INVALIDOS),
+        Campo("fecha_consulta", FECHA, error="Fecha inválida"),
+        Campo("estado", TEXTO, sql=True, error="Estado inválido"),
+    ],
+    conversion="id_agenda, id_paciente e id_medico deben ser números enteros.",
+)
+ESQUEMA_AGENDA = ESQUEMA_AGENDA_NUEVA.requerido("id_agenda")
 
 
 class InsumosController:
-    def __init__(self, modelo: InsumosModel):
+    def __init__(self, modelo: InsumosModel, monitor: Optional[MonitorStock] = None):
         self.modelo = modelo
+        self.monitor = monitor
 
-    def registrar_insumo(self, id_insumo: int, nombre: str, tipo: str, stock: int, costo_usd: float) -> bool:
-
-        if patron.search(str(nombre)) or patron.search(str(tipo)):
-            print("[ERROR]: No se puede ingresar código SQL en los string.")
+    def registrar_insumo(self, id_insumo: Optional[int], nombre: str, tipo: str, stock: int, costo_usd: float) -> bool:
+        fila, error = ESQUEMA_INSUMO_NUEVO.validar((id_insumo, nombre, tipo, stock, costo_usd))
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
         try:
-            id_insumo = int(id_insumo)
-            stock = int(stock)
-            costo_usd = float(costo_usd)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_insumo y stock deben ser números enteros. costo_usd debe ser numérico.")
+            return self.modelo.guardar_item(*fila)
+        except Exception as e:
+            print("[ERROR]:", e)
             return False
 
-        if stock < 0:
-            print("[ERROR]: Stock inválido")
+    def editar_insumo(self, id_insumo: int, nombre: str, tipo: str, stock: int, costo_usd: float) -> bool:
+        fila, error = ESQUEMA_INSUMO.validar((id_insumo, nombre, tipo, stock, costo_usd))
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
-        if costo_usd < 0:
-            print("[ERROR]: costo_usd inválido")
+        try:
+            return self.modelo.editar_item(*fila)
+        except Exception as e:
+            print("[ERROR]:", e)
             return False
 
+    def eliminar_insumo(self, id_insumo: int) -> bool:
         try:
-            return self.modelo.guardar_item(id_insumo, nombre.strip(), tipo.strip(), stock, costo_usd)
+            id_insumo = int(id_insumo)
+        except (ValueError, TypeError):
+            print("[ERROR]: id_insumo debe ser un número entero.")
+            return False
+
+        try:
+            return self.modelo.eliminar_item(id_insumo)
         except Exception as e:
             print("[ERROR]:", e)
             return False
 
-    def editar_insumo(self, id_insumo: int, nombre: str, tipo: str, stock: int, costo_usd: float) -> bool:
-        if patron.search(str(nombre)) or patron.search(str(tipo)):
-            print("[ERROR]: No se puede ingresar código SQL en los string.")
-            return False
+    def consumir_insumo(self, id_insumo: int, cantidad: int) -> bool:
+        return self._mover_stock(self.modelo.consumir, id_insumo, cantidad, "consumidas")
 
+    def reservar_insumo(self, id_insumo: int, cantidad: int) -> bool:
+        return self._mover_stock(self.modelo.reservar, id_insumo, cantidad, "reservadas")
+
+    def reponer_insumo(self, id_insumo: int, cantidad: int) -> bool:
+        return self._mover_stock(self.modelo.reponer, id_insumo, cantidad, "repuestas")
+
+    def _mover_stock(self, operacion, id_insumo: int, cantidad: int, accion: str) -> bool:
         try:
             id_insumo = int(id_insumo)
-            stock = int(stock)
-            costo_usd = float(costo_usd)
+            cantidad = int(cantidad)
         except (ValueError, TypeError):
-            print("[ERROR]: id_insumo y stock deben ser números enteros. costo_usd debe ser numérico.")
+            print("[ERROR]: id_insumo y cantidad deben ser números enteros.")
             return False
 
-        if stock < 0:
-            print("[ERROR]: Stock inválido")
+        if cantidad <= 0:
+            print("[ERROR]: La cantidad debe ser mayor a 0")
             return False
 
-        if costo_usd < 0:
-            print("[ERROR]: costo_usd inválido")
+        resultado: ResultadoStock = operacion(id_insumo, cantidad)
+        if resultado.ok:
+            print(f"[INFO]: {cantidad} unidades del insumo ID {id_insumo} {accion} (stock actual {resultado.stock})")
+        else:
+            print(f"[ERROR]: {resultado.mensaje}")
+        return resultado.ok
+
+    def consumir_receta(self, items: List[Tuple[int, int]]) -> bool:
+        # items: (id_insumo, cantidad) de una receta; se descuentan todos o ninguno
+        try:
+            items = [(int(id_insumo), int(cantidad)) for id_insumo, cantidad in items]
+        except (ValueError, TypeError):
+            print("[ERROR]: id_insumo y cantidad deben ser números enteros.")
+            return False
+
+        if not items:
+            print("[ERROR]: La receta no tiene insumos")
+            return False
+
+        faltantes = self.modelo.consumir_lote(items)
+        for resultado in faltantes:
+            print(f"[ERROR]: {resultado.mensaje}")
+        if faltantes:
+            print("[ERROR]: No se descontó ningún insumo de la receta")
             return False
+        print(f"[INFO]: {len(items)} insumos descontados correctamente")
+        return True
 
+    def insumos_bajo_umbral(self) -> List[Dict[str, Any]]:
+        if self.monitor is None:
+            print("[ERROR]: Monitor de stock no disponible")
+            return []
         try:
+            return self.monitor.bajo_umbral()
+        except Exception as e:
+            print("[ERROR]:", e)
+            return []
 
-            return self.modelo.editar_item(id_insumo, nombre.strip(), tipo.strip(), stock, costo_usd)
+    def insumos_en_riesgo(self, cantidad: int = 10) -> List[Dict[str, Any]]:
+        if self.monitor is None:
+            print("[ERROR]: Monitor de stock no disponible")
+            return []
+        try:
+            return self.monitor.en_riesgo(int(cantidad))
         except Exception as e:
             print("[ERROR]:", e)
-            return False
+            return []
 
-    def eliminar_insumo(self, id_insumo: int) -> bool:
+    def fijar_umbral(self, id_insumo: int, umbral: int) -> bool:
+        if self.monitor is None:
+            print("[ERROR]: Monitor de stock no disponible")
+            return False
         try:
             id_insumo = int(id_insumo)
+            umbral = int(umbral)
         except (ValueError, TypeError):
-            print("[ERROR]: id_insumo debe ser un número entero.")
+            print("[ERROR]: id_insumo y umbral deben ser números enteros.")
+            return False
+
+        if umbral < 0:
+            print("[ERROR]: Umbral inválido")
             return False
 
+        return self.monitor.fijar_umbral(id_insumo, umbral)
+
+    def obtener_insumo(self, id_insumo: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo.obtener_por_id(id_insumo)
+        return self._a_dict(fila) if fila else None
+
+    def listar_insumos(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_insumos())
+
+    def listar_insumos_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            return self.modelo.eliminar_item(id_insumo)
+            insumos = self.modelo.mostrar_pagina(pagina, limite)
         except Exception as e:
             print("[ERROR]:", e)
-            return False
+            return []
 
-    def listar_insumos(self) -> List[Dict[str, Any]]:
+        return self._a_dicts(insumos)
+
+    def listar_insumos_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            insumos = self.modelo.mostrar_items()
+            insumos = self.modelo.mostrar_desde(ultimo_id, limite)
         except Exception as e:
             print("[ERROR]:", e)
             return []
 
+        return self._a_dicts(insumos)
+
+    def iterar_insumos(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo.iterar_items(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print("[ERROR]:", e)
+
+    @classmethod
+    def _a_dicts(cls, insumos) -> List[Dict[str, Any]]:
         if not insumos:
             return []
 
-        return [
-            {
-                "id_insumo": i[0],
-                "nombre": i[1],
-                "tipo": i[2],
-                "stock": i[3],
-                "costo_usd": i[4],
-            }
-            for i in insumos
-        ]
+        return [cls._a_dict(i) for i in insumos]
+
+    @staticmethod
+    def _a_dict(i) -> Dict[str, Any]:
+        return {
+            "id_insumo": i[0],
+            "nombre": i[1],
+            "tipo": i[2],
+            "stock": i[3],
+            "costo_usd": i[4],
+        }
 
 
 class RecetasController:
     def __init__(self, modelo: RecetasModel):
         self.modelo = modelo
 
-    def registrar_receta(self, id_receta: int, id_paciente: int, id_medico: int, descripcion: str,
+    def registrar_receta(self, id_receta: Optional[int], id_paciente: int, id_medico: int, descripcion: str,
                          medicamentos_recetados: str, costo_clp: float) -> bool:
-        if patron.search(str(descripcion)) or patron.search(str(medicamentos_recetados)):
-            print("[ERROR]: No se puede ingresar código SQL en la descripción o medicamentos.")
+        fila, error = ESQUEMA_RECETA_NUEVA.validar(
+            (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
+        )
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
         try:
-            id_receta = int(id_receta)
-            id_paciente = int(id_paciente)
-            id_medico = int(id_medico)
-            costo_clp = float(costo_clp)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_receta, id_paciente e id_medico deben ser números enteros. costo_clp debe ser numérico.")
-            return False
-
-        if costo_clp < 0:
-            print("[ERROR]: costo_clp inválido")
-            return False
-
-        if not isinstance(descripcion, str) or not descripcion.strip():
-            print("[ERROR]: Descripción inválida.")
-            return False
-
-        if not isinstance(medicamentos_recetados, str) or not medicamentos_recetados.strip():
-            print("[ERROR]: Medicamentos recetados inválidos.")
-            return False
-
-        try:
-            return self.modelo.guardar_item(id_receta, id_paciente, id_medico, descripcion.strip(),
-                                            medicamentos_recetados.strip(), costo_clp)
+            return self.modelo.guardar_item(*fila)
         except Exception as e:
             print("[ERROR]:", e)
             return False
 
     def editar_receta(self, id_receta: int, id_paciente: int, id_medico: int, descripcion: str,
                       medicamentos_recetados: str, costo_clp: float) -> bool:
-        if patron.search(str(descripcion)) or patron.search(str(medicamentos_recetados)):
-            print("[ERROR]: No se puede ingresar código SQL en la descripción o medicamentos.")
+        fila, error = ESQUEMA_RECETA.validar(
+            (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
+        )
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
         try:
-            id_receta = int(id_receta)
-            id_paciente = int(id_paciente)
-            id_medico = int(id_medico)
-            costo_clp = float(costo_clp)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_receta, id_paciente e id_medico deben ser números enteros. costo_clp debe ser numérico.")
-            return False
-
-        if costo_clp < 0:
-            print("[ERROR]: costo_clp inválido")
-            return False
-
-        if not isinstance(descripcion, str) or not descripcion.strip():
-            print("[ERROR]: Descripción inválida.")
-            return False
-
-        if not isinstance(medicamentos_recetados, str) or not medicamentos_recetados.strip():
-            print("[ERROR]: Medicamentos recetados inválidos.")
-            return False
-
-        try:
-
-            return self.modelo.editar_item(id_receta, id_paciente, id_medico, descripcion.strip(),
-                                           medicamentos_recetados.strip(), costo_clp)
+            return self.modelo.editar_item(*fila)
         except Exception as e:
             print("[ERROR]:", e)
             return False
@@ -194,116 +291,83 @@ class RecetasController:
             print("[ERROR]:", e)
             return False
 
+    def obtener_receta(self, id_receta: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo.obtener_por_id(id_receta)
+        return self._a_dict(fila) if fila else None
+
     def listar_recetas(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_recetas())
+
+    def listar_recetas_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            recetas = self.modelo.mostrar_items()
+            recetas = self.modelo.mostrar_pagina(pagina, limite)
         except Exception as e:
             print("[ERROR]:", e)
             return []
 
+        return self._a_dicts(recetas)
+
+    def listar_recetas_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
+        try:
+            recetas = self.modelo.mostrar_desde(ultimo_id, limite)
+        except Exception as e:
+            print("[ERROR]:", e)
+            return []
+
+        return self._a_dicts(recetas)
+
+    def iterar_recetas(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo.iterar_items(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print("[ERROR]:", e)
+
+    @classmethod
+    def _a_dicts(cls, recetas) -> List[Dict[str, Any]]:
         if not recetas:
             return []
 
-        return [
-            {
-                "id_receta": r[0],
-                "id_paciente": r[1],
-                "id_medico": r[2],
-                "descripcion": r[3],
-                "medicamentos_recetados": r[4],
-                "costo_clp": r[5],
-            }
-            for r in recetas
-        ]
+        return [cls._a_dict(r) for r in recetas]
+
+    @staticmethod
+    def _a_dict(r) -> Dict[str, Any]:
+        return {
+            "id_receta": r[0],
+            "id_paciente": r[1],
+            "id_medico": r[2],
+            "descripcion": r[3],
+            "medicamentos_recetados": r[4],
+            "costo_clp": r[5],
+        }
 
 
 class ConsultasController:
     def __init__(self, modelo: ConsultasModel):
         self.modelo = modelo
 
-    def registrar_consulta(self, id_consulta: int, id_paciente: int, id_medico: int,
+    def registrar_consulta(self, id_consulta: Optional[int], id_paciente: int, id_medico: int,
                            id_receta: int, fecha: date, comentarios: str, valor: float) -> bool:
-        if patron.search(str(comentarios)):
-            print("[ERROR]: No se puede ingresar código SQL en los string.")
+        fila, error = ESQUEMA_CONSULTA_NUEVA.validar((id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor))
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
         try:
-            id_consulta = int(id_consulta)
-            id_paciente = int(id_paciente)
-            id_medico = int(id_medico)
-            if id_receta is not None:
-                id_receta = int(id_receta)
-            valor = float(valor)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_consulta, id_paciente e id_medico deben ser números enteros. valor debe ser numérico.")
-            return False
-
-        if id_consulta < 0 or id_paciente < 0 or id_medico < 0:
-            print("[ERROR]: IDs inválidos (deben ser >= 0).")
-            return False
-
-        if id_receta is not None and id_receta < 0:
-            print("[ERROR]: id_receta inválido")
-            return False
-
-        if not isinstance(fecha, date):
-            print("[ERROR]: Fecha inválida")
-            return False
-
-        if not isinstance(comentarios, str):
-            print("[ERROR]: Comentarios inválidos")
-            return False
-
-        if valor < 0:
-            print("[ERROR]: Valor inválido")
-            return False
-
-        try:
-            return self.modelo.guardar_item(id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios.strip(), valor)
+            return self.modelo.guardar_item(*fila)
         except Exception as e:
             print("[ERROR]:", e)
             return False
 
     def editar_consulta(self, id_consulta: int, id_paciente: int, id_medico: int,
                         id_receta: int, fecha: date, comentarios: str, valor: float) -> bool:
-        if patron.search(str(comentarios)):
-            print("[ERROR]: No se puede ingresar código SQL en los string.")
+        fila, error = ESQUEMA_CONSULTA.validar((id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor))
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
         try:
-            id_consulta = int(id_consulta)
-            id_paciente = int(id_paciente)
-            id_medico = int(id_medico)
-            if id_receta is not None:
-                id_receta = int(id_receta)
-            valor = float(valor)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_consulta, id_paciente e id_medico deben ser números enteros. valor debe ser numérico.")
-            return False
-
-        if id_consulta < 0 or id_paciente < 0 or id_medico < 0:
-            print("[ERROR]: IDs inválidos (deben ser >= 0).")
-            return False
-
-        if id_receta is not None and id_receta < 0:
-            print("[ERROR]: id_receta inválido")
-            return False
-
-        if not isinstance(fecha, date):
-            print("[ERROR]: Fecha inválida")
-            return False
-
-        if not isinstance(comentarios, str):
-            print("[ERROR]: Comentarios inválidos")
-            return False
-
-        if valor < 0:
-            print("[ERROR]: Valor inválido")
-            return False
-
-        try:
-
-            return self.modelo.editar_item(id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios.strip(), valor)
+            return self.modelo.editar_item(*fila)
         except Exception as e:
             print("[ERROR]:", e)
             return False
@@ -321,124 +385,209 @@ class ConsultasController:
             print("[ERROR]:", e)
             return False
 
+    def obtener_consulta(self, id_consulta: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo.obtener_por_id(id_consulta)
+        return self._a_dict(fila) if fila else None
+
     def listar_consultas(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_consultas())
+
+    def listar_consultas_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
+        try:
+            consultas = self.modelo.mostrar_pagina(pagina, limite)
+        except Exception as e:
+            print("[ERROR]:", e)
+            return []
+
+        return self._a_dicts(consultas)
+
+    def listar_consultas_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            consultas = self.modelo.mostrar_items()
+            consultas = self.modelo.mostrar_desde(ultimo_id, limite)
         except Exception as e:
             print("[ERROR]:", e)
             return []
 
+        return self._a_dicts(consultas)
+
+    def iterar_consultas(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo.iterar_items(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print("[ERROR]:", e)
+
+    @classmethod
+    def _a_dicts(cls, consultas) -> List[Dict[str, Any]]:
         if not consultas:
             return []
 
-        return [
-            {
-                "id_consulta": c[0],
-                "id_paciente": c[1],
-                "id_medico": c[2],
-                "id_receta": c[3],
-                "fecha": c[4],
-                "comentarios": c[5],
-                "valor": c[6],
-            }
-            for c in consultas
-        ]
+        return [cls._a_dict(c) for c in consultas]
+
+    @staticmethod
+    def _a_dict(c) -> Dict[str, Any]:
+        return {
+            "id_consulta": c[0],
+            "id_paciente": c[1],
+            "id_medico": c[2],
+            "id_receta": c[3],
+            "fecha": c[4],
+            "comentarios": c[5],
+            "valor": c[6],
+        }
 class AgendaController:
-    def __init__(self, modelo: AgendaModel):
+    def __init__(self, modelo: AgendaModel, indice: Optional[IndiceAgenda] = None):
         self.modelo = modelo
+        self.indice = indice
 
-    def registrar_agenda(self, id_agenda: int, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> bool:
-        if patron.search(str(estado)):
-            print("[ERROR]: No se puede ingresar código SQL en los string.")
+    def registrar_agenda(self, id_agenda: Optional[int], id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> bool:
+        fila, error = ESQUEMA_AGENDA_NUEVA.validar((id_agenda, id_paciente, id_medico, fecha_consulta, estado))
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
+        # el modelo actualiza el índice tras el commit
         try:
-            id_agenda = int(id_agenda)
-            id_paciente = int(id_paciente)
-            id_medico = int(id_medico)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_agenda, id_paciente e id_medico deben ser números enteros.")
+            return self.modelo.guardar_item(*fila)
+        except Exception as e:
+            print("[ERROR]:", e)
             return False
 
-        if id_agenda < 0 or id_paciente < 0 or id_medico < 0:
-            print("[ERROR]: IDs inválidos (deben ser >= 0).")
-            return False
+    def registrar_agendas_lote(self, agendas: Iterable[Tuple[Any, ...]]) -> Dict[str, Any]:
+        """
+        agendas: tuplas (id_agenda o None, id_paciente, id_medico, fecha_consulta, estado).
+        Devuelve los totales y en "filas" un (estado, mensaje) por cada agenda recibida.
+        """
+        filas: List[Tuple[str, str]] = []
+        validas: List[Tuple[Any, ...]] = []
+        posiciones: List[int] = []
+        for posicion, (fila, error) in enumerate(ESQUEMA_AGENDA_NUEVA.validar_lote(agendas)):
+            if error:
+                filas.append((ERROR, error))
+                continue
+            # las fechas sin hora quedan a las 00:00 para poder compararlas entre sí
+            if not isinstance(fila[3], datetime):
+                fila = fila[:3] + (datetime.combine(fila[3], datetime.min.time()),) + fila[4:]
+            filas.append((CREADO, ""))
+            validas.append(fila)
+            posiciones.append(posicion)
 
-        if not isinstance(fecha_consulta, date):
-            print("[ERROR]: Fecha inválida")
-            return False
+        try:
+            resultados = self.modelo.reservar_lote(validas)
+        except Exception as e:
+            resultados = [(ERROR, str(e))] * len(validas)
+        for posicion, resultado in zip(posiciones, resultados):
+            filas[posicion] = resultado
 
-        if not isinstance(estado, str) or not estado.strip():
-            print("[ERROR]: Estado inválido")
+        reporte: Dict[str, Any] = {"insertados": 0, "conflictos": 0, "duplicados": 0, "errores": 0, "filas": filas}
+        claves = {CREADO: "insertados", CONFLICTO: "conflictos", DUPLICADO: "duplicados"}
+        for estado, _ in filas:
+            reporte[claves.get(estado, "errores")] += 1
+        return reporte
+
+    def editar_agenda(self, id_agenda: int, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> bool:
+        fila, error = ESQUEMA_AGENDA.validar((id_agenda, id_paciente, id_medico, fecha_consulta, estado))
+        if error:
+            print(f"[ERROR]: {error}")
             return False
 
         try:
-            return self.modelo.guardar_item(id_agenda, id_paciente, id_medico, fecha_consulta, estado.strip())
+            return self.modelo.editar_item(*fila)
         except Exception as e:
             print("[ERROR]:", e)
             return False
 
-    def editar_agenda(self, id_agenda: int, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> bool:
-        if patron.search(str(estado)):
-            print("[ERROR]: No se puede ingresar código SQL en los string.")
-            return False
-
+    def eliminar_agenda(self, id_agenda: int) -> bool:
         try:
             id_agenda = int(id_agenda)
-            id_paciente = int(id_paciente)
-            id_medico = int(id_medico)
         except (ValueError, TypeError):
-            print("[ERROR]: id_agenda, id_paciente e id_medico deben ser números enteros.")
+            print("[ERROR]: id_agenda debe ser un número entero.")
             return False
 
-        if id_agenda < 0 or id_paciente < 0 or id_medico < 0:
-            print("[ERROR]: IDs inválidos (deben ser >= 0).")
+        try:
+            return self.modelo.eliminar_item(id_agenda)
+        except Exception as e:
+            print("[ERROR]:", e)
             return False
 
-        if not isinstance(fecha_consulta, date):
-            print("[ERROR]: Fecha inválida")
-            return False
+    def horas_libres(self, id_medico: int, desde: date, hasta: date, cantidad: int = 10) -> List[datetime]:
+        if not self.indice:
+            print("[ERROR]: Índice de agenda no disponible")
+            return []
 
-        if not isinstance(estado, str) or not estado.strip():
-            print("[ERROR]: Estado inválido")
-            return False
+        try:
+            id_medico = int(id_medico)
+            cantidad = int(cantidad)
+        except (ValueError, TypeError):
+            print("[ERROR]: id_medico y cantidad deben ser números enteros.")
+            return []
+
+        if not isinstance(desde, date) or not isinstance(hasta, date) or hasta < desde:
+            print("[ERROR]: Rango de fechas inválido")
+            return []
 
         try:
-            return self.modelo.editar_item(id_agenda, id_paciente, id_medico, fecha_consulta, estado.strip())
+            return self.indice.horas_libres(id_medico, desde, hasta, max(1, cantidad))
         except Exception as e:
             print("[ERROR]:", e)
-            return False
+            return []
 
-    def eliminar_agenda(self, id_agenda: int) -> bool:
-        try:
-            id_agenda = int(id_agenda)
-        except (ValueError, TypeError):
-            print("[ERROR]: id_agenda debe ser un número entero.")
+    def hay_conflicto(self, id_medico: int, fecha_consulta: date, id_agenda: Optional[int] = None) -> bool:
+        # chequeo rápido en memoria para la interfaz; al guardar se vuelve a validar en la BD
+        if not self.indice:
             return False
 
         try:
-            return self.modelo.eliminar_item(id_agenda)
+            return self.indice.conflicto(int(id_medico), fecha_consulta, id_agenda) is not None
         except Exception as e:
             print("[ERROR]:", e)
             return False
 
+    def obtener_agenda(self, id_agenda: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo.obtener_por_id(id_agenda)
+        return self._a_dict(fila) if fila else None
+
     def listar_agendas(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_agendas())
+
+    def listar_agendas_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
+        try:
+            agendas = self.modelo.mostrar_pagina(pagina, limite)
+        except Exception as e:
+            print("[ERROR]:", e)
+            return []
+
+        return self._a_dicts(agendas)
+
+    def listar_agendas_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            agendas = self.modelo.mostrar_items()
+            agendas = self.modelo.mostrar_desde(ultimo_id, limite)
         except Exception as e:
             print("[ERROR]:", e)
             return []
 
+        return self._a_dicts(agendas)
+
+    def iterar_agendas(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo.iterar_items(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print("[ERROR]:", e)
+
+    @classmethod
+    def _a_dicts(cls, agendas) -> List[Dict[str, Any]]:
         if not agendas:
             return []
 
-        return [
-            {
-                "id_agenda": a[0],
-                "id_paciente": a[1],
-                "id_medico": a[2],
-                "fecha_consulta": a[3],
-                "estado": a[4],
-            }
-            for a in agendas
-        ]
\ No newline at end of file
+        return [cls._a_dict(a) for a in agendas]
+
+    @staticmethod
+    def _a_dict(a) -> Dict[str, Any]:
+        return {
+            "id_agenda": a[0],
+            "id_paciente": a[1],
+            "id_medico": a[2],
+            "fecha_consulta": a[3],
+            "estado": a[4],
+        }
\ No newline at end of file
@@ -1,5 +1,43 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from model.personas_m import UsuarioModel, PacienteModel, MedicoModel, AdministradorModel
+from utils.hash_claves import ServicioHash
+from utils.esquemas import Esquema, Campo, VALOR
+
+
+# los datos personales sólo se exigen presentes; el id es opcional al
+# registrar (None: lo asigna la secuencia sq_usuario) pero no puede ser 0 ni ""
+_CAMPOS_USUARIO = [
+    Campo(nombre, VALOR)
+    for nombre in ("nombre_usuario", "clave", "nombre", "apellido", "fecha_nacimiento", "telefono", "email", "tipo")
+]
+
+
+def _esquema_persona(id_campo: str, entidad: str, *extras: str) -> Esquema:
+    return Esquema(
+        [Campo(id_campo, VALOR, opcional=True)] + _CAMPOS_USUARIO + [Campo(nombre, VALOR) for nombre in extras],
+        faltante=f"Datos faltantes para registro de {entidad}.",
+    )
+
+
+ESQUEMA_USUARIO = _esquema_persona("id_usuario", "usuario")
+# en la carga masiva cada fila trae su id
+ESQUEMA_USUARIO_LOTE = ESQUEMA_USUARIO.requerido("id_usuario")
+ESQUEMA_USUARIO_NUEVO = Esquema(_CAMPOS_USUARIO, faltante="Datos faltantes para registro de usuario.")
+ESQUEMA_PACIENTE = _esquema_persona("id_paciente", "paciente", "comuna", "fecha_primera_visita")
+ESQUEMA_MEDICO = _esquema_persona("id_medico", "médico", "especialidad", "horario_atencion", "fecha_ingreso")
+ESQUEMA_ADMINISTRADOR = _esquema_persona("id_administrador", "administrador")
+
+
+def _crear_usuario(modelo: UsuarioModel, id_usuario: Optional[int], *datos: Any) -> Optional[int]:
+    if id_usuario is not None:
+        return id_usuario if modelo.crear(id_usuario, *datos) else None
+
+    resultado = modelo.insertar_nuevo(*datos)
+    if not resultado.creado:
+        print(f"[ERROR]: {resultado.mensaje}")
+        return None
+    print(f"[INFO]: Usuario {datos[0]} (id {resultado.id}) guardado correctamente")
+    return resultado.id
 
 
 class UsuarioController:
@@ -18,8 +56,11 @@ class UsuarioController:
         email,
         tipo,
     ) -> bool:
-        if not id_usuario or not nombre_usuario or not clave or not nombre or not apellido or not fecha_nacimiento or not telefono or not email or not tipo:
-            print("[Error]: Datos faltantes para registro de usuario.")
+        _, error = ESQUEMA_USUARIO.validar(
+            (id_usuario, nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo)
+        )
+        if error:
+            print(f"[Error]: {error}")
             return False
 
         try:
@@ -38,33 +79,151 @@ class UsuarioController:
             print(f"[ERROR]: Excepción al registrar usuario -> {e}")
             return False
 
+    def registrar_usuario_nuevo(
+        self,
+        nombre_usuario,
+        clave,
+        nombre,
+        apellido,
+        fecha_nacimiento,
+        telefono,
+        email,
+        tipo,
+    ) -> Optional[int]:
+        _, error = ESQUEMA_USUARIO_NUEVO.validar(
+            (nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo)
+        )
+        if error:
+            print(f"[Error]: {error}")
+            return None
+
+        try:
+            return _crear_usuario(
+                self.modelo,
+                None,
+                nombre_usuario,
+                clave,
+                nombre,
+                apellido,
+                fecha_nacimiento,
+                telefono,
+                email,
+                tipo,
+            )
+        except Exception as e:
+            print(f"[ERROR]: Excepción al registrar usuario -> {e}")
+            return None
+
+    def obtener_usuario(self, id_usuario: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo.obtener_por_id(id_usuario)
+        return self._a_dict(fila) if fila else None
+
     def listar_usuarios(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_usuarios())
+
+    def listar_usuarios_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
+        try:
+            usuarios = self.modelo.mostrar_pagina(pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Excepción al listar usuarios -> {e}")
+            return []
+
+        return self._a_dicts(usuarios)
+
+    def listar_usuarios_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            usuarios = self.modelo.mostrar_todos()
+            usuarios = self.modelo.mostrar_desde(ultimo_id, limite)
         except Exception as e:
             print(f"[ERROR]: Excepción al listar usuarios -> {e}")
             return []
 
-        if usuarios and len(usuarios) > 0:
-            return [
-                {
-                    "id_usuario": u[0],
-                    "nombre_usuario": u[1],
-                    "clave": u[2] if len(u) > 2 else None,
-                    "nombre": u[2] if len(u) == 3 else u[3] if len(u) > 3 else None,
-                    "apellido": u[4] if len(u) > 4 else None,
-                    "fecha_nacimiento": u[5] if len(u) > 5 else None,
-                    "telefono": u[6] if len(u) > 6 else None,
-                    "email": u[7] if len(u) > 7 else None,
-                    "tipo": u[8] if len(u) > 8 else None,
-                }
-                for u in usuarios
-            ]
-        else:
+        return self._a_dicts(usuarios)
+
+    def iterar_usuarios(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo.iterar_items(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print(f"[ERROR]: Excepción al listar usuarios -> {e}")
+
+    @classmethod
+    def _a_dicts(cls, usuarios) -> List[Dict[str, Any]]:
+        if not usuarios:
             return []
+
+        return [cls._a_dict(u) for u in usuarios]
+
+    @staticmethod
+    def _a_dict(u) -> Dict[str, Any]:
+        return {
+            "id_usuario": u[0],
+            "nombre_usuario": u[1],
+            "clave": u[2] if len(u) > 2 else None,
+            "nombre": u[2] if len(u) == 3 else u[3] if len(u) > 3 else None,
+            "apellido": u[4] if len(u) > 4 else None,
+            "fecha_nacimiento": u[5] if len(u) > 5 else None,
+            "telefono": u[6] if len(u) > 6 else None,
+            "email": u[7] if len(u) > 7 else None,
+            "tipo": u[8] if len(u) > 8 else None,
+        }
         
     def existe_usuario(self, nombre_usuario: str) -> bool:
-        return self.usuario_model.existe_usuario(nombre_usuario)
+        return self.modelo.existe_usuario(nombre_usuario)
+
+    def usuarios_existentes(self) -> Tuple[Set[int], Set[str]]:
+        return self.modelo.usuarios_existentes()
+
+    def registrar_usuarios_lote(
+        self,
+        usuarios: Iterable[Tuple[Any, ...]],
+        tam_lote: int = 1000,
+        servicio_hash: Optional[ServicioHash] = None,
+        existentes: Optional[Tuple[Set[int], Set[str]]] = None,
+    ) -> Dict[str, Any]:
+        # con servicio_hash la clave de cada fila viene en texto plano y se
+        # hashea en paralelo, sólo para las filas que se van a insertar.
+        # existentes permite reutilizar (y actualizar) los ids/nombres ya
+        # leídos cuando la carga se hace en varios bloques
+        reporte: Dict[str, Any] = {"insertados": 0, "omitidos": [], "errores": []}
+        if existentes is None:
+            try:
+                existentes = self.modelo.usuarios_existentes()
+            except Exception as e:
+                print(f"[ERROR]: Excepción al leer usuarios existentes -> {e}")
+                reporte["errores"].append((None, str(e)))
+                return reporte
+        ids_existentes, nombres_existentes = existentes
+
+        usuarios = list(usuarios)
+        pendientes: List[Tuple[Any, ...]] = []
+        for original, (fila, error) in zip(usuarios, ESQUEMA_USUARIO_LOTE.validar_lote(usuarios)):
+            if error:
+                reporte["errores"].append((original[1] if len(original) > 1 else None, error))
+                continue
+            id_usuario, nombre_usuario = fila[0], fila[1]
+            if nombre_usuario in nombres_existentes or id_usuario in ids_existentes:
+                reporte["omitidos"].append(nombre_usuario)
+                continue
+            ids_existentes.add(id_usuario)
+            nombres_existentes.add(nombre_usuario)
+            pendientes.append(fila)
+
+        filas = pendientes
+        if servicio_hash is not None:
+            claves = servicio_hash.hashear_iter(fila[2] for fila in pendientes)
+            filas = (fila[:2] + (clave,) + fila[3:] for fila, clave in zip(pendientes, claves))
+
+        try:
+            insertados, errores = self.modelo.guardar_items_lote(filas, tam_lote)
+        except Exception as e:
+            print(f"[ERROR]: Excepción al registrar usuarios en lote -> {e}")
+            reporte["errores"].append((None, str(e)))
+            return reporte
+
+        reporte["insertados"] = insertados
+        for posicion, mensaje in errores:
+            reporte["errores"].append((pendientes[posicion][1], mensaje))
+        return reporte
 
 
 class PacienteController:
@@ -86,77 +245,92 @@ class PacienteController:
         comuna,
         fecha_primera_visita,
     ) -> bool:
-        if not all(
-            [
-                id_paciente,
-                nombre_usuario,
-                clave,
-                nombre,
-                apellido,
-                fecha_nacimiento,
-                telefono,
-                email,
-                tipo,
-                comuna,
-                fecha_primera_visita,
-            ]
-        ):
-            print("[Error]: Datos faltantes para registro de paciente.")
+        _, error = ESQUEMA_PACIENTE.validar(
+            (id_paciente, nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo, comuna, fecha_primera_visita)
+        )
+        if error:
+            print(f"[Error]: {error}")
             return False
 
+        # usuario y paciente se confirman juntos: un solo commit y sin
+        # filas huérfanas en tv_usuario si el segundo insert falla
         try:
-            crear_usuario = self.modelo_usuario.crear(
-                id_paciente,
-                nombre_usuario,
-                clave,
-                nombre,
-                apellido,
-                fecha_nacimiento,
-                telefono,
-                email,
-                tipo,
-            )
+            with self.modelo_usuario.db.transaccion() as tx:
+                id_paciente = _crear_usuario(
+                    self.modelo_usuario,
+                    id_paciente,
+                    nombre_usuario,
+                    clave,
+                    nombre,
+                    apellido,
+                    fecha_nacimiento,
+                    telefono,
+                    email,
+                    tipo,
+                )
+                if id_paciente is None or not self.modelo_paciente.crear(id_paciente, comuna, fecha_primera_visita):
+                    tx.deshacer()
+                    return False
+            return True
         except Exception as e:
-            print(f"[ERROR]: Excepción al crear usuario para paciente -> {e}")
+            print(f"[ERROR]: Excepción al registrar paciente -> {e}")
             return False
 
-        if not crear_usuario:
-            return False
+    def obtener_paciente(self, id_paciente: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo_paciente.obtener_por_id(id_paciente)
+        return self._a_dict(fila) if fila else None
+
+    def listar_pacientes(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_pacientes())
 
+    def listar_pacientes_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            crear_paciente = self.modelo_paciente.crear(id_paciente, comuna, fecha_primera_visita)
-            return crear_paciente
+            pacientes = self.modelo_paciente.mostrar_completo_pagina(pagina, limite)
         except Exception as e:
-            print(f"[ERROR]: Excepción al crear paciente -> {e}")
-            return False
+            print(f"[ERROR]: Excepción al listar pacientes -> {e}")
+            return []
 
-    def listar_pacientes(self) -> List[Dict[str, Any]]:
+        return self._a_dicts(pacientes)
+
+    def listar_pacientes_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            pacientes = self.modelo_paciente.mostrar_todos_completo()
+            pacientes = self.modelo_paciente.mostrar_completo_desde(ultimo_id, limite)
         except Exception as e:
             print(f"[ERROR]: Excepción al listar pacientes -> {e}")
             return []
 
-        if pacientes:
-            return [
-                {
-                    "id_paciente": p[0],
-                    "nombre_usuario": p[1],
-                    "clave": p[2],
-                    "nombre": p[3],
-                    "apellido": p[4],
-                    "fecha_nacimiento": p[5],
-                    "telefono": p[6],
-                    "email": p[7],
-                    "tipo": p[8],
-                    "comuna": p[9],
-                    "fecha_primera_visita": p[10],
-                }
-                for p in pacientes
-            ]
-        else:
+        return self._a_dicts(pacientes)
+
+    def iterar_pacientes(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo_paciente.iterar_completo(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print(f"[ERROR]: Excepción al listar pacientes -> {e}")
+
+    @classmethod
+    def _a_dicts(cls, pacientes) -> List[Dict[str, Any]]:
+        if not pacientes:
             return []
 
+        return [cls._a_dict(p) for p in pacientes]
+
+    @staticmethod
+    def _a_dict(p) -> Dict[str, Any]:
+        return {
+            "id_paciente": p[0],
+            "nombre_usuario": p[1],
+            "clave": p[2],
+            "nombre": p[3],
+            "apellido": p[4],
+            "fecha_nacimiento": p[5],
+            "telefono": p[6],
+            "email": p[7],
+            "tipo": p[8],
+            "comuna": p[9],
+            "fecha_primera_visita": p[10],
+        }
+
 
 class MedicoController:
     def __init__(self, modelo_usuario: UsuarioModel, modelo_medico: MedicoModel):
@@ -178,79 +352,93 @@ class MedicoController:
         horario_atencion,
         fecha_ingreso,
     ) -> bool:
-        if not all(
-            [
-                id_medico,
-                nombre_usuario,
-                clave,
-                nombre,
-                apellido,
-                fecha_nacimiento,
-                telefono,
-                email,
-                tipo,
-                especialidad,
-                horario_atencion,
-                fecha_ingreso,
-            ]
-        ):
-            print("[Error]: Datos faltantes para registro de médico.")
+        _, error = ESQUEMA_MEDICO.validar(
+            (id_medico, nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo, especialidad, horario_atencion, fecha_ingreso)
+        )
+        if error:
+            print(f"[Error]: {error}")
             return False
 
+        # usuario y médico se confirman juntos: un solo commit y sin
+        # filas huérfanas en tv_usuario si el segundo insert falla
         try:
-            crear_usuario = self.modelo_usuario.crear(
-                id_medico,
-                nombre_usuario,
-                clave,
-                nombre,
-                apellido,
-                fecha_nacimiento,
-                telefono,
-                email,
-                tipo,
-            )
+            with self.modelo_usuario.db.transaccion() as tx:
+                id_medico = _crear_usuario(
+                    self.modelo_usuario,
+                    id_medico,
+                    nombre_usuario,
+                    clave,
+                    nombre,
+                    apellido,
+                    fecha_nacimiento,
+                    telefono,
+                    email,
+                    tipo,
+                )
+                if id_medico is None or not self.modelo_medico.crear(id_medico, especialidad, horario_atencion, fecha_ingreso):
+                    tx.deshacer()
+                    return False
+            return True
         except Exception as e:
-            print(f"[ERROR]: Excepción al crear usuario para médico -> {e}")
+            print(f"[ERROR]: Excepción al registrar médico -> {e}")
             return False
 
-        if not crear_usuario:
-            return False
+    def obtener_medico(self, id_medico: int) -> Optional[Dict[str, Any]]:
+        fila = self.modelo_medico.obtener_por_id(id_medico)
+        return self._a_dict(fila) if fila else None
+
+    def listar_medicos(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_medicos())
 
+    def listar_medicos_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            crear_medico = self.modelo_medico.crear(id_medico, especialidad, horario_atencion, fecha_ingreso)
-            return crear_medico
+            medicos = self.modelo_medico.mostrar_completo_pagina(pagina, limite)
         except Exception as e:
-            print(f"[ERROR]: Excepción al crear médico -> {e}")
-            return False
+            print(f"[ERROR]: Excepción al listar médicos -> {e}")
+            return []
 
-    def listar_medicos(self) -> List[Dict[str, Any]]:
+        return self._a_dicts(medicos)
+
+    def listar_medicos_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            medicos = self.modelo_medico.mostrar_todos_completo()
+            medicos = self.modelo_medico.mostrar_completo_desde(ultimo_id, limite)
         except Exception as e:
             print(f"[ERROR]: Excepción al listar médicos -> {e}")
             return []
 
-        if medicos:
-            return [
-                {
-                    "id_medico": m[0],
-                    "nombre_usuario": m[1],
-                    "clave": m[2],
-                    "nombre": m[3],
-                    "apellido": m[4],
-                    "fecha_nacimiento": m[5],
-                    "telefono": m[6],
-                    "email": m[7],
-                    "tipo": m[8],
-                    "especialidad": m[9],
-                    "horario_atencion": m[10],
-                    "fecha_ingreso": m[11],
-                }
-                for m in medicos
-            ]
-        else:
+        return self._a_dicts(medicos)
+
+    def iterar_medicos(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo_medico.iterar_completo(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print(f"[ERROR]: Excepción al listar médicos -> {e}")
+
+    @classmethod
+    def _a_dicts(cls, medicos) -> List[Dict[str, Any]]:
+        if not medicos:
             return []
 
+        return [cls._a_dict(m) for m in medicos]
+
+    @staticmethod
+    def _a_dict(m) -> Dict[str, Any]:
+        return {
+            "id_medico": m[0],
+            "nombre_usuario": m[1],
+            "clave": m[2],
+            "nombre": m[3],
+            "apellido": m[4],
+            "fecha_nacimiento": m[5],
+            "telefono": m[6],
+            "email": m[7],
+            "tipo": m[8],
+            "especialidad": m[9],
+            "horario_atencion": m[10],
+            "fecha_ingreso": m[11],
+        }
+
 
 class AdministradorController:
     def __init__(self, modelo_usuario: UsuarioModel, modelo_administrador: AdministradorModel):
@@ -269,68 +457,81 @@ class AdministradorController:
         email,
         tipo,
     ) -> bool:
-        if not all(
-            [
-                id_administrador,
-                nombre_usuario,
-                clave,
-                nombre,
-                apellido,
-                fecha_nacimiento,
-                telefono,
-                email,
-                tipo,
-            ]
-        ):
-            print("[Error]: Datos faltantes para registro de administrador.")
+        _, error = ESQUEMA_ADMINISTRADOR.validar(
+            (id_administrador, nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo)
+        )
+        if error:
+            print(f"[Error]: {error}")
             return False
 
+        # usuario y administrador se confirman juntos: un solo commit y sin
+        # filas huérfanas en tv_usuario si el segundo insert falla
         try:
-            crear_usuario = self.modelo_usuario.crear(
-                id_administrador,
-                nombre_usuario,
-                clave,
-                nombre,
-                apellido,
-                fecha_nacimiento,
-                telefono,
-                email,
-                tipo,
-            )
+            with self.modelo_usuario.db.transaccion() as tx:
+                id_administrador = _crear_usuario(
+                    self.modelo_usuario,
+                    id_administrador,
+                    nombre_usuario,
+                    clave,
+                    nombre,
+                    apellido,
+                    fecha_nacimiento,
+                    telefono,
+                    email,
+                    tipo,
+                )
+                if id_administrador is None or not self.modelo_administrador.crear(id_administrador):
+                    tx.deshacer()
+                    return False
+            return True
         except Exception as e:
-            print(f"[ERROR]: Excepción al crear usuario para administrador -> {e}")
+            print(f"[ERROR]: Excepción al registrar administrador -> {e}")
             return False
 
-        if not crear_usuario:
-            return False
+    def listar_administradores(self) -> List[Dict[str, Any]]:
+        return list(self.iterar_administradores())
 
+    def listar_administradores_pagina(self, pagina: int = 1, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            crear_admin = self.modelo_administrador.crear(id_administrador)
-            return crear_admin
+            admins = self.modelo_administrador.mostrar_pagina(pagina, limite)
         except Exception as e:
-            print(f"[ERROR]: Excepción al crear administrador -> {e}")
-            return False
+            print(f"[ERROR]: Excepción al listar administradores -> {e}")
+            return []
 
-    def listar_administradores(self) -> List[Dict[str, Any]]:
+        return self._a_dicts(admins)
+
+    def listar_administradores_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Dict[str, Any]]:
         try:
-            admins = self.modelo_administrador.mostrar_items()
+            admins = self.modelo_administrador.mostrar_desde(ultimo_id, limite)
         except Exception as e:
             print(f"[ERROR]: Excepción al listar administradores -> {e}")
             return []
 
-        if admins:
-            return [
-                {
-                    "id_administrador": a[0],
-                    "nombre_usuario": a[1],
-                    "nombre": a[2],
-                    "apellido": a[3],
-                    "fecha_nacimiento": a[4],
-                    "telefono": a[5],
-                    "email": a[6],
-                    "tipo": a[7],
-                }
-                for a in admins
-            ]
-        else:
-            return []
\ No newline at end of file
+        return self._a_dicts(admins)
+
+    def iterar_administradores(self, tam_lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        try:
+            for fila in self.modelo_administrador.iterar_items(tam_lote):
+                yield self._a_dict(fila)
+        except Exception as e:
+            print(f"[ERROR]: Excepción al listar administradores -> {e}")
+
+    @classmethod
+    def _a_dicts(cls, admins) -> List[Dict[str, Any]]:
+        if not admins:
+            return []
+
+        return [cls._a_dict(a) for a in admins]
+
+    @staticmethod
+    def _a_dict(a) -> Dict[str, Any]:
+        return {
+            "id_administrador": a[0],
+            "nombre_usuario": a[1],
+            "nombre": a[2],
+            "apellido": a[3],
+            "fecha_nacimiento": a[4],
+            "telefono": a[5],
+            "email": a[6],
+            "tipo": a[7],
+        }
\ No newline at end of file
@@ -0,0 +1,75 @@
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+from model.reportes_m import ReportesModel, DIMENSIONES
+from model.resumenes_m import ResumenDashboard
+
+
+class ReportesController:
+    def __init__(self, modelo: ReportesModel):
+        self.modelo = modelo
+
+    def ingresos_consultas(
+        self, dimensiones: Sequence[str], desde: Optional[date] = None, hasta: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        if not self._rango_valido(desde, hasta):
+            return []
+        return self._a_dicts(dimensiones, self.modelo.ingresos_consultas(dimensiones, desde, hasta))
+
+    def ingresos_recetas(
+        self, dimensiones: Sequence[str], desde: Optional[date] = None, hasta: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        if not self._rango_valido(desde, hasta):
+            return []
+        return self._a_dicts(dimensiones, self.modelo.ingresos_recetas(dimensiones, desde, hasta))
+
+    def invalidar(self) -> None:
+        self.modelo.invalidar()
+
+    @staticmethod
+    def dimensiones_disponibles() -> List[str]:
+        return list(DIMENSIONES)
+
+    @staticmethod
+    def _rango_valido(desde: Optional[date], hasta: Optional[date]) -> bool:
+        if desde is not None and hasta is not None and desde > hasta:
+            print("[ERROR]: La fecha desde no puede ser posterior a hasta.")
+            return False
+        return True
+
+    @staticmethod
+    def _a_dicts(dimensiones: Sequence[str], filas) -> List[Dict[str, Any]]:
+        if not filas:
+            return []
+
+        n = len(dimensiones)
+        resultado = []
+        for fila in filas:
+            item = {d: fila[i] for i, d in enumerate(dimensiones)}
+            item["cantidad"] = fila[n]
+            item["total"] = fila[n + 1]
+            item["subtotal"] = fila[n + 2] != 0
+            # GROUPING_ID: la primera dimensión es el bit más alto
+            item["totalizadas"] = [d for i, d in enumerate(dimensiones) if fila[n + 2] >> (n - 1 - i) & 1]
+            resultado.append(item)
+        return resultado
+
+
+class PanelController:
+    def __init__(self, resumen: ResumenDashboard):
+        self.resumen = resumen
+
+    def panel(self) -> Dict[str, Any]:
+        try:
+            return self.resumen.resumen()
+        except Exception as e:
+            print(f"[ERROR]: Excepción al leer el panel -> {e}")
+            return {}
+
+    def reconciliar(self) -> bool:
+        try:
+            self.resumen.reconciliar()
+            return True
+        except Exception as e:
+            print(f"[ERROR]: Excepción al reconciliar el panel -> {e}")
+            return False
@@ -1,132 +1,88 @@
-import json
 import os
-from datetime import date
-import inspect
 import sys
-import bcrypt
 from datetime import date, datetime
-from typing import Any, Optional, Dict
-from utils.validaciones import normalizar_telefono
-try:
-    from config.db_config import conexion_oracle, validar_tablas
-except Exception:
-    try:
-        from config.configdb import conexion_oracle, validar_tablas
-    except Exception as e:
-        print("[ERROR]: No se encontró config.db_config ni config.configdb:", e)
-        sys.exit(1)
+from typing import TYPE_CHECKING, Any, Optional, Dict
+from utils.componentes import RegistroComponentes
+from utils.validaciones import normalizar_telefono, normalizar_telefonos
+from utils.lector_json import leer_json_stream, agrupar, leer_checkpoint, guardar_checkpoint, borrar_checkpoint
+
+if TYPE_CHECKING:
+    from config.db_config import conexion_oracle
+    from utils.hash_claves import ServicioHash, Verificacion
+
+
+# cada componente vive en un solo lugar y se importa la primera vez que se
+# usa: importar main no carga oracledb, bcrypt ni los modelos
+componentes = RegistroComponentes(
+    {
+        "conexion_oracle": "config.db_config:conexion_oracle",
+        "validar_tablas": "config.db_config:validar_tablas",
+        "ServicioHash": "utils.hash_claves:ServicioHash",
+        "UsuarioModel": "model.personas_m:UsuarioModel",
+        "PacienteModel": "model.personas_m:PacienteModel",
+        "MedicoModel": "model.personas_m:MedicoModel",
+        "AdministradorModel": "model.personas_m:AdministradorModel",
+        "InsumosModel": "model.objetos_m:InsumosModel",
+        "RecetasModel": "model.objetos_m:RecetasModel",
+        "ConsultasModel": "model.objetos_m:ConsultasModel",
+        "AgendaModel": "model.objetos_m:AgendaModel",
+        "IndiceAgenda": "model.disponibilidad_m:IndiceAgenda",
+        "ReportesModel": "model.reportes_m:ReportesModel",
+        "ResumenDashboard": "model.resumenes_m:ResumenDashboard",
+        "MonitorStock": "model.alertas_m:MonitorStock",
+        "ServicioAutenticacion": "model.autenticacion_m:ServicioAutenticacion",
+        "UsuarioController": "controller.personas_c:UsuarioController",
+        "PacienteController": "controller.personas_c:PacienteController",
+        "MedicoController": "controller.personas_c:MedicoController",
+        "AdministradorController": "controller.personas_c:AdministradorController",
+        "InsumosController": "controller.objetos_c:InsumosController",
+        "RecetasController": "controller.objetos_c:RecetasController",
+        "ConsultasController": "controller.objetos_c:ConsultasController",
+        "AgendaController": "controller.objetos_c:AgendaController",
+        "ReportesController": "controller.reportes_c:ReportesController",
+        "PanelController": "controller.reportes_c:PanelController",
+        "UsuarioView": "view.personas_v:UsuarioView",
+        "PacienteView": "view.personas_v:PacienteView",
+        "MedicoView": "view.personas_v:MedicoView",
+        "AdministradorView": "view.personas_v:AdministradorView",
+        "InsumosView": "view.objetos_v:InsumosView",
+        "RecetasView": "view.objetos_v:RecetasView",
+        "ConsultasView": "view.objetos_v:ConsultasView",
+        "AgendaView": "view.objetos_v:AgendaView",
+    }
+)
 
+# con esta variable (o --importtime) se listan al salir los tiempos de importación
+REPORTE_IMPORTACION = bool(os.environ.get("EVALUACION_IMPORTTIME")) or "--importtime" in sys.argv
 
-def try_import(module_names):
-    for m in module_names:
-        try:
-            mod = __import__(m, fromlist=["*"])
-            return mod
-        except Exception:
-            continue
-    return None
 
+# el costo de bcrypt se ajusta al hardware de cada terminal: ~BCRYPT_OBJETIVO_MS
+# por hash, con un piso de RONDAS_MIN (12). La calibración corre al crear el
+# servicio en crear_controllers, durante el arranque, no en el primer login
+BCRYPT_OBJETIVO_MS = 250
+_servicio_hash: Optional["ServicioHash"] = None
 
 
-mod_personas = try_import(
-    [
-        "model.m_personas",
-        "model.personas_m",
-        "model.personas",
-        "personas",  
-    ]
-)
-if mod_personas:
-    UsuarioModel = getattr(mod_personas, "UsuarioModel", None)
-    PacienteModel = getattr(mod_personas, "PacienteModel", None)
-    MedicoModel = getattr(mod_personas, "MedicoModel", None)
-    AdministradorModel = getattr(mod_personas, "AdministradorModel", None)
-else:
-    UsuarioModel = PacienteModel = MedicoModel = AdministradorModel = None
-
-
-mod_objetos = try_import(
-    [
-        "model.m_objetos",
-        "model.objetos_m",
-        "model.m_objetos",
-        "model.objetos",
-        "objetos", 
-    ]
-)
-if mod_objetos:
-    InsumosModel = getattr(mod_objetos, "InsumosModel", None)
-    RecetasModel = getattr(mod_objetos, "RecetasModel", None)
-    ConsultasModel = getattr(mod_objetos, "ConsultasModel", None)
-    AgendaModel = getattr(mod_objetos, "AgendaModel", None)
-else:
-    InsumosModel = RecetasModel = ConsultasModel = AgendaModel = None
-
-mod_ctrl_personas = try_import(
-    [
-        "personas_controller",
-        "controller.personas_c",
-        "controller.personas",
-        "controllers.personas",
-        "controller.personas_controller",
-    ]
-)
-if mod_ctrl_personas:
-    UsuarioController = getattr(mod_ctrl_personas, "UsuarioController", None)
-    PacienteController = getattr(mod_ctrl_personas, "PacienteController", None)
-    MedicoController = getattr(mod_ctrl_personas, "MedicoController", None)
-    AdministradorController = getattr(mod_ctrl_personas, "AdministradorController", None)
-else:
-    UsuarioController = PacienteController = MedicoController = AdministradorController = None
-
-mod_ctrl_objetos = try_import(
-    [
-        "controllers",
-        "controller.objetos_c",
-        "controller.objetos",
-        "controllers.objetos",
-        "objetos_controller",
-    ]
-)
-if mod_ctrl_objetos:
-    InsumosController = getattr(mod_ctrl_objetos, "InsumosController", None)
-    RecetasController = getattr(mod_ctrl_objetos, "RecetasController", None)
-    ConsultasController = getattr(mod_ctrl_objetos, "ConsultasController", None)
-    AgendaController = getattr(mod_ctrl_objetos, "AgendaController", None)
-else:
-    InsumosController = RecetasController = ConsultasController = AgendaController = None
-
-
-mod_view_personas = try_import(["personas_view", "view.personas_v", "view.personas", "personas_v"])
-if mod_view_personas:
-    UsuarioView = getattr(mod_view_personas, "UsuarioView", None)
-    PacienteView = getattr(mod_view_personas, "PacienteView", None)
-    MedicoView = getattr(mod_view_personas, "MedicoView", None)
-    AdministradorView = getattr(mod_view_personas, "AdministradorView", None)
-else:
-    UsuarioView = PacienteView = MedicoView = AdministradorView = None
-
-mod_view_objetos = try_import(["objetos_view", "view.objetos_v", "view.objetos", "objetos_v"])
-if mod_view_objetos:
-    InsumosView = getattr(mod_view_objetos, "InsumosView", None)
-    RecetasView = getattr(mod_view_objetos, "RecetasView", None)
-    ConsultasView = getattr(mod_view_objetos, "ConsultasView", None)
-    AgendaView = getattr(mod_view_objetos, "AgendaView", None)
-else:
-    InsumosView = RecetasView = ConsultasView = AgendaView = None
+def obtener_servicio_hash() -> "ServicioHash":
+    global _servicio_hash
+    if _servicio_hash is None:
+        _servicio_hash = componentes.ServicioHash(rondas=None, objetivo_ms=BCRYPT_OBJETIVO_MS)
+        print(f"[INFO]: bcrypt calibrado a {_servicio_hash.rondas} rondas")
+    return _servicio_hash
 
 
 def hacer_hash_clave(clave: str) -> str:
-    b = clave.encode("utf-8")
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(b, salt).decode("utf-8")
+    return obtener_servicio_hash().hashear(clave)
 
 
-def verificar_clave(clave_plana: str, clave_hash: str) -> bool:
-    try:
-        return bcrypt.checkpw(clave_plana.encode("utf-8"), clave_hash.encode("utf-8"))
-    except Exception:
-        return False
+def verificar_clave(clave_plana: str, clave_hash: str) -> "Verificacion":
+    # ok y si conviene reescribir el hash con el costo actual
+    return obtener_servicio_hash().verificar_con_rehash(clave_plana, clave_hash)
+
+
+def leer_id_opcional(mensaje: str) -> Optional[int]:
+    valor = input(mensaje).strip()
+    return int(valor) if valor else None
 
 
 def parse_fecha(s: Optional[str]) -> Optional[date]:
@@ -140,7 +96,18 @@ def parse_fecha(s: Optional[str]) -> Optional[date]:
     return None
 
 
-def instanciar_modelo(ModelClass: type, db: conexion_oracle):
+def parse_fecha_hora(s: Optional[str]) -> Optional[date]:
+    if not s:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M", "%d-%m-%Y %H:%M", "%Y/%m/%d %H:%M"):
+        try:
+            return datetime.strptime(s, fmt)
+        except Exception:
+            continue
+    return parse_fecha(s)
+
+
+def instanciar_modelo(ModelClass: type, db: "conexion_oracle"):
 
     try:
         return ModelClass(db)
@@ -148,6 +115,8 @@ def instanciar_modelo(ModelClass: type, db: conexion_oracle):
         pass
 
     try:
+        import inspect
+
         sig = inspect.signature(ModelClass.__init__)
         params = list(sig.parameters.values())[1:]  
         args = []
@@ -202,44 +171,53 @@ def instanciar_modelo(ModelClass: type, db: conexion_oracle):
 
 
 
-def crear_controllers(db: conexion_oracle) -> Dict[str, Any]:
-    if UsuarioModel is None or InsumosModel is None:
-        raise RuntimeError("No están disponibles los modelos básicos (UsuarioModel/InsumosModel). Revisa imports.")
-
-    usuario_model = instanciar_modelo(UsuarioModel, db)
-    paciente_model = instanciar_modelo(PacienteModel, db) if PacienteModel else None
-    medico_model = instanciar_modelo(MedicoModel, db) if MedicoModel else None
-    administrador_model = instanciar_modelo(AdministradorModel, db) if AdministradorModel else None
+def avisar_stock(evento) -> None:
+    if evento.tipo == "bajo_umbral":
+        print(f"[ALERTA]: {evento.nombre} (ID {evento.id_insumo}) quedó con stock {evento.stock}, bajo su mínimo de {evento.umbral}")
+    else:
+        print(f"[INFO]: {evento.nombre} (ID {evento.id_insumo}) repuesto: stock {evento.stock}, mínimo {evento.umbral}")
 
-    insumos_model = instanciar_modelo(InsumosModel, db)
-    recetas_model = instanciar_modelo(RecetasModel, db) if RecetasModel else None
-    consultas_model = instanciar_modelo(ConsultasModel, db) if ConsultasModel else None
-    agenda_model = instanciar_modelo(AgendaModel, db) if AgendaModel else None
 
+def crear_controllers(db: "conexion_oracle") -> Dict[str, Any]:
+    c = componentes
+    usuario_model = instanciar_modelo(c.UsuarioModel, db)
+    paciente_model = instanciar_modelo(c.PacienteModel, db)
+    medico_model = instanciar_modelo(c.MedicoModel, db)
+    administrador_model = instanciar_modelo(c.AdministradorModel, db)
 
-    if UsuarioController is None:
-        raise RuntimeError("UsuarioController no encontrado en tus controladores.")
-    usuario_ctrl = UsuarioController(usuario_model)
+    insumos_model = instanciar_modelo(c.InsumosModel, db)
+    recetas_model = instanciar_modelo(c.RecetasModel, db)
+    consultas_model = instanciar_modelo(c.ConsultasModel, db)
+    agenda_model = instanciar_modelo(c.AgendaModel, db)
 
-    paciente_ctrl = None
-    if PacienteController and paciente_model:
-        paciente_ctrl = PacienteController(usuario_model, paciente_model)
+    autenticacion = c.ServicioAutenticacion(db, servicio_hash=obtener_servicio_hash())
+    # todos escriben tv_usuario o un rol: cada edición o baja revoca sesiones y credencial en cache
+    for modelo in (usuario_model, paciente_model, medico_model, administrador_model):
+        modelo.autenticacion = autenticacion
 
-    medico_ctrl = None
-    if MedicoController and medico_model:
-        medico_ctrl = MedicoController(usuario_model, medico_model)
+    # un solo resumen compartido: cada modelo le informa sus escrituras
+    resumen = c.ResumenDashboard(db)
+    for modelo in (paciente_model, insumos_model, consultas_model, agenda_model):
+        modelo.resumen = resumen
 
-    administrador_ctrl = None
-    if AdministradorController and administrador_model:
-        administrador_ctrl = AdministradorController(usuario_model, administrador_model)
+    usuario_ctrl = c.UsuarioController(usuario_model)
+    paciente_ctrl = c.PacienteController(usuario_model, paciente_model)
+    medico_ctrl = c.MedicoController(usuario_model, medico_model)
+    administrador_ctrl = c.AdministradorController(usuario_model, administrador_model)
 
-    if InsumosController is None:
-        raise RuntimeError("InsumosController no encontrado en tus controladores.")
-    insumos_ctrl = InsumosController(insumos_model)
+    monitor_stock = c.MonitorStock(db)
+    insumos_model.monitor = monitor_stock
+    monitor_stock.resumen = resumen
+    monitor_stock.suscribir(avisar_stock)
+    insumos_ctrl = c.InsumosController(insumos_model, monitor_stock)
 
-    recetas_ctrl = RecetasController(recetas_model) if RecetasController and recetas_model else None
-    consultas_ctrl = ConsultasController(consultas_model) if ConsultasController and consultas_model else None
-    agenda_ctrl = AgendaController(agenda_model) if AgendaController and agenda_model else None
+    recetas_ctrl = c.RecetasController(recetas_model)
+    consultas_ctrl = c.ConsultasController(consultas_model)
+    indice_agenda = c.IndiceAgenda(db)
+    agenda_model.indice = indice_agenda
+    agenda_ctrl = c.AgendaController(agenda_model, indice_agenda)
+    reportes_ctrl = c.ReportesController(c.ReportesModel(db))
+    panel_ctrl = c.PanelController(resumen)
 
     return {
         "usuario_ctrl": usuario_ctrl,
@@ -250,45 +228,46 @@ def crear_controllers(db: conexion_oracle) -> Dict[str, Any]:
         "recetas_ctrl": recetas_ctrl,
         "consultas_ctrl": consultas_ctrl,
         "agenda_ctrl": agenda_ctrl,
+        "reportes_ctrl": reportes_ctrl,
+        "panel_ctrl": panel_ctrl,
+        "autenticacion": autenticacion,
     }
 
 
-def login_interactivo(db: conexion_oracle) -> Optional[int]:
+def login_interactivo(autenticacion) -> Optional[str]:
+    # devuelve el token de la sesión abierta
     try:
         usuario_login = input("Usuario: ").strip()
         clave_login = input("Clave: ").strip()
-        if not usuario_login or not clave_login:
-            print("[ERROR]: datos incompletos")
+        resultado = autenticacion.autenticar(usuario_login, clave_login)
+        if not resultado.ok:
+            print(f"[ERROR]: {resultado.mensaje}")
             return None
+        print("[INFO]: Ingreso correcto")
+        return resultado.token
+    except Exception as e:
+        print("[ERROR]: Error en login ->", e)
+        return None
 
-        cur = db.obtener_cursor()
-        try:
-            cur.execute("SELECT id_usuario, clave FROM tv_usuario WHERE nombre_usuario = :1", (usuario_login,))
-            row = cur.fetchone()
-        finally:
-            try:
-                cur.close()
-            except Exception:
-                pass
 
-        if row is None:
-            print("[ERROR]: Usuario no encontrado")
-            return None
+TAM_PAGINA = 20
 
-        id_usuario, clave_hash = row[0], row[1]
-        if not isinstance(clave_hash, str):
-            print("[ERROR]: Formato de clave en BD inesperado")
-            return None
 
-        if verificar_clave(clave_login, clave_hash):
-            print("[INFO]: Ingreso correcto")
-            return id_usuario
+def mostrar_paginado(listar_desde, mostrar, columna_id: str, tam_pagina: int = TAM_PAGINA) -> None:
+    ultimo_id = None
+    while True:
+        items = listar_desde(ultimo_id, tam_pagina)
+        if not items and ultimo_id is not None:
+            break
+        if mostrar:
+            mostrar(items)
         else:
-            print("[ERROR]: Credenciales incorrectas")
-            return None
-    except Exception as e:
-        print("[ERROR]: Error en login ->", e)
-        return None
+            print(items)
+        if len(items) < tam_pagina:
+            break
+        ultimo_id = items[-1][columna_id]
+        if input("Enter para ver más, 'q' para volver: ").strip().lower() == "q":
+            break
 
 
 def submenu_gestion_insumos(insumos_ctrl):
@@ -298,17 +277,21 @@ def submenu_gestion_insumos(insumos_ctrl):
         print("2) Agregar insumo")
         print("3) Editar insumo")
         print("4) Eliminar insumo")
+        print("5) Despachar insumos de una receta")
+        print("6) Reponer stock")
+        print("7) Insumos bajo su stock mínimo / más en riesgo")
+        print("8) Fijar stock mínimo de un insumo")
         print("0) Volver")
         opt = input("Opción: ").strip()
         if opt == "1":
-            items = insumos_ctrl.listar_insumos()
-            if InsumosView:
-                InsumosView.mostrar_insumos(items)
-            else:
-                print(items)
+            mostrar_paginado(
+                insumos_ctrl.listar_insumos_desde,
+                componentes.InsumosView.mostrar_insumos,
+                "id_insumo",
+            )
         elif opt == "2":
             try:
-                id_insumo = int(input("ID insumo: ").strip())
+                id_insumo = leer_id_opcional("ID insumo (vacío = automático): ")
                 nombre = input("Nombre: ").strip()
                 tipo = input("Tipo: ").strip()
                 stock = int(input("Stock: ").strip())
@@ -335,6 +318,39 @@ def submenu_gestion_insumos(insumos_ctrl):
                 print("OK" if ok else "FALLÓ")
             except Exception as e:
                 print("[ERROR]:", e)
+        elif opt == "5":
+            try:
+                raw = input("Insumos (id:cantidad separados por coma): ").strip()
+                items = [tuple(par.split(":")) for par in raw.split(",") if par.strip()]
+                ok = insumos_ctrl.consumir_receta(items)
+                print("OK" if ok else "FALLÓ")
+            except Exception as e:
+                print("[ERROR]:", e)
+        elif opt == "6":
+            try:
+                id_insumo = int(input("ID insumo: ").strip())
+                cantidad = int(input("Cantidad a reponer: ").strip())
+                ok = insumos_ctrl.reponer_insumo(id_insumo, cantidad)
+                print("OK" if ok else "FALLÓ")
+            except Exception as e:
+                print("[ERROR]:", e)
+        elif opt == "7":
+            bajos = insumos_ctrl.insumos_bajo_umbral()
+            if bajos:
+                print("Bajo su stock mínimo:")
+            else:
+                print("[INFO]: Ningún insumo bajo su stock mínimo. Más en riesgo:")
+                bajos = insumos_ctrl.insumos_en_riesgo(10)
+            for i in bajos:
+                print(f"  ID {i['id_insumo']:>6}  {i['nombre']:<30} stock {i['stock']:>6}  mínimo {i['stock_minimo']:>6}")
+        elif opt == "8":
+            try:
+                id_insumo = int(input("ID insumo: ").strip())
+                umbral = int(input("Stock mínimo: ").strip())
+                ok = insumos_ctrl.fijar_umbral(id_insumo, umbral)
+                print("OK" if ok else "FALLÓ")
+            except Exception as e:
+                print("[ERROR]:", e)
         elif opt == "0":
             break
         else:
@@ -351,14 +367,14 @@ def submenu_gestion_recetas(recetas_ctrl):
         print("0) Volver")
         opt = input("Opción: ").strip()
         if opt == "1":
-            items = recetas_ctrl.listar_recetas()
-            if RecetasView:
-                RecetasView.mostrar_recetas(items)
-            else:
-                print(items)
+            mostrar_paginado(
+                recetas_ctrl.listar_recetas_desde,
+                componentes.RecetasView.mostrar_recetas,
+                "id_receta",
+            )
         elif opt == "2":
             try:
-                id_receta = int(input("ID receta: ").strip())
+                id_receta = leer_id_opcional("ID receta (vacío = automático): ")
                 id_paciente = int(input("ID paciente: ").strip())
                 id_medico = int(input("ID medico: ").strip())
                 descripcion = input("Descripción: ").strip()
@@ -403,14 +419,14 @@ def submenu_gestion_consultas(consultas_ctrl):
         print("0) Volver")
         opt = input("Opción: ").strip()
         if opt == "1":
-            items = consultas_ctrl.listar_consultas()
-            if ConsultasView:
-                ConsultasView.mostrar_consultas(items)
-            else:
-                print(items)
+            mostrar_paginado(
+                consultas_ctrl.listar_consultas_desde,
+                componentes.ConsultasView.mostrar_consultas,
+                "id_consulta",
+            )
         elif opt == "2":
             try:
-                id_consulta = int(input("ID consulta: ").strip())
+                id_consulta = leer_id_opcional("ID consulta (vacío = automático): ")
                 id_paciente = int(input("ID paciente: ").strip())
                 id_medico = int(input("ID medico: ").strip())
                 id_receta_raw = input("ID receta (vacío si none): ").strip()
@@ -458,21 +474,23 @@ def submenu_gestion_agenda(agenda_ctrl):
         print("2) Agregar agenda")
         print("3) Editar agenda")
         print("4) Eliminar agenda")
+        print("5) Buscar horas libres de un médico")
+        print("6) Importar agendas desde JSON")
         print("0) Volver")
         opt = input("Opción: ").strip()
         if opt == "1":
-            items = agenda_ctrl.listar_agendas()
-            if AgendaView:
-                AgendaView.mostrar_agenda(items)
-            else:
-                print(items)
+            mostrar_paginado(
+                agenda_ctrl.listar_agendas_desde,
+                componentes.AgendaView.mostrar_agenda,
+                "id_agenda",
+            )
         elif opt == "2":
             try:
-                id_agenda = int(input("ID agenda: ").strip())
+                id_agenda = leer_id_opcional("ID agenda (vacío = automático): ")
                 id_paciente = int(input("ID paciente: ").strip())
                 id_medico = int(input("ID medico: ").strip())
-                fecha_raw = input("Fecha consulta (YYYY-MM-DD): ").strip()
-                fecha = parse_fecha(fecha_raw)
+                fecha_raw = input("Fecha consulta (YYYY-MM-DD HH:MM): ").strip()
+                fecha = parse_fecha_hora(fecha_raw)
                 estado = input("Estado: ").strip()
                 ok = agenda_ctrl.registrar_agenda(id_agenda, id_paciente, id_medico, fecha, estado)
                 print("OK" if ok else "FALLÓ")
@@ -483,8 +501,8 @@ def submenu_gestion_agenda(agenda_ctrl):
                 id_agenda = int(input("ID agenda a editar: ").strip())
                 id_paciente = int(input("ID paciente: ").strip())
                 id_medico = int(input("ID medico: ").strip())
-                fecha_raw = input("Fecha consulta (YYYY-MM-DD): ").strip()
-                fecha = parse_fecha(fecha_raw)
+                fecha_raw = input("Fecha consulta (YYYY-MM-DD HH:MM): ").strip()
+                fecha = parse_fecha_hora(fecha_raw)
                 estado = input("Estado: ").strip()
                 ok = agenda_ctrl.editar_agenda(id_agenda, id_paciente, id_medico, fecha, estado)
                 print("OK" if ok else "FALLÓ")
@@ -497,31 +515,145 @@ def submenu_gestion_agenda(agenda_ctrl):
                 print("OK" if ok else "FALLÓ")
             except Exception as e:
                 print("[ERROR]:", e)
+        elif opt == "5":
+            try:
+                id_medico = int(input("ID medico: ").strip())
+                desde = parse_fecha_hora(input("Desde (YYYY-MM-DD [HH:MM]): ").strip())
+                hasta = parse_fecha(input("Hasta (YYYY-MM-DD): ").strip())
+                if not desde or not hasta:
+                    print("[ERROR]: Fecha inválida")
+                    continue
+                libres = agenda_ctrl.horas_libres(id_medico, desde, hasta)
+                if not libres:
+                    print("[INFO]: Sin horas libres en el rango")
+                for bloque in libres:
+                    print(f"  {bloque:%Y-%m-%d %H:%M}")
+            except Exception as e:
+                print("[ERROR]:", e)
+        elif opt == "6":
+            ruta = input("Ruta del archivo JSON: ").strip()
+            cargar_agendas_desde_json(ruta, agenda_ctrl)
         elif opt == "0":
             break
         else:
             print("Opción inválida")
 
 
+def mostrar_reporte(filas, dimensiones) -> None:
+    if not filas:
+        print("[INFO]: Sin datos para el reporte")
+        return
+    for f in filas:
+        etiquetas = []
+        for d in dimensiones:
+            valor = f[d]
+            if d in f["totalizadas"]:
+                valor = "TOTAL"
+            elif valor is None:
+                valor = "(sin dato)"
+            elif isinstance(valor, (date, datetime)) and d == "mes":
+                valor = f"{valor:%Y-%m}"
+            etiquetas.append(f"{d}={valor}")
+        print(f"  {'  '.join(etiquetas):<45} cantidad={f['cantidad']:>6}  total={f['total']:>14,.0f}")
+
+
+def mostrar_panel(panel: Dict[str, Any]) -> None:
+    if not panel:
+        return
+    print(f"  Pacientes: {panel['pacientes']}")
+    estados = ", ".join(f"{e or '(sin estado)'}={n}" for e, n in sorted(panel["agenda_por_estado"].items()))
+    print(f"  Agenda por estado: {estados or 'sin agendas'}")
+    print(f"  Insumos con stock bajo: {panel['insumos_stock_bajo']} {panel['ids_stock_bajo'][:20]}")
+    print(f"  Ingresos de hoy: {panel['ingresos_hoy']:,.0f}")
+
+
+def submenu_reportes(reportes_ctrl):
+    while True:
+        print("\n--- Reportes de ingresos ---")
+        print("1) Ingresos por consultas")
+        print("2) Ingresos por recetas")
+        print("0) Volver")
+        opt = input("Opción: ").strip()
+        if opt == "0":
+            break
+        if opt not in ("1", "2"):
+            print("Opción inválida")
+            continue
+        try:
+            disponibles = ", ".join(reportes_ctrl.dimensiones_disponibles())
+            dimensiones = [d.strip() for d in input(f"Agrupar por ({disponibles}; ej: mes,medico): ").split(",") if d.strip()]
+            desde_raw = input("Desde (YYYY-MM-DD, vacío = sin límite): ").strip()
+            hasta_raw = input("Hasta (YYYY-MM-DD, vacío = sin límite): ").strip()
+            desde = parse_fecha(desde_raw) if desde_raw else None
+            hasta = parse_fecha(hasta_raw) if hasta_raw else None
+            if (desde_raw and not desde) or (hasta_raw and not hasta):
+                print("[ERROR]: Fecha inválida")
+                continue
+            if opt == "1":
+                filas = reportes_ctrl.ingresos_consultas(dimensiones, desde, hasta)
+            else:
+                filas = reportes_ctrl.ingresos_recetas(dimensiones, desde, hasta)
+            mostrar_reporte(filas, dimensiones)
+        except Exception as e:
+            print("[ERROR]:", e)
+
+
 DB_USER = "system"
 DB_PASS = "Tamara21."
 DB_DSN = "localhost:1521/xe"
-
-
-def conectar_bd() -> conexion_oracle:
-    db = conexion_oracle(DB_USER, DB_PASS, DB_DSN)
+DB_USAR_POOL = True
+DB_POOL_MIN = 1
+DB_POOL_MAX = 8
+
+
+def conectar_bd() -> "conexion_oracle":
+    db = componentes.conexion_oracle(
+        DB_USER,
+        DB_PASS,
+        DB_DSN,
+        usar_pool=DB_USAR_POOL,
+        pool_min=DB_POOL_MIN,
+        pool_max=DB_POOL_MAX,
+    )
     db.conectar()
     return db
 
-def cargar_usuarios_desde_json(ruta_json: str, usuario_ctrl):
+def preparar_usuario_json(u: Dict[str, Any], clave_hash: str, telefono: Optional[str] = None) -> tuple:
+    # telefono ya normalizado cuando la carga masiva lo hace por bloque
+    if telefono is None:
+        telefono = normalizar_telefono(u.get("phone", ""))
+
+    nombre_completo = u.get("name", "")
+    partes = nombre_completo.split(" ", 1)
+
+    nombre = partes[0]
+    apellido = partes[1] if len(partes) > 1 else ""
+
+    return (
+        u.get("id"),
+        u.get("username"),
+        clave_hash,
+        nombre,
+        apellido,
+        date(2000, 1, 1),
+        telefono,
+        u.get("email"),
+        "paciente",
+    )
+
+
+def cargar_usuarios_desde_json(ruta_json: str, usuario_ctrl, masivo: bool = False, tam_lote: int = 1000,
+                               reanudar: bool = True):
     if not os.path.exists(ruta_json):
         print(f"[ERROR]: Archivo no encontrado: {ruta_json}")
         return
 
-    with open(ruta_json, "r", encoding="utf-8") as f:
-        usuarios = json.load(f)
+    if masivo:
+        return cargar_usuarios_masivo(ruta_json, usuario_ctrl, tam_lote, reanudar)
 
-    for u in usuarios:
+    # un commit por fila: cada [OK] informado ya quedó guardado aunque una
+    # fila posterior falle (para cargas grandes está el modo masivo)
+    for _, u in leer_json_stream(ruta_json):
         username = u.get("username")
 
         try:
@@ -529,27 +661,7 @@ def cargar_usuarios_desde_json(ruta_json: str, usuario_ctrl):
                 print(f"[SKIP]: {username} ya está insertado")
                 continue
 
-            telefono = normalizar_telefono(u.get("phone", ""))
-
-            nombre_completo = u.get("name", "")
-            partes = nombre_completo.split(" ", 1)
-
-            nombre = partes[0]
-            apellido = partes[1] if len(partes) > 1 else ""
-
-            clave_hash = hacer_hash_clave("1234")
-
-            ok = usuario_ctrl.registrar_usuario(
-                u.get("id"),
-                username,
-                clave_hash,
-                nombre,
-                apellido,
-                date(2000, 1, 1),
-                telefono,
-                u.get("email"),
-                "paciente"
-            )
+            ok = usuario_ctrl.registrar_usuario(*preparar_usuario_json(u, hacer_hash_clave("1234")))
 
             if ok:
                 print(f"[OK]: {username} insertado correctamente")
@@ -560,12 +672,94 @@ def cargar_usuarios_desde_json(ruta_json: str, usuario_ctrl):
             print(f"[ERROR]: {username} omitido -> {e}")
 
 
+def cargar_usuarios_masivo(ruta_json: str, usuario_ctrl, tam_lote: int = 1000, reanudar: bool = True):
+    ruta_checkpoint = ruta_json + ".checkpoint"
+    desde = leer_checkpoint(ruta_checkpoint) if reanudar else 0
+    if desde:
+        print(f"[INFO]: Reanudando carga desde el byte {desde}")
+
+    try:
+        existentes = usuario_ctrl.usuarios_existentes()
+    except Exception as e:
+        print(f"[ERROR]: No se pudieron leer los usuarios existentes -> {e}")
+        return None
+
+    total = {"insertados": 0, "omitidos": 0, "errores": 0}
+    # se procesa un bloque a la vez: memoria acotada y checkpoint tras cada commit
+    for bloque in agrupar(leer_json_stream(ruta_json, desde), tam_lote):
+        filas = []
+        telefonos = normalizar_telefonos(u.get("phone", "") for _, u in bloque)
+        for (_, u), telefono in zip(bloque, telefonos):
+            try:
+                filas.append(preparar_usuario_json(u, "1234", telefono))
+            except Exception as e:
+                print(f"[ERROR]: {u.get('username')} omitido -> {e}")
+                total["errores"] += 1
+
+        # las claves van en texto plano: el controlador las hashea en paralelo
+        # sólo para las filas que efectivamente se insertan
+        reporte = usuario_ctrl.registrar_usuarios_lote(
+            filas, tam_lote, servicio_hash=obtener_servicio_hash(), existentes=existentes
+        )
+
+        for username in reporte["omitidos"]:
+            print(f"[SKIP]: {username} ya está insertado")
+        for username, motivo in reporte["errores"]:
+            print(f"[WARN]: {username} no se pudo insertar -> {motivo}")
+        total["insertados"] += reporte["insertados"]
+        total["omitidos"] += len(reporte["omitidos"])
+        total["errores"] += len(reporte["errores"])
+
+        guardar_checkpoint(ruta_checkpoint, bloque[-1][0])
+
+    borrar_checkpoint(ruta_checkpoint)
+    print(
+        f"[INFO]: Carga masiva terminada: {total['insertados']} insertados, "
+        f"{total['omitidos']} omitidos, {total['errores']} con error"
+    )
+    return total
+
+
+
+def cargar_agendas_desde_json(ruta_json: str, agenda_ctrl, tam_lote: int = 5000):
+    # cada objeto: {"id_agenda"?, "id_paciente", "id_medico", "fecha_consulta": "YYYY-MM-DD HH:MM", "estado"}
+    if not os.path.exists(ruta_json):
+        print(f"[ERROR]: Archivo no encontrado: {ruta_json}")
+        return None
+
+    total = {"insertados": 0, "conflictos": 0, "duplicados": 0, "errores": 0}
+    leidos = 0
+    for bloque in agrupar(leer_json_stream(ruta_json), tam_lote):
+        agendas = [
+            (
+                a.get("id_agenda"),
+                a.get("id_paciente"),
+                a.get("id_medico"),
+                parse_fecha_hora(str(a.get("fecha_consulta") or "")),
+                a.get("estado") or "agendada",
+            )
+            for _, a in bloque
+        ]
+        reporte = agenda_ctrl.registrar_agendas_lote(agendas)
+        for posicion, (estado, mensaje) in enumerate(reporte["filas"]):
+            if mensaje:
+                print(f"[WARN]: fila {leidos + posicion + 1} ({estado}) -> {mensaje}")
+        for clave in total:
+            total[clave] += reporte[clave]
+        leidos += len(bloque)
+
+    print(
+        f"[INFO]: Importación terminada: {total['insertados']} insertadas, {total['conflictos']} en conflicto, "
+        f"{total['duplicados']} duplicadas, {total['errores']} con error"
+    )
+    return total
+
 
 def main():
     db = conectar_bd()
     try:
         try:
-            validar_tablas(db)
+            componentes.validar_tablas(db)
         except Exception as e:
             print("[WARN]: validar_tablas falló:", e)
 
@@ -579,6 +773,10 @@ def main():
         recetas_ctrl = ctrls["recetas_ctrl"]
         consultas_ctrl = ctrls["consultas_ctrl"]
         agenda_ctrl = ctrls["agenda_ctrl"]
+        reportes_ctrl = ctrls["reportes_ctrl"]
+        panel_ctrl = ctrls["panel_ctrl"]
+        autenticacion = ctrls["autenticacion"]
+        sesion_token: Optional[str] = None
 
         while True:
             print("\n--- MENU PRINCIPAL ---")
@@ -590,12 +788,15 @@ def main():
             print("6) Gestionar Agenda")
             print("7) Listar usuarios / pacientes / médicos / administradores")
             print("8) Cargar usuarios desde JSON")
+            print("9) Reportes de ingresos")
+            print("10) Panel (resumen)")
+            print("11) Cerrar sesión")
             print("0) Salir")
             opt = input("Elija opción: ").strip()
 
             if opt == "1":
                 try:
-                    id_usuario = int(input("ID usuario: ").strip())
+                    id_usuario = leer_id_opcional("ID usuario (vacío = automático): ")
                     nombre_usuario = input("Nombre usuario: ").strip()
                     clave_plain = input("Clave: ").strip()
                     nombre = input("Nombre: ").strip()
@@ -610,46 +811,75 @@ def main():
                         print("[ERROR]: Fecha inválida")
                         continue
 
+                    # los datos del subtipo se piden antes: usuario y subtipo se
+                    # guardan en una sola transacción
+                    if tipo == "paciente" and paciente_ctrl:
+                        comuna = input("Comuna: ").strip()
+                        fpv_raw = input("Fecha primera visita (YYYY-MM-DD): ").strip()
+                        fpv = parse_fecha(fpv_raw)
+                        if not comuna or not fpv:
+                            print("[ERROR]: Comuna o fecha de primera visita inválida")
+                            continue
+                    elif tipo == "medico" and medico_ctrl:
+                        especialidad = input("Especialidad: ").strip()
+                        horario_raw = input("Horario (YYYY-MM-DD o cadena): ").strip()
+                        horario = parse_fecha(horario_raw) if horario_raw else horario_raw
+                        fecha_ingreso_raw = input("Fecha ingreso (YYYY-MM-DD): ").strip()
+                        fecha_ingreso = parse_fecha(fecha_ingreso_raw)
+                        if not especialidad or not fecha_ingreso:
+                            print("[ERROR]: Especialidad o fecha de ingreso inválida")
+                            continue
+
                     clave_hashed = hacer_hash_clave(clave_plain)
-                    ok = usuario_ctrl.registrar_usuario(
-                        id_usuario,
-                        nombre_usuario,
-                        clave_hashed,
-                        nombre,
-                        apellido,
-                        fecha_nacimiento,
-                        telefono,
-                        email,
-                        tipo,
-                    )
+                    if tipo == "paciente" and paciente_ctrl:
+                        ok = paciente_ctrl.registrar_paciente(id_usuario, nombre_usuario, clave_hashed, nombre, apellido,
+                                                              fecha_nacimiento, telefono, email, tipo, comuna, fpv)
+                    elif tipo == "medico" and medico_ctrl:
+                        ok = medico_ctrl.registrar_medico(id_usuario, nombre_usuario, clave_hashed, nombre, apellido,
+                                                          fecha_nacimiento, telefono, email, tipo, especialidad, horario,
+                                                          fecha_ingreso)
+                    elif tipo == "administrador" and administrador_ctrl:
+                        ok = administrador_ctrl.registrar_administrador(id_usuario, nombre_usuario, clave_hashed, nombre,
+                                                                        apellido, fecha_nacimiento, telefono, email, tipo)
+                    elif id_usuario is None:
+                        ok = usuario_ctrl.registrar_usuario_nuevo(
+                            nombre_usuario,
+                            clave_hashed,
+                            nombre,
+                            apellido,
+                            fecha_nacimiento,
+                            telefono,
+                            email,
+                            tipo,
+                        ) is not None
+                    else:
+                        ok = usuario_ctrl.registrar_usuario(
+                            id_usuario,
+                            nombre_usuario,
+                            clave_hashed,
+                            nombre,
+                            apellido,
+                            fecha_nacimiento,
+                            telefono,
+                            email,
+                            tipo,
+                        )
                     if ok:
                         print("[INFO]: Usuario creado.")
-                        if tipo == "paciente" and paciente_ctrl:
-                            comuna = input("Comuna: ").strip()
-                            fpv_raw = input("Fecha primera visita (YYYY-MM-DD): ").strip()
-                            fpv = parse_fecha(fpv_raw)
-                            if comuna and fpv:
-                                paciente_ctrl.registrar_paciente(id_usuario, nombre_usuario, clave_hashed, nombre, apellido,
-                                                                fecha_nacimiento, telefono, email, tipo, comuna, fpv)
-                        elif tipo == "medico" and medico_ctrl:
-                            especialidad = input("Especialidad: ").strip()
-                            horario_raw = input("Horario (YYYY-MM-DD o cadena): ").strip()
-                            horario = parse_fecha(horario_raw) if horario_raw else horario_raw
-                            fecha_ingreso_raw = input("Fecha ingreso (YYYY-MM-DD): ").strip()
-                            fecha_ingreso = parse_fecha(fecha_ingreso_raw)
-                            if especialidad and fecha_ingreso:
-                                medico_ctrl.registrar_medico(id_usuario, nombre_usuario, clave_hashed, nombre, apellido,
-                                                            fecha_nacimiento, telefono, email, tipo, especialidad, horario, fecha_ingreso)
-                        elif tipo == "administrador" and administrador_ctrl:
-                            administrador_ctrl.registrar_administrador(id_usuario, nombre_usuario, clave_hashed, nombre, apellido,
-                                                                      fecha_nacimiento, telefono, email, tipo)
                     else:
                         print("[WARN]: No se pudo crear usuario (posible duplicado).")
                 except Exception as e:
                     print("[ERROR]:", e)
 
             elif opt == "2":
-                login_interactivo(db)
+                if not autenticacion:
+                    print("[WARN]: Servicio de autenticación no disponible.")
+                    continue
+                sesion = autenticacion.validar(sesion_token)
+                if sesion:
+                    print(f"[INFO]: Sesión activa de {sesion.nombre_usuario}; ciérrela para ingresar con otro usuario.")
+                    continue
+                sesion_token = login_interactivo(autenticacion)
 
             elif opt == "3":
                 submenu_gestion_insumos(insumos_ctrl)
@@ -674,45 +904,64 @@ def main():
 
             elif opt == "7":
                 try:
-                    usuarios = usuario_ctrl.listar_usuarios()
-                    if UsuarioView:
-                        UsuarioView.mostrar_usuarios(usuarios)
-                    else:
-                        print(usuarios)
+                    mostrar_paginado(
+                        usuario_ctrl.listar_usuarios_desde,
+                        componentes.UsuarioView.mostrar_usuarios,
+                        "id_usuario",
+                    )
                 except Exception as e:
                     print("[ERROR]:", e)
                 try:
                     if paciente_ctrl:
-                        pacientes = paciente_ctrl.listar_pacientes()
-                        if PacienteView:
-                            PacienteView.mostrar_pacientes(pacientes)
-                        else:
-                            print(pacientes)
+                        mostrar_paginado(
+                            paciente_ctrl.listar_pacientes_desde,
+                            componentes.PacienteView.mostrar_pacientes,
+                            "id_paciente",
+                        )
                 except Exception as e:
                     print("[ERROR]:", e)
                 try:
                     if medico_ctrl:
-                        medicos = medico_ctrl.listar_medicos()
-                        if MedicoView:
-                            MedicoView.mostrar_medicos(medicos)
-                        else:
-                            print(medicos)
+                        mostrar_paginado(
+                            medico_ctrl.listar_medicos_desde,
+                            componentes.MedicoView.mostrar_medicos,
+                            "id_medico",
+                        )
                 except Exception as e:
                     print("[ERROR]:", e)
                 try:
                     if administrador_ctrl:
-                        admins = administrador_ctrl.listar_administradores()
-                        if AdministradorView:
-                            AdministradorView.mostrar_administradores(admins)
-                        else:
-                            print(admins)
+                        mostrar_paginado(
+                            administrador_ctrl.listar_administradores_desde,
+                            componentes.AdministradorView.mostrar_administradores,
+                            "id_administrador",
+                        )
                 except Exception as e:
                     print("[ERROR]:", e)
 
             elif opt == "8":
                 ruta = input("Ruta del archivo JSON (ej: usuarios.json): ").strip()
-                cargar_usuarios_desde_json(ruta, usuario_ctrl)
+                masivo = input("¿Carga masiva por lotes? (s/n): ").strip().lower() == "s"
+                cargar_usuarios_desde_json(ruta, usuario_ctrl, masivo=masivo)
+
+            elif opt == "9":
+                if reportes_ctrl:
+                    submenu_reportes(reportes_ctrl)
+                else:
+                    print("[WARN]: Controlador de reportes no disponible.")
+
+            elif opt == "10":
+                if panel_ctrl:
+                    mostrar_panel(panel_ctrl.panel())
+                else:
+                    print("[WARN]: Panel no disponible.")
 
+            elif opt == "11":
+                if autenticacion and autenticacion.cerrar_sesion(sesion_token):
+                    print("[INFO]: Sesión cerrada.")
+                else:
+                    print("[INFO]: No hay una sesión abierta.")
+                sesion_token = None
 
             elif opt == "0":
                 print("Saliendo...")
@@ -722,10 +971,14 @@ def main():
                 print("Opción inválida")
 
     finally:
+        if _servicio_hash is not None:
+            _servicio_hash.cerrar()
         try:
             db.desconectar()
         except Exception:
             pass
+        if REPORTE_IMPORTACION:
+            componentes.reporte()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+import bisect
+import threading
+import time
+from config.db_config import conexion_oracle
+from model.resumenes_m import ResumenDashboard
+from typing import Optional, List, Tuple, Any, Dict, Callable, Iterable, NamedTuple, Set
+
+
+BAJO_UMBRAL = "bajo_umbral"
+REPUESTO = "repuesto"
+
+
+class EventoStock(NamedTuple):
+    tipo: str
+    id_insumo: int
+    nombre: str
+    stock: int
+    umbral: int
+
+
+class _Insumo:
+    def __init__(self, nombre: str, stock: int, umbral: int):
+        self.nombre = nombre
+        self.stock = stock
+        self.umbral = umbral
+
+    @property
+    def margen(self) -> int:
+        return self.stock - self.umbral
+
+
+class MonitorStock:
+    """
+    Índice en memoria de tv_insumos ordenado por margen (stock - stock_minimo):
+    los insumos bajo el umbral quedan al comienzo, así "bajo umbral" y "los N
+    más en riesgo" se leen sin recorrer la tabla. InsumosModel informa cada
+    escritura tras el commit; el índice completo se recarga cada `refresco_seg`
+    para ver lo que escribieron otras terminales. Cada vez que un insumo cruza
+    su umbral (en cualquiera de los dos sentidos) se avisa a los suscriptores.
+    """
+
+    CONSULTA_CARGA = "SELECT id_insumo, nombre, stock, stock_minimo FROM tv_insumos"
+    CONSULTA_UMBRAL = "UPDATE tv_insumos SET stock_minimo = :1 WHERE id_insumo = :2"
+    resumen: Optional[ResumenDashboard] = None
+
+    def __init__(self, conexion: conexion_oracle, refresco_seg: float = 300.0):
+        self.db = conexion
+        self.refresco_seg = float(refresco_seg)
+        self._insumos: Dict[int, _Insumo] = {}
+        # (margen, id_insumo) ordenado; bisect ubica y mueve cada insumo en O(log n)
+        self._indice: List[Tuple[int, int]] = []
+        self._sucios: Set[int] = set()
+        self._cargado_en: Optional[float] = None
+        self._suscriptores: List[Callable[[EventoStock], None]] = []
+        self._lock = threading.RLock()
+
+    def suscribir(self, funcion: Callable[[EventoStock], None]) -> None:
+        self._suscriptores.append(funcion)
+
+    # --- escrituras informadas por InsumosModel ---
+
+    def actualizar(self, id_insumo: int, stock: Optional[int], nombre: Optional[str] = None) -> None:
+        # stock None: el insumo se eliminó
+        self.db.despues_de_confirmar(lambda: self._emitir(self._poner(id_insumo, stock, nombre)))
+
+    def marcar_sucios(self, ids: Iterable[int]) -> None:
+        # se releen (una consulta IN) en la próxima lectura
+        ids = list(ids)
+
+        def marcar() -> None:
+            with self._lock:
+                self._sucios.update(ids)
+
+        self.db.despues_de_confirmar(marcar)
+
+    def fijar_umbral(self, id_insumo: int, umbral: int) -> bool:
+        try:
+            with self.db.cursor(autocommit=True) as cursor:
+                cursor.execute(self.CONSULTA_UMBRAL, (umbral, id_insumo))
+                if cursor.rowcount == 0:
+                    print(f"[ERROR]: El insumo con ID {id_insumo} no existe.")
+                    return False
+                self.db.escritura_confirmada()
+        except Exception as e:
+            print(f"[ERROR]: Error al fijar umbral del insumo ID {id_insumo} -> {e}")
+            return False
+
+        def aplicar() -> None:
+            with self._lock:
+                insumo = self._insumos.get(id_insumo)
+                evento = None
+                if insumo is not None:
+                    evento = self._mover(id_insumo, insumo, insumo.stock, umbral)
+            self._emitir([evento] if evento else [])
+
+        self.db.despues_de_confirmar(aplicar)
+        if self.resumen:
+            self.resumen.stock_minimo(id_insumo, umbral)
+        return True
+
+    # --- lecturas ---
+
+    def bajo_umbral(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._vigente()
+            fin = bisect.bisect_left(self._indice, (0, float("-inf")))
+            return [self._a_dict(id_insumo) for _, id_insumo in self._indice[:fin]]
+
+    def en_riesgo(self, cantidad: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._vigente()
+            return [self._a_dict(id_insumo) for _, id_insumo in self._indice[: max(0, int(cantidad))]]
+
+    def recargar(self) -> None:
+        with self.db.cursor() as cursor:
+            cursor.arraysize = 1000
+            cursor.prefetchrows = 1001
+            cursor.execute(self.CONSULTA_CARGA)
+            filas = cursor.fetchall()
+        with self._lock:
+            # la primera carga no avisa: ningún insumo "cruzó" su umbral todavía
+            primera = self._cargado_en is None
+            self._cargado_en = time.monotonic()
+            self._sucios.clear()
+            eventos = self._reemplazar(filas, completo=True)
+        self._emitir([] if primera else eventos)
+
+    # --- índice ---
+
+    def _vigente(self) -> None:
+        if self._cargado_en is None or time.monotonic() - self._cargado_en >= self.refresco_seg:
+            self.recargar()
+        elif self._sucios:
+            ids, self._sucios = list(self._sucios), set()
+            filas = self.db.obtener_por_ids(self.CONSULTA_CARGA, "id_insumo", ids)
+            faltantes = [(id_insumo, None, None, None) for id_insumo in ids if id_insumo not in filas]
+            self._emitir(self._reemplazar(list(filas.values()) + faltantes, completo=False))
+
+    def _reemplazar(self, filas, completo: bool) -> List[EventoStock]:
+        eventos = []
+        vistos = set()
+        for id_insumo, nombre, stock, umbral in filas:
+            vistos.add(id_insumo)
+            eventos.extend(self._poner(id_insumo, stock, nombre, umbral))
+        if completo:
+            for id_insumo in set(self._insumos) - vistos:
+                self._poner(id_insumo, None)
+        return eventos
+
+    def _poner(
+        self, id_insumo: int, stock: Optional[int], nombre: Optional[str] = None, umbral: Optional[int] = None
+    ) -> List[EventoStock]:
+        with self._lock:
+            insumo = self._insumos.get(id_insumo)
+            if stock is None:
+                if insumo is not None:
+                    self._quitar(id_insumo, insumo)
+                    del self._insumos[id_insumo]
+                return []
+            if insumo is None:
+                # sin índice cargado lo verá la carga; un insumo nuevo trae el
+                # stock_minimo por defecto de la tabla, se relee en la próxima lectura
+                if self._cargado_en is None:
+                    return []
+                if umbral is None:
+                    self._sucios.add(id_insumo)
+                    return []
+                insumo = _Insumo(nombre or "", int(stock), int(umbral))
+                self._insumos[id_insumo] = insumo
+                bisect.insort(self._indice, (insumo.margen, id_insumo))
+                return [self._evento(BAJO_UMBRAL, id_insumo, insumo)] if insumo.margen < 0 else []
+            if nombre:
+                insumo.nombre = nombre
+            evento = self._mover(id_insumo, insumo, int(stock), insumo.umbral if umbral is None else int(umbral))
+            return [evento] if evento else []
+
+    def _mover(self, id_insumo: int, insumo: _Insumo, stock: int, umbral: int) -> Optional[EventoStock]:
+        bajo_antes = insumo.margen < 0
+        self._quitar(id_insumo, insumo)
+        insumo.stock, insumo.umbral = stock, umbral
+        bisect.insort(self._indice, (insumo.margen, id_insumo))
+        bajo_ahora = insumo.margen < 0
+        if bajo_ahora and not bajo_antes:
+            return self._evento(BAJO_UMBRAL, id_insumo, insumo)
+        if bajo_antes and not bajo_ahora:
+            return self._evento(REPUESTO, id_insumo, insumo)
+        return None
+
+    def _quitar(self, id_insumo: int, insumo: _Insumo) -> None:
+        i = bisect.bisect_left(self._indice, (insumo.margen, id_insumo))
+        if i < len(self._indice) and self._indice[i] == (insumo.margen, id_insumo):
+            del self._indice[i]
+
+    @staticmethod
+    def _evento(tipo: str, id_insumo: int, insumo: _Insumo) -> EventoStock:
+        return EventoStock(tipo, id_insumo, insumo.nombre, insumo.stock, insumo.umbral)
+
+    def _emitir(self, eventos: List[EventoStock]) -> None:
+        for evento in eventos:
+            for funcion in self._suscriptores:
+                try:
+                    funcion(evento)
+                except Exception as e:
+                    print(f"[ERROR]: Error al notificar alerta de stock -> {e}")
+
+    def _a_dict(self, id_insumo: int) -> Dict[str, Any]:
+        insumo = self._insumos[id_insumo]
+        return {
+            "id_insumo": id_insumo,
+            "nombre": insumo.nombre,
+            "stock": insumo.stock,
+            "stock_minimo": insumo.umbral,
+            "margen": insumo.margen,
+        }
@@ -0,0 +1,354 @@
+import oracledb
+from config.db_config import conexion_oracle_async, ResultadoGuardado, CREADO, DUPLICADO, resultado_error, valor_retornado
+from model.personas_m import UsuarioModel, PacienteModel, MedicoModel, AdministradorModel
+from model.objetos_m import InsumosModel, RecetasModel, ConsultasModel, AgendaModel
+from model.objetos_m import CONFLICTO, DURACION_CITA_MIN, ESTADOS_LIBERADOS
+from model.disponibilidad_m import IndiceAgenda
+from model.alertas_m import MonitorStock
+from model.resumenes_m import ResumenDashboard
+from model.autenticacion_m import ServicioAutenticacion
+from utils.cache import caches_de
+from typing import Optional, List, Tuple, Any, AsyncIterator
+
+
+class ModeloAsync:
+    # usa las mismas sentencias que el modelo síncrono (MODELO); editar y
+    # eliminar confían en rowcount en vez de un SELECT previo: un solo viaje
+    MODELO: Any = None
+    TABLA = ""
+    CAMPOS_EDITABLES = 0
+    GENERA_ID = True
+    resumen: Optional[ResumenDashboard] = None
+
+    def __init__(self, conexion: conexion_oracle_async):
+        self.db = conexion
+
+    def parametros_nuevo(self, *datos: Any) -> Tuple[Any, ...]:
+        return datos
+
+    def mensaje_duplicado(self, id_item: Optional[int], *datos: Any) -> str:
+        if id_item is None:
+            return f"El registro ya existe en {self.TABLA}"
+        return f"Ya existe un registro con id {id_item} en {self.TABLA}"
+
+    async def guardar_item(self, id_item: Optional[int], *datos: Any) -> bool:
+        mensaje = self.mensaje_duplicado(id_item, *datos)
+        if id_item is None:
+            if not self.GENERA_ID:
+                print(f"[ERROR]: {self.TABLA} requiere un id explícito")
+                return False
+            resultado = await self.db.insertar_con_id(self.MODELO.CONSULTA_NUEVO, self.parametros_nuevo(*datos), mensaje)
+        else:
+            resultado = await self.db.insertar_si_no_existe(self.MODELO.CONSULTA_MERGE, (id_item, *datos), id_item, mensaje)
+        self._informar(resultado)
+        if resultado.creado:
+            self._escrito()
+            self._creado(resultado.id, *datos)
+        return resultado.creado
+
+    def _informar(self, resultado: ResultadoGuardado) -> None:
+        if resultado.creado:
+            print(f"[INFO]: Registro id {resultado.id} guardado correctamente en {self.TABLA}")
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar en {self.TABLA} -> {resultado.mensaje}")
+
+    async def editar_item(self, id_item: int, *datos: Any) -> bool:
+        if not datos or len(datos) < self.CAMPOS_EDITABLES:
+            print(f"[ERROR]: Sin datos ingresados para id {id_item} (se requieren {self.CAMPOS_EDITABLES} campos).")
+            return False
+        try:
+            filas = await self.db.ejecutar(self.MODELO.CONSULTA_UPDATE, (*datos[: self.CAMPOS_EDITABLES], id_item))
+        except Exception as e:
+            print(f"[ERROR]: Error al editar id {id_item} en {self.TABLA} -> {e}")
+            return False
+        if filas == 0:
+            print(f"[ERROR]: Id {id_item} no existe en la tabla {self.TABLA}.")
+            return False
+        self._escrito()
+        self._editado(id_item, *datos)
+        print(f"[INFO]: Id {id_item} editado correctamente en {self.TABLA}")
+        return True
+
+    async def mostrar_items(self) -> List[Tuple[Any, ...]]:
+        try:
+            async with self.db.cursor() as cursor:
+                await cursor.execute(self.MODELO.CONSULTA_LISTADO)
+                datos = await cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print(f"[INFO]: Sin datos encontrados para {self.TABLA}.")
+                    return []
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros de {self.TABLA} -> {e}")
+            return []
+
+    async def mostrar_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return await self.db.listar_desde(self.MODELO.CONSULTA_LISTADO, self.MODELO.COLUMNA_ID, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
+
+    def iterar_items(self, tam_lote: int = 1000) -> AsyncIterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.MODELO.CONSULTA_LISTADO, tam_lote=tam_lote)
+
+    async def eliminar_item(self, id_item: int) -> bool:
+        try:
+            filas = await self.db.ejecutar(self.MODELO.CONSULTA_DELETE, (id_item,))
+        except Exception as e:
+            print(f"[ERROR]: Error al eliminar id {id_item} de {self.TABLA} -> {e}")
+            return False
+        if filas == 0:
+            print(f"[ERROR]: Id {id_item} no existe en la tabla {self.TABLA}.")
+            return False
+        self._escrito()
+        self._eliminado(id_item)
+        print(f"[INFO]: Id {id_item} eliminado correctamente de {self.TABLA}")
+        return True
+
+    # --- avisos tras una escritura ya confirmada (cada sentencia va con commit) ---
+    # mismos contadores y caches que mantienen los modelos síncronos
+
+    def _escrito(self) -> None:
+        for cache in caches_de(self.TABLA):
+            cache.invalidar()
+
+    def _creado(self, id_item: Any, *datos: Any) -> None:
+        pass
+
+    def _editado(self, id_item: Any, *datos: Any) -> None:
+        pass
+
+    def _eliminado(self, id_item: Any) -> None:
+        pass
+
+
+class UsuarioModelAsync(ModeloAsync):
+    MODELO = UsuarioModel
+    TABLA = "tv_usuario"
+    CAMPOS_EDITABLES = 8
+    autenticacion: Optional[ServicioAutenticacion] = None
+
+    def mensaje_duplicado(self, id_item: Optional[int], *datos: Any) -> str:
+        if id_item is None:
+            return f"Ya existe un usuario con nombre_usuario {datos[0]}"
+        return f"Ya existe un usuario con id {id_item} o nombre_usuario {datos[0]}"
+
+    # la clave pudo cambiar: las sesiones y la credencial en cache dejan de valer
+    def _editado(self, id_item: Any, *datos: Any) -> None:
+        if self.autenticacion:
+            self.autenticacion.revocar_usuario(id_item)
+
+    def _eliminado(self, id_item: Any) -> None:
+        if self.autenticacion:
+            self.autenticacion.revocar_usuario(id_item)
+
+
+class PacienteModelAsync(ModeloAsync):
+    MODELO = PacienteModel
+    TABLA = "tv_paciente"
+    CAMPOS_EDITABLES = 2
+    GENERA_ID = False
+
+    def _creado(self, id_item: Any, *datos: Any) -> None:
+        if self.resumen:
+            self.resumen.paciente(1)
+
+    def _eliminado(self, id_item: Any) -> None:
+        if self.resumen:
+            self.resumen.paciente(-1)
+
+
+class MedicoModelAsync(ModeloAsync):
+    MODELO = MedicoModel
+    TABLA = "tv_medico"
+    CAMPOS_EDITABLES = 3
+    GENERA_ID = False
+
+
+class AdministradorModelAsync(ModeloAsync):
+    MODELO = AdministradorModel
+    TABLA = "tv_administrador"
+    GENERA_ID = False
+
+    async def editar_item(self, id_item: int, *datos: Any) -> bool:
+        print(f"[ERROR]: {self.TABLA} no tiene campos editables")
+        return False
+
+
+class InsumosModelAsync(ModeloAsync):
+    MODELO = InsumosModel
+    TABLA = "tv_insumos"
+    CAMPOS_EDITABLES = 3
+    monitor: Optional[MonitorStock] = None
+
+    def parametros_nuevo(self, *datos: Any) -> Tuple[Any, ...]:
+        # el bloque de CONSULTA_NUEVO vuelve a recibir el nombre para el not exists
+        return (*datos, datos[0])
+
+    def mensaje_duplicado(self, id_item: Optional[int], *datos: Any) -> str:
+        if id_item is None:
+            return f"Ya existe un ítem con el nombre {datos[0]}"
+        return f"Ya existe un ítem con el nombre {datos[0]} o el id {id_item}"
+
+    async def editar_item(self, id_insumo: int, nombre: str, *datos: Any) -> bool:
+        return await super().editar_item(id_insumo, *datos)
+
+    # datos al crear: (nombre, tipo, stock, costo_usd); al editar: (tipo, stock, costo_usd)
+    def _creado(self, id_item: Any, *datos: Any) -> None:
+        self._stock_cambiado(id_item, datos[2], datos[0])
+
+    def _editado(self, id_item: Any, *datos: Any) -> None:
+        self._stock_cambiado(id_item, datos[1])
+
+    def _eliminado(self, id_item: Any) -> None:
+        self._stock_cambiado(id_item, None)
+
+    def _stock_cambiado(self, id_insumo: int, stock: Optional[int], nombre: Optional[str] = None) -> None:
+        if self.resumen:
+            self.resumen.stock(id_insumo, stock)
+        if self.monitor:
+            self.monitor.actualizar(id_insumo, stock, nombre)
+
+
+class RecetasModelAsync(ModeloAsync):
+    MODELO = RecetasModel
+    TABLA = "tv_recetas"
+    CAMPOS_EDITABLES = 5
+
+
+class ConsultasModelAsync(ModeloAsync):
+    MODELO = ConsultasModel
+    TABLA = "tv_consultas"
+    CAMPOS_EDITABLES = 6
+
+    # datos: (id_paciente, id_medico, id_receta, fecha, comentarios, valor)
+    def _creado(self, id_item: Any, *datos: Any) -> None:
+        if self.resumen:
+            self.resumen.ingreso(datos[3], datos[5])
+
+    # sin el SELECT previo no se conoce la fecha y valor anteriores: se recalcula
+    def _editado(self, id_item: Any, *datos: Any) -> None:
+        if self.resumen:
+            self.resumen.marcar_sucio("ingresos")
+
+    def _eliminado(self, id_item: Any) -> None:
+        if self.resumen:
+            self.resumen.marcar_sucio("ingresos")
+
+
+class AgendaModelAsync(ModeloAsync):
+    MODELO = AgendaModel
+    TABLA = "tv_agenda"
+    CAMPOS_EDITABLES = 4
+    indice: Optional[IndiceAgenda] = None
+
+    # mismas reglas que AgendaModel.reservar_hora: candado sobre la fila del
+    # médico y CONSULTA_CONFLICTO en la misma transacción que el insert/update
+    async def guardar_item(
+        self, id_agenda: Optional[int], id_paciente: int, id_medico: int, fecha_consulta: Any, estado: str
+    ) -> bool:
+        resultado = await self.reservar_hora(id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+        if resultado.estado == CONFLICTO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            self._informar(resultado)
+        return resultado.creado
+
+    async def reservar_hora(
+        self, id_agenda: Optional[int], id_paciente: int, id_medico: int, fecha_consulta: Any, estado: str
+    ) -> ResultadoGuardado:
+        mensaje = "Ya existe la agenda" if id_agenda is None else f"Ya existe un ítem con el id {id_agenda}"
+        try:
+            async with self.db.transaccion() as cursor:
+                if estado.lower() not in ESTADOS_LIBERADOS:
+                    conflicto = await self.verificar_disponible(cursor, id_medico, fecha_consulta)
+                    if conflicto:
+                        return ResultadoGuardado(CONFLICTO, id_agenda, conflicto)
+                if id_agenda is None:
+                    id_var = cursor.var(oracledb.DB_TYPE_NUMBER)
+                    await cursor.execute(AgendaModel.CONSULTA_NUEVO, [id_paciente, id_medico, fecha_consulta, estado, id_var])
+                    id_agenda = valor_retornado(id_var)
+                    if id_agenda is None:
+                        return ResultadoGuardado(DUPLICADO, None, mensaje)
+                else:
+                    await cursor.execute(
+                        AgendaModel.CONSULTA_MERGE, (id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+                    )
+                    if cursor.rowcount == 0:
+                        return ResultadoGuardado(DUPLICADO, id_agenda, mensaje)
+        except Exception as e:
+            return resultado_error(e, id_agenda, mensaje)
+        # el bloque ya confirmó
+        self._escrito()
+        if self.resumen:
+            self.resumen.agenda(None, estado)
+        self._indexar(id_agenda, id_medico, fecha_consulta, estado)
+        return ResultadoGuardado(CREADO, id_agenda)
+
+    async def verificar_disponible(self, cursor, id_medico: int, fecha_consulta: Any, excluir: Optional[int] = None) -> Optional[str]:
+        await cursor.execute(AgendaModel.CONSULTA_BLOQUEO_MEDICO, (id_medico,))
+        if await cursor.fetchone() is None:
+            return f"El médico id {id_medico} no existe"
+        await cursor.execute(
+            AgendaModel.CONSULTA_CONFLICTO,
+            {
+                "id_medico": id_medico,
+                "inicio": fecha_consulta,
+                "duracion": DURACION_CITA_MIN / 1440,
+                "excluir": -1 if excluir is None else excluir,
+            },
+        )
+        choque = await cursor.fetchone()
+        if choque is None:
+            return None
+        return f"El médico id {id_medico} ya tiene la agenda n°{choque[0]} el {choque[1]:%Y-%m-%d %H:%M}"
+
+    async def editar_item(self, id_agenda: int, *datos: Any) -> bool:
+        if not datos or len(datos) < self.CAMPOS_EDITABLES:
+            print(f"[ERROR]: Sin datos ingresados para agenda n°{id_agenda}")
+            return False
+        id_paciente, id_medico, fecha_consulta, estado = datos[: self.CAMPOS_EDITABLES]
+        try:
+            async with self.db.transaccion() as cursor:
+                if str(estado).lower() not in ESTADOS_LIBERADOS:
+                    conflicto = await self.verificar_disponible(cursor, id_medico, fecha_consulta, excluir=id_agenda)
+                    if conflicto:
+                        print(f"[ERROR]: {conflicto}")
+                        return False
+                await cursor.execute(AgendaModel.CONSULTA_UPDATE, (id_paciente, id_medico, fecha_consulta, estado, id_agenda))
+                if cursor.rowcount == 0:
+                    print(f"[ERROR]: Agenda n°{id_agenda} no existe en la tabla {self.TABLA}.")
+                    return False
+        except Exception as e:
+            print(f"[ERROR]: Error al editar agenda n°{id_agenda} -> {e}")
+            return False
+        self._escrito()
+        self._editado(id_agenda, *datos)
+        if self.indice:
+            self.indice.quitar(id_agenda)
+        self._indexar(id_agenda, id_medico, fecha_consulta, estado)
+        print(f"[INFO]: Agenda n°{id_agenda} editada correctamente")
+        return True
+
+    async def eliminar_item(self, id_item: int) -> bool:
+        ok = await super().eliminar_item(id_item)
+        if ok and self.indice:
+            self.indice.quitar(id_item)
+        return ok
+
+    # el estado anterior no se lee (un solo viaje): el conteo por estado se recalcula
+    def _editado(self, id_item: Any, *datos: Any) -> None:
+        if self.resumen:
+            self.resumen.marcar_sucio("agenda")
+
+    def _eliminado(self, id_item: Any) -> None:
+        if self.resumen:
+            self.resumen.marcar_sucio("agenda")
+
+    def _indexar(self, id_agenda: int, id_medico: int, fecha_consulta: Any, estado: str) -> None:
+        if self.indice and str(estado).lower() not in ESTADOS_LIBERADOS:
+            self.indice.agregar(id_medico, id_agenda, fecha_consulta)
@@ -0,0 +1,198 @@
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from config.db_config import conexion_oracle
+from typing import Optional, Any, Deque, Dict, NamedTuple
+from utils.cache import CacheTTL
+from utils.hash_claves import ServicioHash, Verificacion
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResultadoLogin(NamedTuple):
+    ok: bool
+    id_usuario: Optional[int] = None
+    token: Optional[str] = None
+    mensaje: str = ""
+
+
+class Sesion(NamedTuple):
+    id_usuario: int
+    nombre_usuario: str
+    vence: float
+
+
+class ServicioAutenticacion:
+    """
+    Login contra tv_usuario con tres atajos:
+    - sesiones por token con vencimiento y revocación;
+    - cache acotada de credenciales ya verificadas, por nombre_usuario y un
+      HMAC de la clave con una llave aleatoria del proceso (la clave plana no
+      se guarda): repetir el login no consulta la BD ni recalcula bcrypt;
+    - límite de intentos fallidos por usuario: al superarlo se rechaza antes
+      de gastar CPU en bcrypt.
+    Con un ServicioHash, un hash guardado con menos rondas que la política
+    se reescribe en segundo plano tras un login correcto.
+    """
+
+    CONSULTA_CREDENCIAL = "SELECT id_usuario, clave FROM tv_usuario WHERE nombre_usuario = :1"
+    # sólo si nadie cambió la clave mientras se calculaba el hash nuevo
+    CONSULTA_REHASH = "UPDATE tv_usuario SET clave = :1 WHERE id_usuario = :2 AND clave = :3"
+
+    def __init__(
+        self,
+        conexion: conexion_oracle,
+        ttl_sesion: float = 1800.0,
+        ttl_credencial: float = 900.0,
+        max_credenciales: int = 256,
+        max_intentos: int = 5,
+        ventana_intentos: float = 300.0,
+        servicio_hash: Optional[ServicioHash] = None,
+    ):
+        self.db = conexion
+        self.servicio_hash = servicio_hash
+        self.ttl_sesion = float(ttl_sesion)
+        self.max_intentos = max(1, int(max_intentos))
+        self.ventana_intentos = float(ventana_intentos)
+        self._llave = secrets.token_bytes(32)
+        # nombre_usuario -> (hmac de la clave, id_usuario)
+        self._credenciales = CacheTTL(max_items=max_credenciales, ttl_seg=ttl_credencial)
+        self._nombres: Dict[int, str] = {}
+        self._sesiones: Dict[str, Sesion] = {}
+        self._fallos: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def autenticar(self, nombre_usuario: str, clave: str) -> ResultadoLogin:
+        if not nombre_usuario or not clave:
+            return ResultadoLogin(False, mensaje="datos incompletos")
+
+        espera = self._espera(nombre_usuario)
+        if espera > 0:
+            return ResultadoLogin(False, mensaje=f"Demasiados intentos fallidos, espere {espera:.0f} s")
+
+        digest = self._digest(clave)
+        guardada = self._credenciales.buscar(nombre_usuario)
+        if guardada is not None and hmac.compare_digest(guardada[0], digest):
+            return self._abrir_sesion(guardada[1], nombre_usuario)
+
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute(self.CONSULTA_CREDENCIAL, (nombre_usuario,))
+                fila = cursor.fetchone()
+        except Exception as e:
+            return ResultadoLogin(False, mensaje=f"Error en login -> {e}")
+
+        if fila is None:
+            self._fallo(nombre_usuario)
+            return ResultadoLogin(False, mensaje="Usuario no encontrado")
+
+        id_usuario, clave_hash = fila[0], fila[1]
+        if not isinstance(clave_hash, str):
+            return ResultadoLogin(False, mensaje="Formato de clave en BD inesperado")
+        if self.servicio_hash is None:
+            verificacion = Verificacion(ServicioHash.verificar(clave, clave_hash))
+        else:
+            verificacion = self.servicio_hash.verificar_con_rehash(clave, clave_hash)
+        if not verificacion.ok:
+            self._fallo(nombre_usuario)
+            return ResultadoLogin(False, mensaje="Credenciales incorrectas")
+        if verificacion.rehash:
+            self._rehashear(id_usuario, clave, clave_hash)
+
+        self._credenciales.guardar(nombre_usuario, (digest, id_usuario))
+        with self._lock:
+            self._nombres[id_usuario] = nombre_usuario
+        return self._abrir_sesion(id_usuario, nombre_usuario)
+
+    def validar(self, token: Optional[str]) -> Optional[Sesion]:
+        if not token:
+            return None
+        with self._lock:
+            sesion = self._sesiones.get(token)
+            if sesion is None:
+                return None
+            if sesion.vence <= time.monotonic():
+                del self._sesiones[token]
+                return None
+            return sesion
+
+    def cerrar_sesion(self, token: Optional[str]) -> bool:
+        with self._lock:
+            return self._sesiones.pop(token, None) is not None
+
+    def revocar_usuario(self, id_usuario: int) -> None:
+        # tras cambiar la clave o eliminar el usuario: corta sus sesiones y olvida la credencial
+        with self._lock:
+            nombre = self._nombres.pop(id_usuario, None)
+            for token in [t for t, s in self._sesiones.items() if s.id_usuario == id_usuario]:
+                del self._sesiones[token]
+        if nombre is not None:
+            self._credenciales.quitar(nombre)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            datos = {"sesiones": len(self._sesiones), "usuarios_con_fallos": len(self._fallos)}
+        datos.update({f"credenciales_{k}": v for k, v in self._credenciales.estadisticas().items()})
+        return datos
+
+    def _abrir_sesion(self, id_usuario: int, nombre_usuario: str) -> ResultadoLogin:
+        token = secrets.token_urlsafe(32)
+        ahora = time.monotonic()
+        with self._lock:
+            self._fallos.pop(nombre_usuario, None)
+            for vencido in [t for t, s in self._sesiones.items() if s.vence <= ahora]:
+                del self._sesiones[vencido]
+            self._sesiones[token] = Sesion(id_usuario, nombre_usuario, ahora + self.ttl_sesion)
+        return ResultadoLogin(True, id_usuario, token)
+
+    def _rehashear(self, id_usuario: int, clave: str, clave_hash: str) -> None:
+        # el login no espera: el hash nuevo se calcula y guarda en el pool de bcrypt.
+        # Ese hilo toma su propia sesión del pool de conexiones; sin pool la
+        # sesión es compartida y el commit arrastraría la transacción de otro
+        # hilo, así que se deja para un login posterior con pool
+        if not self.db.usar_pool:
+            return
+
+        def guardar(nuevo_hash: str) -> None:
+            try:
+                with self.db.cursor(autocommit=True) as cursor:
+                    cursor.execute(self.CONSULTA_REHASH, (nuevo_hash, id_usuario, clave_hash))
+                    if cursor.rowcount:
+                        logger.info("Clave del usuario %s rehasheada a %d rondas", id_usuario, self.servicio_hash.rondas)
+            except Exception:
+                logger.exception("No se pudo rehashear la clave del usuario %s", id_usuario)
+
+        self.servicio_hash.rehashear(clave, guardar)
+
+    def _digest(self, clave: str) -> bytes:
+        return hmac.new(self._llave, clave.encode("utf-8"), hashlib.sha256).digest()
+
+    def _espera(self, nombre_usuario: str) -> float:
+        # segundos hasta que vence el fallo más antiguo de la ventana (0: puede intentar)
+        ahora = time.monotonic()
+        with self._lock:
+            fallos = self._fallos.get(nombre_usuario)
+            if not fallos:
+                return 0.0
+            while fallos and fallos[0] <= ahora - self.ventana_intentos:
+                fallos.popleft()
+            if not fallos:
+                del self._fallos[nombre_usuario]
+                return 0.0
+            if len(fallos) < self.max_intentos:
+                return 0.0
+            return fallos[0] + self.ventana_intentos - ahora
+
+    def _fallo(self, nombre_usuario: str) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._fallos.setdefault(nombre_usuario, deque(maxlen=self.max_intentos)).append(ahora)
+            # nombres inventados no deben acumularse sin límite
+            if len(self._fallos) > 10000:
+                for nombre in [n for n, f in self._fallos.items() if f[-1] <= ahora - self.ventana_intentos]:
+                    del self._fallos[nombre]
@@ -0,0 +1,169 @@
+import bisect
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as hora
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from config.db_config import conexion_oracle
+from model.objetos_m import DURACION_CITA_MIN, ESTADOS_LIBERADOS, hora_en_conflicto
+
+
+class _AgendaMedico:
+    def __init__(self, desde: datetime, inicios: List[datetime], citas: Dict[int, datetime]):
+        self.desde = desde
+        # inicios ordenados de las horas tomadas: bisect da vecinos en O(log n)
+        self.inicios = inicios
+        self.citas = citas
+        self.cargado_en = time.monotonic()
+
+
+class IndiceAgenda:
+    """
+    Índice en memoria de las horas tomadas por médico. Cada médico se carga
+    la primera vez que se consulta (usa ix_agenda_medico_fecha); después
+    AgendaModel le informa cada escritura ya confirmada y sólo se inserta o
+    quita esa hora con bisect. La recarga cada `refresco_seg` recoge lo que
+    escriban otras sesiones. Es una ayuda para la interfaz: la verificación
+    que manda es la de AgendaModel.
+    """
+
+    CONSULTA_CARGA = f"""
+        SELECT id_agenda, fecha_consulta FROM tv_agenda
+        WHERE id_medico = :1 AND fecha_consulta >= :2
+          AND lower(estado) NOT IN ({", ".join(f"'{e}'" for e in ESTADOS_LIBERADOS)})
+        ORDER BY fecha_consulta
+    """
+
+    def __init__(
+        self,
+        conexion: conexion_oracle,
+        duracion_min: int = DURACION_CITA_MIN,
+        hora_inicio: hora = hora(9, 0),
+        hora_fin: hora = hora(18, 0),
+        dias_habiles: Sequence[int] = (0, 1, 2, 3, 4),
+        refresco_seg: float = 300.0,
+    ):
+        self.db = conexion
+        self.duracion = timedelta(minutes=duracion_min)
+        self.hora_inicio = hora_inicio
+        self.hora_fin = hora_fin
+        self.dias_habiles = frozenset(dias_habiles)
+        self.refresco_seg = float(refresco_seg)
+        self._medicos: Dict[int, _AgendaMedico] = {}
+        self._lock = threading.Lock()
+
+    def _cargar(self, id_medico: int, desde: datetime) -> _AgendaMedico:
+        inicios: List[datetime] = []
+        citas: Dict[int, datetime] = {}
+        with self.db.cursor() as cursor:
+            cursor.arraysize = 500
+            cursor.execute(self.CONSULTA_CARGA, (id_medico, desde - self.duracion))
+            for id_agenda, fecha_consulta in cursor:
+                inicios.append(fecha_consulta)
+                citas[id_agenda] = fecha_consulta
+        return _AgendaMedico(desde, inicios, citas)
+
+    def _agenda(self, id_medico: int, desde: datetime) -> _AgendaMedico:
+        with self._lock:
+            agenda = self._medicos.get(id_medico)
+        vigente = (
+            agenda is not None
+            and agenda.desde <= desde
+            and time.monotonic() - agenda.cargado_en < self.refresco_seg
+        )
+        if vigente:
+            return agenda
+
+        inicio_dia = datetime.combine(date.today(), hora(0, 0))
+        agenda = self._cargar(id_medico, min(desde, inicio_dia))
+        with self._lock:
+            self._medicos[id_medico] = agenda
+        return agenda
+
+    def invalidar(self, id_medico: Optional[int] = None) -> None:
+        with self._lock:
+            if id_medico is None:
+                self._medicos.clear()
+            else:
+                self._medicos.pop(id_medico, None)
+
+    def agregar(self, id_medico: int, id_agenda: int, fecha_consulta: date) -> None:
+        # las listas se reemplazan en vez de modificarse: quien ya las está
+        # recorriendo en otro hilo sigue con la versión anterior
+        inicio = _como_datetime(fecha_consulta)
+        with self._lock:
+            agenda = self._medicos.get(id_medico)
+            if agenda is None:
+                # se carga completa en la próxima consulta
+                return
+            inicios = list(agenda.inicios)
+            bisect.insort(inicios, inicio)
+            citas = dict(agenda.citas)
+            citas[id_agenda] = inicio
+            agenda.inicios, agenda.citas = inicios, citas
+
+    def quitar(self, id_agenda: int) -> None:
+        # una hora editada o eliminada deja de ocupar a su médico anterior
+        with self._lock:
+            for agenda in self._medicos.values():
+                inicio = agenda.citas.get(id_agenda)
+                if inicio is None:
+                    continue
+                inicios = list(agenda.inicios)
+                i = bisect.bisect_left(inicios, inicio)
+                if i < len(inicios) and inicios[i] == inicio:
+                    del inicios[i]
+                citas = dict(agenda.citas)
+                del citas[id_agenda]
+                agenda.inicios, agenda.citas = inicios, citas
+                return
+
+    def conflicto(self, id_medico: int, fecha_consulta: date, excluir: Optional[int] = None) -> Optional[datetime]:
+        inicio = _como_datetime(fecha_consulta)
+        agenda = self._agenda(id_medico, inicio)
+        propia = agenda.citas.get(excluir) if excluir is not None else None
+        return hora_en_conflicto(agenda.inicios, inicio, self.duracion, propia)
+
+    def horas_libres(self, id_medico: int, desde: date, hasta: date, cantidad: int = 10) -> List[datetime]:
+        inicio = _como_datetime(desde, self.hora_inicio)
+        fin = hasta if isinstance(hasta, datetime) else datetime.combine(hasta, hora.max)
+        agenda = self._agenda(id_medico, inicio)
+        inicios = agenda.inicios
+
+        libres: List[datetime] = []
+        # un solo recorrido: el puntero sobre las horas tomadas avanza junto a los bloques
+        i = bisect.bisect_right(inicios, inicio - self.duracion)
+        for bloque in self._bloques(inicio, fin):
+            while i < len(inicios) and inicios[i] <= bloque - self.duracion:
+                i += 1
+            if i < len(inicios) and inicios[i] < bloque + self.duracion:
+                continue
+            libres.append(bloque)
+            if len(libres) >= cantidad:
+                break
+        return libres
+
+    def _bloques(self, desde: datetime, hasta: datetime) -> Iterator[datetime]:
+        dia = desde.date()
+        while True:
+            if dia.weekday() in self.dias_habiles:
+                bloque = datetime.combine(dia, self.hora_inicio)
+                cierre = datetime.combine(dia, self.hora_fin)
+                if bloque < desde:
+                    saltos = -(-(desde - bloque) // self.duracion)
+                    bloque += saltos * self.duracion
+                while bloque + self.duracion <= cierre:
+                    if bloque > hasta:
+                        return
+                    yield bloque
+                    bloque += self.duracion
+            dia += timedelta(days=1)
+            if datetime.combine(dia, self.hora_inicio) > hasta:
+                return
+
+
+def _como_datetime(valor: date, por_defecto: hora = hora(0, 0)) -> datetime:
+    if isinstance(valor, datetime):
+        return valor
+    return datetime.combine(valor, por_defecto)
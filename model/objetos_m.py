@@ -1,9 +1,90 @@
-from config.db_config import conexion_oracle
-from datetime import date
-from typing import Optional, List, Tuple, Any
+import bisect
+from config.db_config import conexion_oracle, ResultadoGuardado, Transaccion, CREADO, DUPLICADO, ERROR, ORA_UNICO, valor_retornado
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Optional, List, Tuple, Any, Iterator, Iterable, Dict, NamedTuple, Sequence
+from model.alertas_m import MonitorStock
+from model.resumenes_m import ResumenDashboard
+from utils.cache import CacheTTL, agrupar_cache, cacheado, invalida_cache
+
+if TYPE_CHECKING:
+    from model.disponibilidad_m import IndiceAgenda
+
+
+# cada hora de agenda ocupa al médico este tiempo desde fecha_consulta
+DURACION_CITA_MIN = 30
+# estados que dejan libre la hora del médico
+ESTADOS_LIBERADOS = ("cancelada", "cancelado", "anulada", "anulado")
+CONFLICTO = "conflicto"
+
+
+def hora_en_conflicto(
+    inicios: List[datetime], inicio: datetime, duracion: timedelta, propia: Optional[datetime] = None
+) -> Optional[datetime]:
+    # inicios ordenados; con duración fija basta mirar los vecinos de inicio
+    i = bisect.bisect_right(inicios, inicio - duracion)
+    while i < len(inicios) and inicios[i] < inicio + duracion:
+        if inicios[i] != propia:
+            return inicios[i]
+        propia = None
+        i += 1
+    return None
+
+STOCK_OK = "ok"
+SIN_STOCK = "sin_stock"
+NO_EXISTE = "no_existe"
+
+
+class ResultadoStock(NamedTuple):
+    estado: str
+    id_insumo: Optional[int]
+    cantidad: int
+    # stock que quedó tras la operación, o el disponible si no alcanzó
+    stock: Optional[int] = None
+    mensaje: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.estado == STOCK_OK
 
 
 class InsumosModel:
+    CONSULTA_LISTADO = "SELECT id_insumo, nombre, tipo, stock, costo_usd FROM tv_insumos"
+    COLUMNA_ID = "id_insumo"
+    TABLA = "tv_insumos"
+    resumen: Optional[ResumenDashboard] = None
+    monitor: Optional[MonitorStock] = None
+    CONSULTA_MERGE = """
+        MERGE INTO tv_insumos t
+        USING (SELECT :1 AS id_insumo, :2 AS nombre FROM dual) s
+        ON (t.nombre = s.nombre)
+        WHEN NOT MATCHED THEN INSERT (id_insumo, nombre, tipo, stock, costo_usd)
+        VALUES (s.id_insumo, s.nombre, :3, :4, :5)
+    """
+    CONSULTA_NUEVO = """
+        begin
+            insert into tv_insumos (id_insumo, nombre, tipo, stock, costo_usd)
+            select sq_insumos.nextval, :1, :2, :3, :4 from dual
+            where not exists (select 1 from tv_insumos where nombre = :5);
+            if sql%rowcount = 1 then
+                :6 := sq_insumos.currval;
+            else
+                :6 := null;
+            end if;
+        end;
+    """
+    CONSULTA_UPDATE = "UPDATE tv_insumos SET tipo = :1, stock = :2, costo_usd = :3 WHERE id_insumo = :4"
+    CONSULTA_DELETE = "DELETE FROM tv_insumos WHERE id_insumo = :1"
+    # la condición stock >= :cantidad hace la verificación y el descuento en una
+    # sola sentencia: dos despachos concurrentes no pueden dejar stock negativo
+    CONSULTA_DESCONTAR = """
+        UPDATE tv_insumos SET stock = stock - :cantidad
+        WHERE id_insumo = :id_insumo AND stock >= :cantidad
+    """
+    CONSULTA_REPONER = """
+        UPDATE tv_insumos SET stock = stock + :cantidad
+        WHERE id_insumo = :id_insumo
+    """
+
     def __init__(
         self,
         id_insumo: int,
@@ -20,145 +101,273 @@ class InsumosModel:
         self.stock = stock
         self.costo_usd = costo_usd
         self.db = conexion
-
-    def guardar_item(self, id_insumo: int, nombre: str, tipo: str, stock: int, costo_usd: float) -> bool:
-        cursor = None
-        try:
-            cursor = self.db.obtener_cursor()
-
-            consulta_validacion = "SELECT 1 FROM tv_insumos WHERE nombre = :1"
-            cursor.execute(consulta_validacion, (nombre,))
-
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un ítem con el nombre {nombre}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_insumos (id_insumo, nombre, tipo, stock, costo_usd)
-                VALUES (:1, :2, :3, :4, :5)
-            """
-            cursor.execute(consulta_insert, (id_insumo, nombre, tipo, stock, costo_usd))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: {nombre} guardado correctamente")
-            return True
-
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar {nombre} -> {e}")
-            return False
-
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
+        self.cache = agrupar_cache(CacheTTL(max_items=64, ttl_seg=300), "tv_insumos")
+
+    @invalida_cache
+    def guardar_item(self, id_insumo: Optional[int], nombre: str, tipo: str, stock: int, costo_usd: float) -> bool:
+        if id_insumo is None:
+            resultado = self.insertar_nuevo(nombre, tipo, stock, costo_usd)
+        else:
+            resultado = self.insertar_si_no_existe(id_insumo, nombre, tipo, stock, costo_usd)
+        if resultado.creado:
+            self._stock_cambiado(resultado.id, stock, nombre)
+            print(f"[INFO]: {nombre} guardado correctamente (id {resultado.id})")
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar {nombre} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(self, id_insumo: int, nombre: str, tipo: str, stock: int, costo_usd: float) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_insumo, nombre, tipo, stock, costo_usd),
+            id_insumo,
+            f"Ya existe un ítem con el nombre {nombre} o el id {id_insumo}",
+        )
+
+    def insertar_nuevo(self, nombre: str, tipo: str, stock: int, costo_usd: float) -> ResultadoGuardado:
+        # nombre no es clave única: el bloque inserta sólo si no existe y devuelve el id o null
+        return self.db.insertar_con_id(
+            self.CONSULTA_NUEVO,
+            (nombre, tipo, stock, costo_usd, nombre),
+            f"Ya existe un ítem con el nombre {nombre}",
+        )
+
+    @invalida_cache
     def editar_item(self, id_insumo: int, nombre: str, *datos: tuple) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-
-            consulta_validacion = "SELECT 1 FROM tv_insumos WHERE id_insumo = :1"
-            cursor.execute(consulta_validacion, (id_insumo,))
-
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: {nombre} no existe en la tabla tv_insumos.")
-                return False
-
-            if not datos or len(datos) < 3:
-                print(f"[ERROR]: Sin datos ingresados para {nombre} (se requiere tipo, stock, costo_usd)")
-                return False
-
-            consulta_update = "UPDATE tv_insumos SET tipo = :1, stock = :2, costo_usd = :3 WHERE id_insumo = :4"
-            cursor.execute(consulta_update, (datos[0], datos[1], datos[2], id_insumo))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: {nombre} editado correctamente")
-            return True
-
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_insumos WHERE id_insumo = :1"
+                cursor.execute(consulta_validacion, (id_insumo,))
+
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: {nombre} no existe en la tabla tv_insumos.")
+                    return False
+
+                if not datos or len(datos) < 3:
+                    print(f"[ERROR]: Sin datos ingresados para {nombre} (se requiere tipo, stock, costo_usd)")
+                    return False
+
+                cursor.execute(self.CONSULTA_UPDATE, (datos[0], datos[1], datos[2], id_insumo))
+                self.db.confirmar()
+                self._stock_cambiado(id_insumo, datos[1], nombre)
+                print(f"[INFO]: {nombre} editado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar {nombre} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
+    @cacheado
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = "SELECT id_insumo, nombre, tipo, stock, costo_usd FROM tv_insumos"
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_insumos.")
-                return []
-
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_insumos.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener items desde BD -> {e}")
             return []
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+    @cacheado
+    def mostrar_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_LISTADO, self.COLUMNA_ID, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
 
-    def eliminar_item(self, id_insumo: int) -> bool:
-        cursor = None
+    @cacheado
+    def mostrar_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_insumos WHERE id_insumo = :1"
-            cursor.execute(consulta_validacion, (id_insumo,))
+            return self.db.listar_desde(self.CONSULTA_LISTADO, self.COLUMNA_ID, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
 
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: El insumo con ID {id_insumo} no existe.")
-                return False
+    def iterar_items(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_LISTADO, tam_lote=tam_lote)
 
-            consulta_delete = "DELETE FROM tv_insumos WHERE id_insumo = :1"
-            cursor.execute(consulta_delete, (id_insumo,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Insumo con ID {id_insumo} eliminado correctamente.")
-            return True
+    def obtener_por_id(self, id_insumo: int) -> Optional[Tuple[Any, ...]]:
+        fila = self.obtener_varios([id_insumo]).get(id_insumo)
+        if fila is None:
+            print(f"[INFO]: No se encontró insumo con id {id_insumo}.")
+        return fila
 
+    def obtener_varios(self, ids: Iterable[int]) -> Dict[int, Tuple[Any, ...]]:
+        # ver conexion_oracle.obtener_por_ids
+        try:
+            return self.db.obtener_por_ids(self.CONSULTA_LISTADO, self.COLUMNA_ID, ids)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener insumos por id desde BD -> {e}")
+            return {}
+
+    @invalida_cache
+    def eliminar_item(self, id_insumo: int) -> bool:
+        try:
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_insumos WHERE id_insumo = :1"
+                cursor.execute(consulta_validacion, (id_insumo,))
+
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: El insumo con ID {id_insumo} no existe.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_insumo,))
+                self.db.confirmar()
+                self._stock_cambiado(id_insumo, None)
+                print(f"[INFO]: Insumo con ID {id_insumo} eliminado correctamente.")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar insumo -> {e}")
             return False
 
-        finally:
-            if cursor:
+
+    @invalida_cache
+    def _mover_stock(self, consulta: str, id_insumo: int, cantidad: int) -> ResultadoStock:
+        if cantidad <= 0:
+            return ResultadoStock(ERROR, id_insumo, cantidad, None, "La cantidad debe ser mayor a 0")
+        try:
+            with self.db.cursor(autocommit=True) as cursor:
+                restante = cursor.var(int)
+                cursor.execute(
+                    consulta + " RETURNING stock INTO :restante",
+                    {"cantidad": cantidad, "id_insumo": id_insumo, "restante": restante},
+                )
+                if cursor.rowcount == 1:
+                    self.db.escritura_confirmada()
+                    resultado = ResultadoStock(STOCK_OK, id_insumo, cantidad, valor_retornado(restante))
+                    self._stock_cambiado(id_insumo, resultado.stock)
+                    return resultado
+                return self._faltantes(cursor, {id_insumo: cantidad})[0]
+        except Exception as e:
+            return ResultadoStock(ERROR, id_insumo, cantidad, None, str(e))
+
+    def _stock_cambiado(self, id_insumo: int, stock: Optional[int], nombre: Optional[str] = None) -> None:
+        # stock None: insumo eliminado
+        if self.resumen:
+            self.resumen.stock(id_insumo, stock)
+        if self.monitor:
+            self.monitor.actualizar(id_insumo, stock, nombre)
+
+    def _faltantes(self, cursor, cantidades: Dict[int, int]) -> List[ResultadoStock]:
+        # sólo en el camino de error: distingue insumo inexistente de stock insuficiente
+        ids = list(cantidades)
+        binds = ", ".join(f":{i + 1}" for i in range(len(ids)))
+        cursor.execute(f"SELECT id_insumo, stock FROM tv_insumos WHERE id_insumo IN ({binds})", ids)
+        disponibles = dict(cursor.fetchall())
+        resultados = []
+        for id_insumo in ids:
+            if id_insumo not in disponibles:
+                resultados.append(ResultadoStock(NO_EXISTE, id_insumo, cantidades[id_insumo], None,
+                                                 f"El insumo con ID {id_insumo} no existe."))
+            else:
+                resultados.append(ResultadoStock(SIN_STOCK, id_insumo, cantidades[id_insumo], disponibles[id_insumo],
+                                                 f"Stock insuficiente para insumo ID {id_insumo}: se piden "
+                                                 f"{cantidades[id_insumo]}, hay {disponibles[id_insumo]}"))
+        return resultados
+
+    def consumir(self, id_insumo: int, cantidad: int) -> ResultadoStock:
+        return self._mover_stock(self.CONSULTA_DESCONTAR, id_insumo, cantidad)
+
+    def reservar(self, id_insumo: int, cantidad: int) -> ResultadoStock:
+        # tv_insumos no tiene columna de reservas: reservar aparta unidades del
+        # stock disponible de inmediato y reponer() las devuelve si se anula
+        return self._mover_stock(self.CONSULTA_DESCONTAR, id_insumo, cantidad)
+
+    def reponer(self, id_insumo: int, cantidad: int) -> ResultadoStock:
+        return self._mover_stock(self.CONSULTA_REPONER, id_insumo, cantidad)
+
+    @invalida_cache
+    def consumir_lote(self, items: Iterable[Tuple[int, int]]) -> List[ResultadoStock]:
+        """
+        Descuenta todos los (id_insumo, cantidad) de una receta o ninguno.
+        Devuelve los faltantes; una lista vacía significa que se aplicó completo.
+        """
+        cantidades: Dict[int, int] = {}
+        for id_insumo, cantidad in items:
+            if cantidad <= 0:
+                return [ResultadoStock(ERROR, id_insumo, cantidad, None, "La cantidad debe ser mayor a 0")]
+            cantidades[id_insumo] = cantidades.get(id_insumo, 0) + cantidad
+        if not cantidades:
+            return []
+
+        # ids en orden fijo: dos lotes concurrentes bloquean las filas en el mismo orden
+        filas = [{"cantidad": cantidades[i], "id_insumo": i} for i in sorted(cantidades)]
+        try:
+            # dentro de una transacción ajena sólo se deshace lo de este lote
+            anidada = self.db.transaccion_activa is not None
+            with self.db.transaccion() as tx:
+                # los errores no salen del bloque: un bloque anidado que termina
+                # con excepción cancelaría la transacción exterior completa
                 try:
-                    cursor.close()
-                except Exception:
-                    pass
+                    with self.db.cursor() as cursor:
+                        if anidada:
+                            cursor.execute("SAVEPOINT consumir_lote")
+                        cursor.executemany(self.CONSULTA_DESCONTAR, filas, arraydmlrowcounts=True)
+                        fallidos = {
+                            fila["id_insumo"]: fila["cantidad"]
+                            for fila, n in zip(filas, cursor.getarraydmlrowcounts())
+                            if n == 0
+                        }
+                        if fallidos:
+                            self._deshacer_lote(anidada, tx)
+                            return self._faltantes(cursor, fallidos)
+                except Exception as e:
+                    self._deshacer_lote(anidada, tx)
+                    return [ResultadoStock(ERROR, None, 0, None, str(e))]
+                self.db.confirmar(len(filas))
+                # el executemany no devuelve el stock que quedó: panel y monitor lo releen
+                if self.resumen:
+                    self.resumen.marcar_sucio("stock_bajo")
+                if self.monitor:
+                    self.monitor.marcar_sucios(cantidades)
+            return []
+        except Exception as e:
+            return [ResultadoStock(ERROR, None, 0, None, str(e))]
+
+    def _deshacer_lote(self, anidada: bool, tx: Transaccion) -> None:
+        # anidada: vuelve al savepoint y la transacción exterior sigue en pie;
+        # si ni eso se puede, el estado es incierto y se cancela completa
+        if anidada:
+            try:
+                with self.db.cursor() as cursor:
+                    cursor.execute("ROLLBACK TO SAVEPOINT consumir_lote")
+                return
+            except Exception as e:
+                print(f"[ERROR]: No se pudo volver al savepoint de consumir_lote -> {e}")
+        tx.deshacer()
 
 
 class RecetasModel:
+    CONSULTA_LISTADO = "SELECT id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp FROM tv_recetas"
+    COLUMNA_ID = "id_receta"
+    TABLA = "tv_recetas"
+    CONSULTA_MERGE = """
+        MERGE INTO tv_recetas t
+        USING (SELECT :1 AS id_receta FROM dual) s
+        ON (t.id_receta = s.id_receta)
+        WHEN NOT MATCHED THEN INSERT (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
+        VALUES (s.id_receta, :2, :3, :4, :5, :6)
+    """
+    CONSULTA_NUEVO = """
+        INSERT INTO tv_recetas (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
+        VALUES (sq_recetas.nextval, :1, :2, :3, :4, :5)
+        RETURNING id_receta INTO :6
+    """
+    CONSULTA_UPDATE = """
+        UPDATE tv_recetas
+        SET id_paciente = :1, id_medico = :2, descripcion = :3, medicamentos_recetados = :4, costo_clp = :5
+        WHERE id_receta = :6
+    """
+    CONSULTA_DELETE = "DELETE FROM tv_recetas WHERE id_receta = :1"
+
     def __init__(
         self,
         id_receta: int,
@@ -177,149 +386,170 @@ class RecetasModel:
         self.costo_clp = costo_clp
         self.db = conexion
 
+    @invalida_cache
     def guardar_item(
         self,
-        id_receta: int,
+        id_receta: Optional[int],
         id_paciente: int,
         id_medico: int,
         descripcion: str,
         medicamentos_recetados: str,
         costo_clp: float,
     ) -> bool:
-        cursor = None
+        if id_receta is None:
+            resultado = self.insertar_nuevo(id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
+        else:
+            resultado = self.insertar_si_no_existe(id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
+        if resultado.creado:
+            print(f"[INFO]: Receta folio n°{resultado.id} guardada correctamente")
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar receta folio n°{id_receta} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(
+        self,
+        id_receta: int,
+        id_paciente: int,
+        id_medico: int,
+        descripcion: str,
+        medicamentos_recetados: str,
+        costo_clp: float,
+    ) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp),
+            id_receta,
+            f"Ya existe un ítem con el id {id_receta}",
+        )
+
+    def insertar_nuevo(
+        self,
+        id_paciente: int,
+        id_medico: int,
+        descripcion: str,
+        medicamentos_recetados: str,
+        costo_clp: float,
+    ) -> ResultadoGuardado:
+        return self.db.insertar_con_id(
+            self.CONSULTA_NUEVO,
+            (id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp),
+            "Ya existe la receta",
+        )
+
+    @invalida_cache
+    def editar_item(self, id_receta: int, *datos: tuple) -> bool:
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_recetas WHERE id_receta = :1"
-            cursor.execute(consulta_validacion, (id_receta,))
-
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un ítem con el id {id_receta}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_recetas (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)
-                VALUES (:1, :2, :3, :4, :5, :6)
-            """
-            cursor.execute(consulta_insert, (id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Receta folio n°{id_receta} guardada correctamente")
-            return True
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_recetas WHERE id_receta = :1"
+                cursor.execute(consulta_validacion, (id_receta,))
 
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar receta folio n°{id_receta} -> {e}")
-            return False
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Folio n°{id_receta} no existe en la tabla tv_recetas.")
+                    return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+                if not datos or len(datos) < 5:
+                    print(f"[ERROR]: Sin datos ingresados para Folio n°{id_receta} (se requiere id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)")
+                    return False
 
-    def editar_item(self, id_receta: int, *datos: tuple) -> bool:
-        cursor = None
-        try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_recetas WHERE id_receta = :1"
-            cursor.execute(consulta_validacion, (id_receta,))
-
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Folio n°{id_receta} no existe en la tabla tv_recetas.")
-                return False
-
-            if not datos or len(datos) < 5:
-                print(f"[ERROR]: Sin datos ingresados para Folio n°{id_receta} (se requiere id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp)")
-                return False
-
-            consulta_update = """
-                UPDATE tv_recetas
-                SET id_paciente = :1, id_medico = :2, descripcion = :3, medicamentos_recetados = :4, costo_clp = :5
-                WHERE id_receta = :6
-            """
-
-            cursor.execute(consulta_update, (datos[0], datos[1], datos[2], datos[3], datos[4], id_receta))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Folio n°{id_receta} editado correctamente")
-            return True
 
+                cursor.execute(self.CONSULTA_UPDATE, (datos[0], datos[1], datos[2], datos[3], datos[4], id_receta))
+                self.db.confirmar()
+                print(f"[INFO]: Folio n°{id_receta} editado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar Folio n°{id_receta} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = "SELECT id_receta, id_paciente, id_medico, descripcion, medicamentos_recetados, costo_clp FROM tv_recetas"
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_recetas.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_recetas.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener items desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
+    def mostrar_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_LISTADO, self.COLUMNA_ID, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
+
+    def mostrar_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_desde(self.CONSULTA_LISTADO, self.COLUMNA_ID, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
+
+    def iterar_items(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_LISTADO, tam_lote=tam_lote)
+
+    def obtener_por_id(self, id_receta: int) -> Optional[Tuple[Any, ...]]:
+        fila = self.obtener_varios([id_receta]).get(id_receta)
+        if fila is None:
+            print(f"[INFO]: No se encontró receta con id {id_receta}.")
+        return fila
+
+    def obtener_varios(self, ids: Iterable[int]) -> Dict[int, Tuple[Any, ...]]:
+        try:
+            return self.db.obtener_por_ids(self.CONSULTA_LISTADO, self.COLUMNA_ID, ids)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener recetas por id desde BD -> {e}")
+            return {}
+
+    @invalida_cache
     def eliminar_item(self, id_receta: int) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_recetas WHERE id_receta = :1"
-            cursor.execute(consulta_validacion, (id_receta,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Folio n°{id_receta} no existe en la tabla tv_recetas.")
-                return False
-
-            consulta_delete = "DELETE FROM tv_recetas WHERE id_receta = :1"
-            cursor.execute(consulta_delete, (id_receta,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Folio n°{id_receta} eliminado correctamente")
-            return True
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_recetas WHERE id_receta = :1"
+                cursor.execute(consulta_validacion, (id_receta,))
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Folio n°{id_receta} no existe en la tabla tv_recetas.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_receta,))
+                self.db.confirmar()
+                print(f"[INFO]: Folio n°{id_receta} eliminado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar Folio n°{id_receta} -> {e}")
             return False
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
 
 class ConsultasModel:
+    CONSULTA_LISTADO = "SELECT id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor FROM tv_consultas"
+    COLUMNA_ID = "id_consulta"
+    TABLA = "tv_consultas"
+    resumen: Optional[ResumenDashboard] = None
+    CONSULTA_MERGE = """
+        MERGE INTO tv_consultas t
+        USING (SELECT :1 AS id_consulta FROM dual) s
+        ON (t.id_consulta = s.id_consulta)
+        WHEN NOT MATCHED THEN INSERT (id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor)
+        VALUES (s.id_consulta, :2, :3, :4, :5, :6, :7)
+    """
+    CONSULTA_NUEVO = """
+        INSERT INTO tv_consultas (id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor)
+        VALUES (sq_consultas.nextval, :1, :2, :3, :4, :5, :6)
+        RETURNING id_consulta INTO :7
+    """
+    CONSULTA_UPDATE = """
+        UPDATE tv_consultas
+        SET id_paciente = :1, id_medico = :2, id_receta = :3, fecha = :4, comentarios = :5, valor = :6
+        WHERE id_consulta = :7
+    """
+    CONSULTA_DELETE = "DELETE FROM tv_consultas WHERE id_consulta = :1"
+
     def __init__(
         self,
         id_consulta: int,
@@ -340,9 +570,10 @@ class ConsultasModel:
         self.valor = valor
         self.db = conexion
 
+    @invalida_cache
     def guardar_item(
         self,
-        id_consulta: int,
+        id_consulta: Optional[int],
         id_paciente: int,
         id_medico: int,
         id_receta: int,
@@ -350,146 +581,199 @@ class ConsultasModel:
         comentarios: str,
         valor: float,
     ) -> bool:
-        cursor = None
-        try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_consultas WHERE id_consulta = :1"
-            cursor.execute(consulta_validacion, (id_consulta,))
-
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un ítem con el id {id_consulta}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_consultas (id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor)
-                VALUES (:1, :2, :3, :4, :5, :6, :7)
-            """
-            cursor.execute(consulta_insert, (id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Consulta n°{id_consulta} guardada correctamente")
-            return True
-
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar consulta n°{id_consulta} -> {e}")
-            return False
-
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
+        if id_consulta is None:
+            resultado = self.insertar_nuevo(id_paciente, id_medico, id_receta, fecha, comentarios, valor)
+        else:
+            resultado = self.insertar_si_no_existe(id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor)
+        if resultado.creado:
+            if self.resumen:
+                self.resumen.ingreso(fecha, valor)
+            print(f"[INFO]: Consulta n°{resultado.id} guardada correctamente")
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar consulta n°{id_consulta} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(
+        self,
+        id_consulta: int,
+        id_paciente: int,
+        id_medico: int,
+        id_receta: int,
+        fecha: date,
+        comentarios: str,
+        valor: float,
+    ) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor),
+            id_consulta,
+            f"Ya existe un ítem con el id {id_consulta}",
+        )
+
+    def insertar_nuevo(
+        self,
+        id_paciente: int,
+        id_medico: int,
+        id_receta: int,
+        fecha: date,
+        comentarios: str,
+        valor: float,
+    ) -> ResultadoGuardado:
+        return self.db.insertar_con_id(
+            self.CONSULTA_NUEVO,
+            (id_paciente, id_medico, id_receta, fecha, comentarios, valor),
+            "Ya existe la consulta",
+        )
+
+    @invalida_cache
     def editar_item(self, id_consulta: int, *datos: tuple) -> bool:
 
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_consultas WHERE id_consulta = :1"
-            cursor.execute(consulta_validacion, (id_consulta,))
-
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Consulta n°{id_consulta} no existe en la tabla tv_consultas.")
-                return False
-
-            if not datos or len(datos) < 6:
-                print(f"[ERROR]: Sin datos ingresados para consulta n°{id_consulta} (se requiere id_paciente, id_medico, id_receta, fecha, comentarios, valor)")
-                return False
-
-            consulta_update = """
-                UPDATE tv_consultas
-                SET id_paciente = :1, id_medico = :2, id_receta = :3, fecha = :4, comentarios = :5, valor = :6
-                WHERE id_consulta = :7
-            """
-            cursor.execute(consulta_update, (datos[0], datos[1], datos[2], datos[3], datos[4], datos[5], id_consulta))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Consulta n°{id_consulta} editada correctamente")
-            return True
-
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT fecha, valor FROM tv_consultas WHERE id_consulta = :1"
+                cursor.execute(consulta_validacion, (id_consulta,))
+                anterior = cursor.fetchone()
+
+                if anterior is None:
+                    print(f"[ERROR]: Consulta n°{id_consulta} no existe en la tabla tv_consultas.")
+                    return False
+
+                if not datos or len(datos) < 6:
+                    print(f"[ERROR]: Sin datos ingresados para consulta n°{id_consulta} (se requiere id_paciente, id_medico, id_receta, fecha, comentarios, valor)")
+                    return False
+
+                cursor.execute(self.CONSULTA_UPDATE, (datos[0], datos[1], datos[2], datos[3], datos[4], datos[5], id_consulta))
+                self.db.confirmar()
+                if self.resumen:
+                    self.resumen.ingreso(anterior[0], -anterior[1])
+                    self.resumen.ingreso(datos[3], datos[5])
+                print(f"[INFO]: Consulta n°{id_consulta} editada correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar consulta n°{id_consulta} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = "SELECT id_consulta, id_paciente, id_medico, id_receta, fecha, comentarios, valor FROM tv_consultas"
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_consultas.")
-                return []
-
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_consultas.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener items desde BD -> {e}")
             return []
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+    def mostrar_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_LISTADO, self.COLUMNA_ID, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
 
-    def eliminar_item(self, id_consulta: int) -> bool:
-        cursor = None
+    def mostrar_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_consultas WHERE id_consulta = :1"
-            cursor.execute(consulta_validacion, (id_consulta,))
+            return self.db.listar_desde(self.CONSULTA_LISTADO, self.COLUMNA_ID, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
 
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Consulta n°{id_consulta} no existe en la tabla tv_consultas.")
-                return False
+    def iterar_items(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_LISTADO, tam_lote=tam_lote)
 
-            consulta_delete = "DELETE FROM tv_consultas WHERE id_consulta = :1"
-            cursor.execute(consulta_delete, (id_consulta,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Consulta n°{id_consulta} eliminada correctamente")
-            return True
+    def obtener_por_id(self, id_consulta: int) -> Optional[Tuple[Any, ...]]:
+        fila = self.obtener_varios([id_consulta]).get(id_consulta)
+        if fila is None:
+            print(f"[INFO]: No se encontró consulta con id {id_consulta}.")
+        return fila
 
+    def obtener_varios(self, ids: Iterable[int]) -> Dict[int, Tuple[Any, ...]]:
+        try:
+            return self.db.obtener_por_ids(self.CONSULTA_LISTADO, self.COLUMNA_ID, ids)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener consultas por id desde BD -> {e}")
+            return {}
+
+    @invalida_cache
+    def eliminar_item(self, id_consulta: int) -> bool:
+        try:
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT fecha, valor FROM tv_consultas WHERE id_consulta = :1"
+                cursor.execute(consulta_validacion, (id_consulta,))
+                anterior = cursor.fetchone()
+
+                if anterior is None:
+                    print(f"[ERROR]: Consulta n°{id_consulta} no existe en la tabla tv_consultas.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_consulta,))
+                self.db.confirmar()
+                if self.resumen:
+                    self.resumen.ingreso(anterior[0], -anterior[1])
+                print(f"[INFO]: Consulta n°{id_consulta} eliminada correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar consulta n°{id_consulta} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
 
 class AgendaModel:
+    CONSULTA_LISTADO = "SELECT id_agenda, id_paciente, id_medico, fecha_consulta, estado FROM tv_agenda"
+    COLUMNA_ID = "id_agenda"
+    resumen: Optional[ResumenDashboard] = None
+    indice: Optional["IndiceAgenda"] = None
+    CONSULTA_MERGE = """
+        MERGE INTO tv_agenda t
+        USING (SELECT :1 AS id_agenda FROM dual) s
+        ON (t.id_agenda = s.id_agenda)
+        WHEN NOT MATCHED THEN INSERT (id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+        VALUES (s.id_agenda, :2, :3, :4, :5)
+    """
+    CONSULTA_NUEVO = """
+        INSERT INTO tv_agenda (id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+        VALUES (sq_agenda.nextval, :1, :2, :3, :4)
+        RETURNING id_agenda INTO :5
+    """
+    CONSULTA_UPDATE = """
+        UPDATE tv_agenda
+        SET id_paciente = :1, id_medico = :2, fecha_consulta = :3, estado = :4
+        WHERE id_agenda = :5
+    """
+    CONSULTA_DELETE = "DELETE FROM tv_agenda WHERE id_agenda = :1"
+    # la fila del médico sirve de candado: dos reservas del mismo médico se serializan
+    CONSULTA_BLOQUEO_MEDICO = "SELECT 1 FROM tv_medico WHERE id_medico = :1 FOR UPDATE"
+    CONSULTA_CONFLICTO = f"""
+        SELECT id_agenda, fecha_consulta FROM tv_agenda
+        WHERE id_medico = :id_medico
+          AND fecha_consulta > :inicio - :duracion
+          AND fecha_consulta < :inicio + :duracion
+          AND id_agenda <> :excluir
+          AND lower(estado) NOT IN ({", ".join(f"'{e}'" for e in ESTADOS_LIBERADOS)})
+        FETCH FIRST 1 ROWS ONLY
+    """
+
+    CONSULTA_TOMADAS = f"""
+        SELECT id_medico, fecha_consulta FROM tv_agenda
+        WHERE fecha_consulta > :desde AND fecha_consulta < :hasta
+          AND lower(estado) NOT IN ({", ".join(f"'{e}'" for e in ESTADOS_LIBERADOS)})
+        ORDER BY id_medico, fecha_consulta
+    """
+    CONSULTA_INSERT_LOTE = """
+        INSERT INTO tv_agenda (id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+        VALUES (:1, :2, :3, :4, :5)
+    """
+    CONSULTA_NUEVO_LOTE = """
+        INSERT INTO tv_agenda (id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+        VALUES (sq_agenda.nextval, :1, :2, :3, :4)
+    """
+
     def __init__(self, id: int, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str, conexion: conexion_oracle):
         self.id = id
         self.id_paciente = id_paciente
@@ -498,132 +782,281 @@ class AgendaModel:
         self.estado = estado
         self.db = conexion
 
-    def guardar_item(self, id_agenda: int, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> bool:
-        cursor = None
+    def guardar_item(self, id_agenda: Optional[int], id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> bool:
+        resultado = self.reservar_hora(id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+        if resultado.creado:
+            print(f"[INFO]: Agenda n°{resultado.id} guardada correctamente")
+        elif resultado.estado in (DUPLICADO, CONFLICTO):
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar agenda n°{id_agenda} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def reservar_hora(
+        self, id_agenda: Optional[int], id_paciente: int, id_medico: int, fecha_consulta: date, estado: str
+    ) -> ResultadoGuardado:
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_agenda WHERE id_agenda = :1"
-            cursor.execute(consulta_validacion, (id_agenda,))
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un ítem con el id {id_agenda}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_agenda (id_agenda, id_paciente, id_medico, fecha_consulta, estado)
-                VALUES (:1, :2, :3, :4, :5)
-            """
-            cursor.execute(consulta_insert, (id_agenda, id_paciente, id_medico, fecha_consulta, estado))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Agenda n°{id_agenda} guardada correctamente")
-            return True
-
+            with self.db.transaccion():
+                if estado.lower() not in ESTADOS_LIBERADOS:
+                    with self.db.cursor() as cursor:
+                        conflicto = self.verificar_disponible(cursor, id_medico, fecha_consulta)
+                    if conflicto:
+                        return ResultadoGuardado(CONFLICTO, id_agenda, conflicto)
+                if id_agenda is None:
+                    resultado = self.insertar_nuevo(id_paciente, id_medico, fecha_consulta, estado)
+                else:
+                    resultado = self.insertar_si_no_existe(id_agenda, id_paciente, id_medico, fecha_consulta, estado)
+                if resultado.creado and self.resumen:
+                    self.resumen.agenda(None, estado)
+                if resultado.creado:
+                    self._indexar(resultado.id, id_medico, fecha_consulta, estado)
+                return resultado
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar agenda n°{id_agenda} -> {e}")
-            return False
-
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+            return ResultadoGuardado(ERROR, id_agenda, str(e))
+
+    def verificar_disponible(self, cursor, id_medico: int, fecha_consulta: date, excluir: Optional[int] = None) -> Optional[str]:
+        # debe correr dentro de una transacción: el candado dura hasta el commit del insert/update
+        cursor.execute(self.CONSULTA_BLOQUEO_MEDICO, (id_medico,))
+        if cursor.fetchone() is None:
+            return f"El médico id {id_medico} no existe"
+        cursor.execute(
+            self.CONSULTA_CONFLICTO,
+            {
+                "id_medico": id_medico,
+                "inicio": fecha_consulta,
+                "duracion": DURACION_CITA_MIN / 1440,
+                "excluir": -1 if excluir is None else excluir,
+            },
+        )
+        choque = cursor.fetchone()
+        if choque is None:
+            return None
+        return f"El médico id {id_medico} ya tiene la agenda n°{choque[0]} el {choque[1]:%Y-%m-%d %H:%M}"
+
+    def reservar_lote(self, filas: Sequence[Tuple[Any, ...]]) -> List[Tuple[str, str]]:
+        """
+        filas: (id_agenda o None, id_paciente, id_medico, fecha_consulta, estado)
+        ya validadas, con fecha_consulta como datetime. Devuelve (estado, mensaje)
+        por fila, en el mismo orden; ante un choque gana la fila que viene antes.
+        """
+        resultados: List[Tuple[str, str]] = [(CREADO, "")] * len(filas)
+        if not filas:
+            return resultados
+
+        duracion = timedelta(minutes=DURACION_CITA_MIN)
+        try:
+            medicos = sorted({fila[2] for fila in filas})
+            ocupan = [fila[4].lower() not in ESTADOS_LIBERADOS for fila in filas]
+            with self.db.transaccion(), self.db.cursor() as cursor:
+                # mismos candados que reservar_hora, tomados de a 1000 médicos por viaje
+                medicos_existentes = set()
+                for inicio in range(0, len(medicos), 1000):
+                    grupo = medicos[inicio:inicio + 1000]
+                    binds = ", ".join(f":{i + 1}" for i in range(len(grupo)))
+                    cursor.execute(f"SELECT id_medico FROM tv_medico WHERE id_medico IN ({binds}) FOR UPDATE", grupo)
+                    medicos_existentes.update(r[0] for r in cursor.fetchall())
+
+                # una sola lectura de las horas tomadas en todo el rango del lote
+                tomadas: Dict[int, List[datetime]] = {}
+                fechas = [fila[3] for fila, ocupa in zip(filas, ocupan) if ocupa]
+                if fechas:
+                    cursor.arraysize = 5000
+                    cursor.execute(self.CONSULTA_TOMADAS, {"desde": min(fechas) - duracion, "hasta": max(fechas) + duracion})
+                    for id_medico, fecha_consulta in cursor:
+                        tomadas.setdefault(id_medico, []).append(fecha_consulta)
+
+                candidatas: List[int] = []
+                for i, fila in enumerate(filas):
+                    if fila[2] not in medicos_existentes:
+                        resultados[i] = (ERROR, f"El médico id {fila[2]} no existe")
+                    else:
+                        candidatas.append(i)
+
+                # una fila que Oracle rechaza (ej. paciente inexistente) suelta su
+                # hora: las que chocaron con ella vuelven a intentarlo en otra pasada
+                con_id: List[int] = []
+                sin_id: List[int] = []
+                insertadas = 0
+                while candidatas:
+                    aceptadas: List[int] = []
+                    en_conflicto: List[int] = []
+                    for i in candidatas:
+                        id_medico, fecha_consulta = filas[i][2], filas[i][3]
+                        if ocupan[i]:
+                            inicios = tomadas.setdefault(id_medico, [])
+                            choque = hora_en_conflicto(inicios, fecha_consulta, duracion)
+                            if choque is not None:
+                                resultados[i] = (CONFLICTO, f"El médico id {id_medico} ya tiene una hora el {choque:%Y-%m-%d %H:%M}")
+                                en_conflicto.append(i)
+                                continue
+                            bisect.insort(inicios, fecha_consulta)
+                        resultados[i] = (CREADO, "")
+                        aceptadas.append(i)
+
+                    pasada_con_id = [i for i in aceptadas if filas[i][0] is not None]
+                    pasada_sin_id = [i for i in aceptadas if filas[i][0] is None]
+                    liberados = set()
+                    for consulta, indices, desde_col in ((self.CONSULTA_INSERT_LOTE, pasada_con_id, 0), (self.CONSULTA_NUEVO_LOTE, pasada_sin_id, 1)):
+                        if not indices:
+                            continue
+                        cursor.executemany(consulta, [tuple(filas[i][desde_col:]) for i in indices], batcherrors=True)
+                        errores = cursor.getbatcherrors()
+                        for error in errores:
+                            i = indices[error.offset]
+                            resultados[i] = (DUPLICADO if error.code == ORA_UNICO else ERROR, error.message)
+                            if ocupan[i]:
+                                tomadas[filas[i][2]].remove(filas[i][3])
+                                liberados.add(filas[i][2])
+                        insertadas += len(indices) - len(errores)
+                    con_id.extend(pasada_con_id)
+                    sin_id.extend(pasada_sin_id)
+                    candidatas = [i for i in en_conflicto if filas[i][2] in liberados]
+
+                if con_id:
+                    self.db.avanzar_secuencia("tv_agenda", max(filas[i][0] for i in con_id))
+                self.db.confirmar(insertadas)
+                if insertadas and self.resumen:
+                    self.resumen.marcar_sucio("agenda")
+                if insertadas and self.indice:
+                    self._indexar_lote(filas, con_id, sin_id, resultados)
+        except Exception as e:
+            return [(ERROR, str(e))] * len(filas)
+        return resultados
+
+    def _indexar(self, id_agenda: int, id_medico: int, fecha_consulta: date, estado: str) -> None:
+        # el índice sólo ve escrituras confirmadas: si la transacción se deshace no se toca
+        indice = self.indice
+        if indice and str(estado).lower() not in ESTADOS_LIBERADOS:
+            self.db.despues_de_confirmar(lambda: indice.agregar(id_medico, id_agenda, fecha_consulta))
+
+    def _desindexar(self, id_agenda: int) -> None:
+        indice = self.indice
+        if indice:
+            self.db.despues_de_confirmar(lambda: indice.quitar(id_agenda))
+
+    def _indexar_lote(
+        self, filas: Sequence[Tuple[Any, ...]], con_id: List[int], sin_id: List[int], resultados: List[Tuple[str, str]]
+    ) -> None:
+        for i in con_id:
+            if resultados[i][0] == CREADO:
+                self._indexar(filas[i][0], filas[i][2], filas[i][3], filas[i][4])
+        # el executemany con la secuencia no devuelve los ids: esos médicos se recargan
+        indice = self.indice
+        medicos = {filas[i][2] for i in sin_id if resultados[i][0] == CREADO}
+        for id_medico in medicos:
+            self.db.despues_de_confirmar(lambda id_medico=id_medico: indice.invalidar(id_medico))
+
+    def insertar_si_no_existe(
+        self, id_agenda: int, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str
+    ) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_agenda, id_paciente, id_medico, fecha_consulta, estado),
+            id_agenda,
+            f"Ya existe un ítem con el id {id_agenda}",
+        )
+
+    def insertar_nuevo(self, id_paciente: int, id_medico: int, fecha_consulta: date, estado: str) -> ResultadoGuardado:
+        return self.db.insertar_con_id(
+            self.CONSULTA_NUEVO,
+            (id_paciente, id_medico, fecha_consulta, estado),
+            "Ya existe la agenda",
+        )
 
     def editar_item(self, id_agenda: int, *datos: tuple) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_agenda WHERE id_agenda = :1"
-            cursor.execute(consulta_validacion, (id_agenda,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Agenda n°{id_agenda} no existe en la tabla tv_agenda.")
-                return False
-
-            if not datos or len(datos) < 4:
-                print(f"[ERROR]: Sin datos ingresados para agenda n°{id_agenda}")
-                return False
-
-            consulta_update = """
-                UPDATE tv_agenda
-                SET id_paciente = :1, id_medico = :2, fecha_consulta = :3, estado = :4
-                WHERE id_agenda = :5
-            """
-            cursor.execute(consulta_update, (datos[0], datos[1], datos[2], datos[3], id_agenda))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Agenda n°{id_agenda} editada correctamente")
-            return True
-
+            with self.db.transaccion(), self.db.cursor() as cursor:
+                consulta_validacion = "SELECT estado FROM tv_agenda WHERE id_agenda = :1"
+                cursor.execute(consulta_validacion, (id_agenda,))
+                anterior = cursor.fetchone()
+                if anterior is None:
+                    print(f"[ERROR]: Agenda n°{id_agenda} no existe en la tabla tv_agenda.")
+                    return False
+
+                if not datos or len(datos) < 4:
+                    print(f"[ERROR]: Sin datos ingresados para agenda n°{id_agenda}")
+                    return False
+
+                if str(datos[3]).lower() not in ESTADOS_LIBERADOS:
+                    conflicto = self.verificar_disponible(cursor, datos[1], datos[2], excluir=id_agenda)
+                    if conflicto:
+                        print(f"[ERROR]: {conflicto}")
+                        return False
+
+                cursor.execute(self.CONSULTA_UPDATE, (datos[0], datos[1], datos[2], datos[3], id_agenda))
+                self.db.confirmar()
+                if self.resumen:
+                    self.resumen.agenda(anterior[0], datos[3])
+                self._desindexar(id_agenda)
+                self._indexar(id_agenda, datos[1], datos[2], datos[3])
+                print(f"[INFO]: Agenda n°{id_agenda} editada correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar agenda n°{id_agenda} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = "SELECT id_agenda, id_paciente, id_medico, fecha_consulta, estado FROM tv_agenda"
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_agenda.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_agenda.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener items desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+
+    def mostrar_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_LISTADO, self.COLUMNA_ID, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
+
+    def mostrar_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_desde(self.CONSULTA_LISTADO, self.COLUMNA_ID, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
+
+    def iterar_items(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_LISTADO, tam_lote=tam_lote)
+
+    def obtener_por_id(self, id_agenda: int) -> Optional[Tuple[Any, ...]]:
+        fila = self.obtener_varios([id_agenda]).get(id_agenda)
+        if fila is None:
+            print(f"[INFO]: No se encontró agenda con id {id_agenda}.")
+        return fila
+
+    def obtener_varios(self, ids: Iterable[int]) -> Dict[int, Tuple[Any, ...]]:
+        try:
+            return self.db.obtener_por_ids(self.CONSULTA_LISTADO, self.COLUMNA_ID, ids)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener agendas por id desde BD -> {e}")
+            return {}
 
     def eliminar_item(self, id_agenda: int) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_agenda WHERE id_agenda = :1"
-            cursor.execute(consulta_validacion, (id_agenda,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Agenda n°{id_agenda} no existe en la tabla tv_agenda.")
-                return False
-
-            consulta_delete = "DELETE FROM tv_agenda WHERE id_agenda = :1"
-            cursor.execute(consulta_delete, (id_agenda,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Agenda n°{id_agenda} eliminada correctamente")
-            return True
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT estado FROM tv_agenda WHERE id_agenda = :1"
+                cursor.execute(consulta_validacion, (id_agenda,))
+                anterior = cursor.fetchone()
+                if anterior is None:
+                    print(f"[ERROR]: Agenda n°{id_agenda} no existe en la tabla tv_agenda.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_agenda,))
+                self.db.confirmar()
+                if self.resumen:
+                    self.resumen.agenda(anterior[0], None)
+                self._desindexar(id_agenda)
+                print(f"[INFO]: Agenda n°{id_agenda} eliminada correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar agenda n°{id_agenda} -> {e}")
-            return False
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
\ No newline at end of file
+            return False
\ No newline at end of file
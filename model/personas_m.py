@@ -1,9 +1,47 @@
-from config.db_config import conexion_oracle
+from config.db_config import conexion_oracle, ResultadoGuardado, DUPLICADO
 from datetime import date
-from typing import Optional, List, Tuple, Any
+from typing import Optional, List, Tuple, Any, Dict, Iterable, Iterator, Set
+from itertools import islice
+from model.autenticacion_m import ServicioAutenticacion
+from model.resumenes_m import ResumenDashboard
+from utils.cache import CacheTTL, agrupar_cache, cacheado, invalida_cache, invalida_tablas
 
 
 class UsuarioModel:
+    CONSULTA_LISTADO = """
+        SELECT
+            id_usuario, nombre_usuario, nombre, apellido,
+            fecha_nacimiento, telefono, email, tipo
+        FROM tv_usuario
+    """
+    COLUMNA_ID = "id_usuario"
+    TABLA = "tv_usuario"
+    cache: Optional[CacheTTL] = None
+    autenticacion: Optional[ServicioAutenticacion] = None
+    CONSULTA_MERGE = """
+        MERGE INTO tv_usuario t
+        USING (SELECT :1 AS id_usuario, :2 AS nombre_usuario FROM dual) s
+        ON (t.id_usuario = s.id_usuario OR t.nombre_usuario = s.nombre_usuario)
+        WHEN NOT MATCHED THEN INSERT (
+            id_usuario, nombre_usuario, clave, nombre, apellido,
+            fecha_nacimiento, telefono, email, tipo
+        ) VALUES (s.id_usuario, s.nombre_usuario, :3, :4, :5, :6, :7, :8, :9)
+    """
+    CONSULTA_NUEVO = """
+        INSERT INTO tv_usuario (
+            id_usuario, nombre_usuario, clave, nombre, apellido,
+            fecha_nacimiento, telefono, email, tipo
+        ) VALUES (sq_usuario.nextval, :1, :2, :3, :4, :5, :6, :7, :8)
+        RETURNING id_usuario INTO :9
+    """
+    CONSULTA_UPDATE = """
+        UPDATE tv_usuario
+        SET nombre_usuario = :1, clave = :2, nombre = :3, apellido = :4,
+            fecha_nacimiento = :5, telefono = :6, email = :7, tipo = :8
+        WHERE id_usuario = :9
+    """
+    CONSULTA_DELETE = "DELETE FROM tv_usuario WHERE id_usuario = :1"
+
     def __init__(
         self,
         id_usuario: int,
@@ -28,9 +66,10 @@ class UsuarioModel:
         self.tipo = tipo
         self.db = conexion
 
+    @invalida_tablas("tv_usuario")
     def guardar_item(
         self,
-        id_usuario: int,
+        id_usuario: Optional[int],
         nombre_usuario: str,
         clave: str,
         nombre: str,
@@ -40,199 +79,274 @@ class UsuarioModel:
         email: str,
         tipo: str,
     ) -> bool:
-        cursor = None
-        try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1 OR nombre_usuario = :2"
-            cursor.execute(consulta_validacion, (id_usuario, nombre_usuario))
-
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un usuario con id {id_usuario} o nombre_usuario {nombre_usuario}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_usuario (
-                    id_usuario, nombre_usuario, clave, nombre, apellido,
-                    fecha_nacimiento, telefono, email, tipo
-                ) VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9)
-            """
-            cursor.execute(
-                consulta_insert,
-                (
-                    id_usuario,
-                    nombre_usuario,
-                    clave,
-                    nombre,
-                    apellido,
-                    fecha_nacimiento,
-                    telefono,
-                    email,
-                    tipo,
-                ),
+        if id_usuario is None:
+            resultado = self.insertar_nuevo(nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo)
+        else:
+            resultado = self.insertar_si_no_existe(
+                id_usuario, nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo
             )
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Usuario {nombre_usuario} (id {id_usuario}) guardado correctamente")
-            return True
-
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar usuario {nombre_usuario} -> {e}")
-            return False
+        if resultado.creado:
+            print(f"[INFO]: Usuario {nombre_usuario} (id {resultado.id}) guardado correctamente")
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar usuario {nombre_usuario} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(
+        self,
+        id_usuario: int,
+        nombre_usuario: str,
+        clave: str,
+        nombre: str,
+        apellido: str,
+        fecha_nacimiento: date,
+        telefono: str,
+        email: str,
+        tipo: str,
+    ) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_usuario, nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo),
+            id_usuario,
+            f"Ya existe un usuario con id {id_usuario} o nombre_usuario {nombre_usuario}",
+        )
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+    def insertar_nuevo(
+        self,
+        nombre_usuario: str,
+        clave: str,
+        nombre: str,
+        apellido: str,
+        fecha_nacimiento: date,
+        telefono: str,
+        email: str,
+        tipo: str,
+    ) -> ResultadoGuardado:
+        # el índice único sobre nombre_usuario hace que un duplicado llegue como ORA-00001
+        return self.db.insertar_con_id(
+            self.CONSULTA_NUEVO,
+            (nombre_usuario, clave, nombre, apellido, fecha_nacimiento, telefono, email, tipo),
+            f"Ya existe un usuario con nombre_usuario {nombre_usuario}",
+        )
 
     def crear(self, *args, **kwargs) -> bool:
         return self.guardar_item(*args, **kwargs)
 
+    # heredado por AdministradorModel: escribe tv_usuario, no self.TABLA
+    @invalida_tablas("tv_usuario")
     def editar_item(self, id_usuario: int, *datos: tuple) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
-            cursor.execute(consulta_validacion, (id_usuario,))
-
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Usuario id {id_usuario} no existe en la tabla tv_usuario.")
-                return False
-
-            if not datos or len(datos) < 8:
-                print(f"[ERROR]: Sin datos ingresados para usuario id {id_usuario} (se requieren 8 campos).")
-                return False
-
-            consulta_update = """
-                UPDATE tv_usuario
-                SET nombre_usuario = :1, clave = :2, nombre = :3, apellido = :4,
-                    fecha_nacimiento = :5, telefono = :6, email = :7, tipo = :8
-                WHERE id_usuario = :9
-            """
-            cursor.execute(
-                consulta_update,
-                (
-                    datos[0],
-                    datos[1],
-                    datos[2],
-                    datos[3],
-                    datos[4],
-                    datos[5],
-                    datos[6],
-                    datos[7],
-                    id_usuario,
-                ),
-            )
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Usuario id {id_usuario} editado correctamente")
-            return True
-
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
+                cursor.execute(consulta_validacion, (id_usuario,))
+
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Usuario id {id_usuario} no existe en la tabla tv_usuario.")
+                    return False
+
+                if not datos or len(datos) < 8:
+                    print(f"[ERROR]: Sin datos ingresados para usuario id {id_usuario} (se requieren 8 campos).")
+                    return False
+
+                cursor.execute(
+                    self.CONSULTA_UPDATE,
+                    (
+                        datos[0],
+                        datos[1],
+                        datos[2],
+                        datos[3],
+                        datos[4],
+                        datos[5],
+                        datos[6],
+                        datos[7],
+                        id_usuario,
+                    ),
+                )
+                self.db.confirmar()
+                # la clave pudo cambiar: las sesiones y la credencial en cache dejan de valer
+                if self.autenticacion:
+                    self.autenticacion.revocar_usuario(id_usuario)
+                print(f"[INFO]: Usuario id {id_usuario} editado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar usuario id {id_usuario} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
     def editar(self, id_usuario: int, *datos: tuple) -> bool:
         return self.editar_item(id_usuario, *datos)
 
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = """
-                SELECT
-                    id_usuario, nombre_usuario, nombre, apellido,
-                    fecha_nacimiento, telefono, email, tipo
-                FROM tv_usuario
-            """
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_usuario.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_usuario.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener usuarios desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
+    @cacheado
+    def mostrar_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_LISTADO, self.COLUMNA_ID, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
 
-    def mostrar_todos(self) -> List[Tuple[Any, ...]]:
-        return self.mostrar_items()
+    @cacheado
+    def mostrar_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_desde(self.CONSULTA_LISTADO, self.COLUMNA_ID, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
 
-    def eliminar_item(self, id_usuario: int) -> bool:
-        cursor = None
+    def iterar_items(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_LISTADO, tam_lote=tam_lote)
+
+    def obtener_por_id(self, id_item: int) -> Optional[Tuple[Any, ...]]:
+        fila = self.obtener_varios([id_item]).get(id_item)
+        if fila is None:
+            print(f"[INFO]: No se encontró registro con id {id_item}.")
+        return fila
+
+    def obtener_varios(self, ids: Iterable[int]) -> Dict[int, Tuple[Any, ...]]:
+        # una consulta IN por cada MAX_IN ids; dentro de db.operacion() o de una
+        # transacción los ids repetidos se sirven desde el mapa de identidad
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
-            cursor.execute(consulta_validacion, (id_usuario,))
+            consulta, columna_id = self._consulta_por_id()
+            return self.db.obtener_por_ids(consulta, columna_id, ids)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros por id desde BD -> {e}")
+            return {}
 
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Usuario id {id_usuario} no existe en la tabla tv_usuario.")
-                return False
+    def _consulta_por_id(self) -> Tuple[str, str]:
+        return self.CONSULTA_LISTADO, self.COLUMNA_ID
 
-            consulta_delete = "DELETE FROM tv_usuario WHERE id_usuario = :1"
-            cursor.execute(consulta_delete, (id_usuario,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Usuario id {id_usuario} eliminado correctamente")
-            return True
 
+    def mostrar_todos(self) -> List[Tuple[Any, ...]]:
+        return self.mostrar_items()
+
+    @invalida_tablas("tv_usuario")
+    def eliminar_item(self, id_usuario: int) -> bool:
+        try:
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
+                cursor.execute(consulta_validacion, (id_usuario,))
+
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Usuario id {id_usuario} no existe en la tabla tv_usuario.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_usuario,))
+                self.db.confirmar()
+                if self.autenticacion:
+                    self.autenticacion.revocar_usuario(id_usuario)
+                print(f"[INFO]: Usuario id {id_usuario} eliminado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar usuario id {id_usuario} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
     def eliminar(self, id_usuario: int) -> bool:
         return self.eliminar_item(id_usuario)
     
     def existe_usuario(self, nombre_usuario: str) -> bool:
-        cursor = self.db.obtener_cursor()
-        try:
+        with self.db.cursor() as cursor:
             cursor.execute(
                 "SELECT 1 FROM tv_usuario WHERE nombre_usuario = :1",
                 (nombre_usuario,)
             )
             return cursor.fetchone() is not None
-        finally:
-            cursor.close()
+
+    def usuarios_existentes(self) -> Tuple[Set[int], Set[str]]:
+        ids: Set[int] = set()
+        nombres: Set[str] = set()
+        with self.db.cursor() as cursor:
+            cursor.arraysize = 5000
+            cursor.execute("SELECT id_usuario, nombre_usuario FROM tv_usuario")
+            while True:
+                filas = cursor.fetchmany()
+                if not filas:
+                    break
+                for id_usuario, nombre_usuario in filas:
+                    ids.add(id_usuario)
+                    nombres.add(nombre_usuario)
+        return ids, nombres
+
+    @invalida_tablas("tv_usuario")
+    def guardar_items_lote(self, filas: Iterable[Tuple[Any, ...]], tam_lote: int = 1000) -> Tuple[int, List[Tuple[int, str]]]:
+        """
+        filas: tuplas (id_usuario, nombre_usuario, clave, nombre, apellido,
+        fecha_nacimiento, telefono, email, tipo). Devuelve (insertados, errores)
+        donde cada error es (posición de la fila, mensaje de Oracle).
+        """
+        tam_lote = max(1, int(tam_lote))
+        consulta_insert = """
+            INSERT INTO tv_usuario (
+                id_usuario, nombre_usuario, clave, nombre, apellido,
+                fecha_nacimiento, telefono, email, tipo
+            ) VALUES (:1, :2, :3, :4, :5, :6, :7, :8, :9)
+        """
+        insertados = 0
+        errores: List[Tuple[int, str]] = []
+        iterador = iter(filas)
+        inicio = 0
+        with self.db.cursor() as cursor:
+            while True:
+                lote = list(islice(iterador, tam_lote))
+                if not lote:
+                    break
+                cursor.executemany(consulta_insert, lote, batcherrors=True)
+                errores_lote = cursor.getbatcherrors()
+                for error in errores_lote:
+                    errores.append((inicio + error.offset, error.message))
+                self.db.confirmar(len(lote))
+                # ids explícitos: la secuencia tiene que quedar por encima
+                self.db.avanzar_secuencia("tv_usuario", max((fila[0] for fila in lote if fila[0] is not None), default=None))
+                insertados += len(lote) - len(errores_lote)
+                print(f"[INFO]: Lote de {len(lote)} usuarios procesado ({len(errores_lote)} con error)")
+                inicio += len(lote)
+        return insertados, errores
+
 
 class PacienteModel(UsuarioModel):
+    CONSULTA_LISTADO = "SELECT id_paciente, comuna, fecha_primera_visita FROM tv_paciente"
+    COLUMNA_ID = "id_paciente"
+    TABLA = "tv_paciente"
+    CONSULTA_COMPLETO = """
+        SELECT
+            u.id_usuario,
+            u.nombre_usuario,
+            u.clave,
+            u.nombre,
+            u.apellido,
+            u.fecha_nacimiento,
+            u.telefono,
+            u.email,
+            u.tipo,
+            p.comuna,
+            p.fecha_primera_visita
+        FROM tv_paciente p
+        JOIN tv_usuario u ON p.id_paciente = u.id_usuario
+    """
+    COLUMNA_ID_COMPLETO = "p.id_paciente"
+    resumen: Optional[ResumenDashboard] = None
+    CONSULTA_MERGE = """
+        MERGE INTO tv_paciente t
+        USING (SELECT :1 AS id_paciente FROM dual) s
+        ON (t.id_paciente = s.id_paciente)
+        WHEN NOT MATCHED THEN INSERT (id_paciente, comuna, fecha_primera_visita)
+        VALUES (s.id_paciente, :2, :3)
+    """
+    CONSULTA_UPDATE = "UPDATE tv_paciente SET comuna = :1, fecha_primera_visita = :2 WHERE id_paciente = :3"
+    CONSULTA_DELETE = "DELETE FROM tv_paciente WHERE id_paciente = :1"
 
     def __init__(
         self,
@@ -261,184 +375,163 @@ class PacienteModel(UsuarioModel):
         )
         self.id_paciente = id_usuario
 
+    @invalida_cache
     def guardar_item(self, id_paciente: int, comuna: str, fecha_primera_visita: date) -> bool:
-        cursor = None
-        try:
-            cursor = self.db.obtener_cursor()
-            # validar que exista usuario
-            consulta_usuario = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
-            cursor.execute(consulta_usuario, (id_paciente,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: No existe usuario con id {id_paciente} en tv_usuario; crear usuario antes de asignar paciente.")
-                return False
-
-            consulta_validacion = "SELECT 1 FROM tv_paciente WHERE id_paciente = :1"
-            cursor.execute(consulta_validacion, (id_paciente,))
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un paciente con id {id_paciente}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_paciente (id_paciente, comuna, fecha_primera_visita)
-                VALUES (:1, :2, :3)
-            """
-            cursor.execute(consulta_insert, (id_paciente, comuna, fecha_primera_visita))
-            if self.db.connection:
-                self.db.connection.commit()
+        resultado = self.insertar_si_no_existe(id_paciente, comuna, fecha_primera_visita)
+        if resultado.creado:
+            if self.resumen:
+                self.resumen.paciente(1)
             print(f"[INFO]: Paciente id {id_paciente} guardado correctamente")
-            return True
-
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar paciente id {id_paciente} -> {e}")
-            return False
-
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar paciente id {id_paciente} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(self, id_paciente: int, comuna: str, fecha_primera_visita: date) -> ResultadoGuardado:
+        # la FK a tv_usuario reemplaza el SELECT previo: ORA-02291 si no existe el usuario
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_paciente, comuna, fecha_primera_visita),
+            id_paciente,
+            f"Ya existe un paciente con id {id_paciente}",
+            f"No existe usuario con id {id_paciente} en tv_usuario; crear usuario antes de asignar paciente.",
+        )
 
     def crear(self, id_paciente: int, comuna: str, fecha_primera_visita: date) -> bool:
         return self.guardar_item(id_paciente, comuna, fecha_primera_visita)
 
+    @invalida_cache
     def editar_item(self, id_paciente: int, *datos: tuple) -> bool:
 
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_paciente WHERE id_paciente = :1"
-            cursor.execute(consulta_validacion, (id_paciente,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Paciente id {id_paciente} no existe en la tabla tv_paciente.")
-                return False
-
-            if not datos or len(datos) < 2:
-                print(f"[ERROR]: Sin datos ingresados para paciente id {id_paciente} (se requieren comuna y fecha_primera_visita).")
-                return False
-
-            consulta_update = "UPDATE tv_paciente SET comuna = :1, fecha_primera_visita = :2 WHERE id_paciente = :3"
-            cursor.execute(consulta_update, (datos[0], datos[1], id_paciente))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Paciente id {id_paciente} editado correctamente")
-            return True
-
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_paciente WHERE id_paciente = :1"
+                cursor.execute(consulta_validacion, (id_paciente,))
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Paciente id {id_paciente} no existe en la tabla tv_paciente.")
+                    return False
+
+                if not datos or len(datos) < 2:
+                    print(f"[ERROR]: Sin datos ingresados para paciente id {id_paciente} (se requieren comuna y fecha_primera_visita).")
+                    return False
+
+                cursor.execute(self.CONSULTA_UPDATE, (datos[0], datos[1], id_paciente))
+                self.db.confirmar()
+                print(f"[INFO]: Paciente id {id_paciente} editado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar paciente id {id_paciente} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
 
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = "SELECT id_paciente, comuna, fecha_primera_visita FROM tv_paciente"
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_paciente.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_paciente.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener pacientes desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
     def mostrar_todos_completo(self) -> List[Tuple[Any, ...]]:
 
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = """
-                SELECT
-                    u.id_usuario,
-                    u.nombre_usuario,
-                    u.clave,
-                    u.nombre,
-                    u.apellido,
-                    u.fecha_nacimiento,
-                    u.telefono,
-                    u.email,
-                    u.tipo,
-                    p.comuna,
-                    p.fecha_primera_visita
-                FROM tv_paciente p
-                JOIN tv_usuario u ON p.id_paciente = u.id_usuario
-            """
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para pacientes completos.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_COMPLETO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para pacientes completos.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener pacientes completos desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
+    def mostrar_completo_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_COMPLETO, self.COLUMNA_ID_COMPLETO, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
+
+    def mostrar_completo_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_desde(self.CONSULTA_COMPLETO, self.COLUMNA_ID_COMPLETO, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
+
+    def _consulta_por_id(self) -> Tuple[str, str]:
+        # misma forma de fila que los listados completos (con datos de tv_usuario)
+        return self.CONSULTA_COMPLETO, self.COLUMNA_ID_COMPLETO
+
+    def iterar_completo(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_COMPLETO, tam_lote=tam_lote)
+
+    @invalida_cache
     def eliminar_item(self, id_paciente: int) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_paciente WHERE id_paciente = :1"
-            cursor.execute(consulta_validacion, (id_paciente,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Paciente id {id_paciente} no existe en tv_paciente.")
-                return False
-
-            consulta_delete = "DELETE FROM tv_paciente WHERE id_paciente = :1"
-            cursor.execute(consulta_delete, (id_paciente,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Paciente id {id_paciente} eliminado correctamente")
-            return True
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_paciente WHERE id_paciente = :1"
+                cursor.execute(consulta_validacion, (id_paciente,))
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Paciente id {id_paciente} no existe en tv_paciente.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_paciente,))
+                self.db.confirmar()
+                # sin el rol las sesiones abiertas ya no corresponden
+                if self.autenticacion:
+                    self.autenticacion.revocar_usuario(id_paciente)
+                if self.resumen:
+                    self.resumen.paciente(-1)
+                print(f"[INFO]: Paciente id {id_paciente} eliminado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar paciente id {id_paciente} -> {e}")
             return False
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
 
 class MedicoModel(UsuarioModel):
+    CONSULTA_LISTADO = "SELECT id_medico, especialidad, horario_atencion, fecha_ingreso FROM tv_medico"
+    TABLA = "tv_medico"
+    COLUMNA_ID = "id_medico"
+    CONSULTA_COMPLETO = """
+        SELECT
+            u.id_usuario,
+            u.nombre_usuario,
+            u.clave,
+            u.nombre,
+            u.apellido,
+            u.fecha_nacimiento,
+            u.telefono,
+            u.email,
+            u.tipo,
+            m.especialidad,
+            m.horario_atencion,
+            m.fecha_ingreso
+        FROM tv_medico m
+        JOIN tv_usuario u ON m.id_medico = u.id_usuario
+    """
+    COLUMNA_ID_COMPLETO = "m.id_medico"
+    CONSULTA_MERGE = """
+        MERGE INTO tv_medico t
+        USING (SELECT :1 AS id_medico FROM dual) s
+        ON (t.id_medico = s.id_medico)
+        WHEN NOT MATCHED THEN INSERT (id_medico, especialidad, horario_atencion, fecha_ingreso)
+        VALUES (s.id_medico, :2, :3, :4)
+    """
+    CONSULTA_UPDATE = "UPDATE tv_medico SET especialidad = :1, horario_atencion = :2, fecha_ingreso = :3 WHERE id_medico = :4"
+    CONSULTA_DELETE = "DELETE FROM tv_medico WHERE id_medico = :1"
 
     def __init__(
         self,
@@ -466,186 +559,158 @@ class MedicoModel(UsuarioModel):
             conexion,
         )
         self.id_medico = id_usuario
+        # tabla de referencia: se relee poco y se invalida con cada escritura en
+        # tv_medico o tv_usuario (los listados completos hacen JOIN)
+        self.cache = agrupar_cache(CacheTTL(max_items=64, ttl_seg=300), "tv_medico", "tv_usuario")
 
+    @invalida_cache
     def guardar_item(self, id_medico: int, especialidad: str, horario_atencion: date, fecha_ingreso: date) -> bool:
-        cursor = None
-        try:
-            cursor = self.db.obtener_cursor()
-
-            consulta_usuario = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
-            cursor.execute(consulta_usuario, (id_medico,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: No existe usuario con id {id_medico} en tv_usuario; crear usuario antes de asignar médico.")
-                return False
-
-            consulta_validacion = "SELECT 1 FROM tv_medico WHERE id_medico = :1"
-            cursor.execute(consulta_validacion, (id_medico,))
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un médico con id {id_medico}")
-                return False
-
-            consulta_insert = """
-                INSERT INTO tv_medico (id_medico, especialidad, horario_atencion, fecha_ingreso)
-                VALUES (:1, :2, :3, :4)
-            """
-            cursor.execute(consulta_insert, (id_medico, especialidad, horario_atencion, fecha_ingreso))
-            if self.db.connection:
-                self.db.connection.commit()
+        resultado = self.insertar_si_no_existe(id_medico, especialidad, horario_atencion, fecha_ingreso)
+        if resultado.creado:
             print(f"[INFO]: Médico id {id_medico} guardado correctamente")
-            return True
-
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar médico id {id_medico} -> {e}")
-            return False
-
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar médico id {id_medico} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(
+        self, id_medico: int, especialidad: str, horario_atencion: date, fecha_ingreso: date
+    ) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_medico, especialidad, horario_atencion, fecha_ingreso),
+            id_medico,
+            f"Ya existe un médico con id {id_medico}",
+            f"No existe usuario con id {id_medico} en tv_usuario; crear usuario antes de asignar médico.",
+        )
 
     def crear(self, id_medico: int, especialidad: str, horario_atencion: date, fecha_ingreso: date) -> bool:
         return self.guardar_item(id_medico, especialidad, horario_atencion, fecha_ingreso)
 
+    @invalida_cache
     def editar_item(self, id_medico: int, *datos: tuple) -> bool:
         """
         datos expected: (especialidad, horario_atencion, fecha_ingreso)
         """
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_medico WHERE id_medico = :1"
-            cursor.execute(consulta_validacion, (id_medico,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Médico id {id_medico} no existe en la tabla tv_medico.")
-                return False
-
-            if not datos or len(datos) < 3:
-                print(f"[ERROR]: Sin datos ingresados para médico id {id_medico} (se requieren especialidad, horario_atencion, fecha_ingreso).")
-                return False
-
-            consulta_update = "UPDATE tv_medico SET especialidad = :1, horario_atencion = :2, fecha_ingreso = :3 WHERE id_medico = :4"
-            cursor.execute(consulta_update, (datos[0], datos[1], datos[2], id_medico))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Médico id {id_medico} editado correctamente")
-            return True
-
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_medico WHERE id_medico = :1"
+                cursor.execute(consulta_validacion, (id_medico,))
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Médico id {id_medico} no existe en la tabla tv_medico.")
+                    return False
+
+                if not datos or len(datos) < 3:
+                    print(f"[ERROR]: Sin datos ingresados para médico id {id_medico} (se requieren especialidad, horario_atencion, fecha_ingreso).")
+                    return False
+
+                cursor.execute(self.CONSULTA_UPDATE, (datos[0], datos[1], datos[2], id_medico))
+                self.db.confirmar()
+                print(f"[INFO]: Médico id {id_medico} editado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al editar médico id {id_medico} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
+    @cacheado
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = "SELECT id_medico, especialidad, horario_atencion, fecha_ingreso FROM tv_medico"
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_medico.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_medico.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener médicos desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
+    @cacheado
     def mostrar_todos_completo(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = """
-                SELECT
-                    u.id_usuario,
-                    u.nombre_usuario,
-                    u.clave,
-                    u.nombre,
-                    u.apellido,
-                    u.fecha_nacimiento,
-                    u.telefono,
-                    u.email,
-                    u.tipo,
-                    m.especialidad,
-                    m.horario_atencion,
-                    m.fecha_ingreso
-                FROM tv_medico m
-                JOIN tv_usuario u ON m.id_medico = u.id_usuario
-            """
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para médicos completos.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_COMPLETO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para médicos completos.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener médicos completos desde BD -> {e}")
             return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
+    @cacheado
+    def mostrar_completo_pagina(self, pagina: int = 1, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_pagina(self.CONSULTA_COMPLETO, self.COLUMNA_ID_COMPLETO, pagina, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener página {pagina} desde BD -> {e}")
+            return []
+
+    @cacheado
+    def mostrar_completo_desde(self, ultimo_id: Optional[int] = None, limite: int = 50) -> List[Tuple[Any, ...]]:
+        try:
+            return self.db.listar_desde(self.CONSULTA_COMPLETO, self.COLUMNA_ID_COMPLETO, ultimo_id, limite)
+        except Exception as e:
+            print(f"[ERROR]: Error al obtener registros desde id {ultimo_id} -> {e}")
+            return []
+
+    def _consulta_por_id(self) -> Tuple[str, str]:
+        return self.CONSULTA_COMPLETO, self.COLUMNA_ID_COMPLETO
+
+    def iterar_completo(self, tam_lote: int = 1000) -> Iterator[Tuple[Any, ...]]:
+        return self.db.iterar(self.CONSULTA_COMPLETO, tam_lote=tam_lote)
+
+    @invalida_cache
     def eliminar_item(self, id_medico: int) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_medico WHERE id_medico = :1"
-            cursor.execute(consulta_validacion, (id_medico,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Médico id {id_medico} no existe en tv_medico.")
-                return False
-
-            consulta_delete = "DELETE FROM tv_medico WHERE id_medico = :1"
-            cursor.execute(consulta_delete, (id_medico,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Médico id {id_medico} eliminado correctamente")
-            return True
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_medico WHERE id_medico = :1"
+                cursor.execute(consulta_validacion, (id_medico,))
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Médico id {id_medico} no existe en tv_medico.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_medico,))
+                self.db.confirmar()
+                # sin el rol las sesiones abiertas ya no corresponden
+                if self.autenticacion:
+                    self.autenticacion.revocar_usuario(id_medico)
+                print(f"[INFO]: Médico id {id_medico} eliminado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar médico id {id_medico} -> {e}")
             return False
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
 
 
 class AdministradorModel(UsuarioModel):
+    CONSULTA_LISTADO = """
+        SELECT a.id_administrador,
+               u.nombre_usuario,
+               u.nombre,
+               u.apellido,
+               u.fecha_nacimiento,
+               u.telefono,
+               u.email,
+               u.tipo
+        FROM tv_administrador a
+        JOIN tv_usuario u ON a.id_administrador = u.id_usuario
+    """
+    COLUMNA_ID = "a.id_administrador"
+    TABLA = "tv_administrador"
+    CONSULTA_MERGE = """
+        MERGE INTO tv_administrador t
+        USING (SELECT :1 AS id_administrador FROM dual) s
+        ON (t.id_administrador = s.id_administrador)
+        WHEN NOT MATCHED THEN INSERT (id_administrador) VALUES (s.id_administrador)
+    """
+    CONSULTA_DELETE = "DELETE FROM tv_administrador WHERE id_administrador = :1"
 
     def __init__(
         self,
@@ -673,113 +738,65 @@ class AdministradorModel(UsuarioModel):
             conexion,
         )
         self.id_administrador = id_usuario
+        self.cache = agrupar_cache(CacheTTL(max_items=64, ttl_seg=300), "tv_administrador", "tv_usuario")
 
+    @invalida_cache
     def guardar_item(self, id_administrador: Optional[int] = None) -> bool:
-        cursor = None
         id_admin = id_administrador if id_administrador is not None else self.id_administrador
-        try:
-            cursor = self.db.obtener_cursor()
-
-            consulta_usuario = "SELECT 1 FROM tv_usuario WHERE id_usuario = :1"
-            cursor.execute(consulta_usuario, (id_admin,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: No existe usuario con id {id_admin} en tv_usuario; crear usuario antes de asignar administrador.")
-                return False
-
-            consulta_validacion = "SELECT 1 FROM tv_administrador WHERE id_administrador = :1"
-            cursor.execute(consulta_validacion, (id_admin,))
-            if cursor.fetchone():
-                print(f"[ERROR]: Ya existe un administrador con id {id_admin}")
-                return False
-
-            consulta_insert = "INSERT INTO tv_administrador (id_administrador) VALUES (:1)"
-            cursor.execute(consulta_insert, (id_admin,))
-            if self.db.connection:
-                self.db.connection.commit()
+        resultado = self.insertar_si_no_existe(id_admin)
+        if resultado.creado:
             print(f"[INFO]: Administrador id {id_admin} guardado correctamente")
-            return True
-
-        except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
-            print(f"[ERROR]: Error al guardar administrador id {id_admin} -> {e}")
-            return False
-
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
+        elif resultado.estado == DUPLICADO:
+            print(f"[ERROR]: {resultado.mensaje}")
+        else:
+            print(f"[ERROR]: Error al guardar administrador id {id_admin} -> {resultado.mensaje}")
+        return resultado.creado
+
+    def insertar_si_no_existe(self, id_administrador: int) -> ResultadoGuardado:
+        return self.db.insertar_si_no_existe(
+            self.CONSULTA_MERGE,
+            (id_administrador,),
+            id_administrador,
+            f"Ya existe un administrador con id {id_administrador}",
+            f"No existe usuario con id {id_administrador} en tv_usuario; crear usuario antes de asignar administrador.",
+        )
 
     def crear(self, id_administrador: Optional[int] = None) -> bool:
         return self.guardar_item(id_administrador)
 
+    @invalida_cache
     def eliminar_item(self, id_administrador: int) -> bool:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta_validacion = "SELECT 1 FROM tv_administrador WHERE id_administrador = :1"
-            cursor.execute(consulta_validacion, (id_administrador,))
-            if cursor.fetchone() is None:
-                print(f"[ERROR]: Administrador id {id_administrador} no existe en tv_administrador.")
-                return False
-
-            consulta_delete = "DELETE FROM tv_administrador WHERE id_administrador = :1"
-            cursor.execute(consulta_delete, (id_administrador,))
-            if self.db.connection:
-                self.db.connection.commit()
-            print(f"[INFO]: Administrador id {id_administrador} eliminado correctamente")
-            return True
-
+            with self.db.cursor() as cursor:
+                consulta_validacion = "SELECT 1 FROM tv_administrador WHERE id_administrador = :1"
+                cursor.execute(consulta_validacion, (id_administrador,))
+                if cursor.fetchone() is None:
+                    print(f"[ERROR]: Administrador id {id_administrador} no existe en tv_administrador.")
+                    return False
+
+                cursor.execute(self.CONSULTA_DELETE, (id_administrador,))
+                self.db.confirmar()
+                # sin el rol las sesiones abiertas ya no corresponden
+                if self.autenticacion:
+                    self.autenticacion.revocar_usuario(id_administrador)
+                print(f"[INFO]: Administrador id {id_administrador} eliminado correctamente")
+                return True
         except Exception as e:
-            if self.db.connection:
-                try:
-                    self.db.connection.rollback()
-                except Exception:
-                    pass
             print(f"[ERROR]: Error al eliminar administrador id {id_administrador} -> {e}")
             return False
 
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
-
+    @cacheado
     def mostrar_items(self) -> List[Tuple[Any, ...]]:
-        cursor = None
         try:
-            cursor = self.db.obtener_cursor()
-            consulta = """
-                SELECT a.id_administrador,
-                       u.nombre_usuario,
-                       u.nombre,
-                       u.apellido,
-                       u.fecha_nacimiento,
-                       u.telefono,
-                       u.email,
-                       u.tipo
-                FROM tv_administrador a
-                JOIN tv_usuario u ON a.id_administrador = u.id_usuario
-            """
-            cursor.execute(consulta)
-            datos = cursor.fetchall()
-            if datos:
-                return datos
-            else:
-                print("[INFO]: Sin datos encontrados para tv_administrador.")
-                return []
+            with self.db.cursor() as cursor:
+                consulta = self.CONSULTA_LISTADO
+                cursor.execute(consulta)
+                datos = cursor.fetchall()
+                if datos:
+                    return datos
+                else:
+                    print("[INFO]: Sin datos encontrados para tv_administrador.")
+                    return []
         except Exception as e:
             print(f"[ERROR]: Error al obtener administradores desde BD -> {e}")
-            return []
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except Exception:
-                    pass
\ No newline at end of file
+            return []
\ No newline at end of file
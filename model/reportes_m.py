@@ -0,0 +1,121 @@
+import time
+from config.db_config import conexion_oracle
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Tuple, Any, Dict, Sequence
+from utils.cache import CacheTTL, agrupar_cache
+
+
+# dimensiones por las que se puede agrupar; x es la tabla de hechos (consultas o recetas)
+DIMENSIONES = {
+    "medico": "x.id_medico",
+    "mes": "TRUNC(x.fecha, 'MM')",
+    "comuna": "p.comuna",
+}
+
+
+class ReportesModel:
+    """
+    Totales de tv_consultas.valor y tv_recetas.costo_clp calculados en Oracle
+    (GROUP BY ROLLUP): sólo viajan las filas agregadas, con subtotales y total.
+    Cada fila es (dimensiones..., cantidad, total, nivel); nivel 0 es una fila
+    de detalle y nivel > 0 un subtotal (nivel = 2**n - 1 es el total general).
+    El bit n - 1 - i de nivel marca la dimensión i como totalizada: un NULL en
+    una fila de detalle es un dato faltante (ej. consulta sin paciente).
+    """
+
+    FUENTE_CONSULTAS = """
+        FROM tv_consultas x
+        LEFT JOIN tv_paciente p ON p.id_paciente = x.id_paciente
+    """
+    # tv_recetas no tiene fecha: el mes es el de la primera consulta que la emitió
+    FUENTE_RECETAS = """
+        FROM (
+            SELECT r.id_paciente, r.id_medico, r.costo_clp AS valor, c.fecha
+            FROM tv_recetas r
+            LEFT JOIN (
+                SELECT id_receta, MIN(fecha) AS fecha FROM tv_consultas
+                WHERE id_receta IS NOT NULL GROUP BY id_receta
+            ) c ON c.id_receta = r.id_receta
+        ) x
+        LEFT JOIN tv_paciente p ON p.id_paciente = x.id_paciente
+    """
+
+    def __init__(self, conexion: conexion_oracle, segundos_bucket: int = 300):
+        self.db = conexion
+        # los periodos abiertos se recalculan al cambiar de bucket; los cerrados
+        # (que terminan antes del mes actual) quedan en cache hasta el ttl o
+        # hasta que se escriba en alguna de las tablas que lee el reporte
+        self.segundos_bucket = max(1, int(segundos_bucket))
+        self.cache = agrupar_cache(
+            CacheTTL(max_items=128, ttl_seg=86400), "tv_consultas", "tv_recetas", "tv_paciente"
+        )
+
+    def ingresos_consultas(
+        self, dimensiones: Sequence[str], desde: Optional[date] = None, hasta: Optional[date] = None
+    ) -> List[Tuple[Any, ...]]:
+        return self._reporte("consultas", self.FUENTE_CONSULTAS, dimensiones, desde, hasta)
+
+    def ingresos_recetas(
+        self, dimensiones: Sequence[str], desde: Optional[date] = None, hasta: Optional[date] = None
+    ) -> List[Tuple[Any, ...]]:
+        return self._reporte("recetas", self.FUENTE_RECETAS, dimensiones, desde, hasta)
+
+    def invalidar(self) -> None:
+        self.cache.invalidar()
+
+    def _reporte(
+        self, nombre: str, fuente: str, dimensiones: Sequence[str], desde: Optional[date], hasta: Optional[date]
+    ) -> List[Tuple[Any, ...]]:
+        dimensiones = tuple(dimensiones)
+        if not dimensiones or any(d not in DIMENSIONES for d in dimensiones) or len(set(dimensiones)) != len(dimensiones):
+            print(f"[ERROR]: Dimensiones inválidas {dimensiones}; use {', '.join(DIMENSIONES)}")
+            return []
+
+        clave = (nombre, dimensiones, desde, hasta, self._bucket(hasta))
+        try:
+            return self.cache.obtener(clave, lambda: self._consultar(fuente, dimensiones, desde, hasta))
+        except Exception as e:
+            print(f"[ERROR]: Error al calcular reporte de {nombre} -> {e}")
+            return []
+
+    def _bucket(self, hasta: Optional[date]) -> int:
+        inicio_mes = date.today().replace(day=1)
+        if hasta is not None and _como_fecha(hasta) < inicio_mes:
+            return 0
+        return int(time.time() // self.segundos_bucket)
+
+    def _consultar(
+        self, fuente: str, dimensiones: Tuple[str, ...], desde: Optional[date], hasta: Optional[date]
+    ) -> List[Tuple[Any, ...]]:
+        columnas = [DIMENSIONES[d] for d in dimensiones]
+        filtros: List[str] = []
+        parametros: Dict[str, Any] = {}
+        # rango semiabierto sobre la fecha sin funciones: usa ix_consultas_fecha
+        if desde is not None:
+            filtros.append("x.fecha >= :desde")
+            parametros["desde"] = _como_datetime(desde)
+        if hasta is not None:
+            filtros.append("x.fecha < :hasta")
+            parametros["hasta"] = _como_datetime(hasta) + timedelta(days=1)
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+        sql = f"""
+            SELECT {", ".join(columnas)}, COUNT(*), NVL(SUM(x.valor), 0),
+                   GROUPING_ID({", ".join(columnas)})
+            {fuente}
+            {where}
+            GROUP BY ROLLUP({", ".join(columnas)})
+            ORDER BY {", ".join(f"GROUPING({c}), {c} NULLS LAST" for c in columnas)}
+        """
+        with self.db.cursor() as cursor:
+            cursor.arraysize = 500
+            cursor.execute(sql, parametros)
+            return cursor.fetchall()
+
+
+def _como_fecha(valor: date) -> date:
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _como_datetime(valor: date) -> datetime:
+    return datetime.combine(_como_fecha(valor), datetime.min.time())
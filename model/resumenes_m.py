@@ -0,0 +1,207 @@
+import threading
+import time
+from config.db_config import conexion_oracle
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Any, Dict, Callable, Set
+
+
+# un insumo cuenta como "stock bajo" cuando stock < su stock_minimo; éste es el
+# valor por defecto de la columna, el que tiene un insumo recién creado
+STOCK_MINIMO_DEFECTO = 10
+
+
+class _Contador:
+    def __init__(self, valor: Any):
+        self.valor = valor
+        self.cargado_en = time.monotonic()
+
+
+class ResumenDashboard:
+    """
+    Contadores del panel mantenidos en memoria: pacientes, agendas por estado,
+    insumos con stock bajo e ingresos por día. Los modelos informan cada
+    escritura (deltas aplicados sólo tras el commit) y cada contador se
+    reconcilia con un SELECT agregado cuando pasan `reconciliar_seg`, o antes
+    si un cambio no se pudo traducir a delta (marcar_sucio). Leer el panel no
+    recorre las tablas salvo en esa reconciliación.
+    """
+
+    CONSULTA_PACIENTES = "SELECT COUNT(*) FROM tv_paciente"
+    CONSULTA_AGENDA = "SELECT lower(trim(estado)), COUNT(*) FROM tv_agenda GROUP BY lower(trim(estado))"
+    # todos los insumos: el mínimo de cada uno se guarda para traducir los deltas de stock
+    CONSULTA_STOCK_BAJO = "SELECT id_insumo, stock, stock_minimo FROM tv_insumos"
+    CONSULTA_INGRESOS = """
+        SELECT TRUNC(fecha), SUM(valor) FROM tv_consultas
+        WHERE fecha >= :1
+        GROUP BY TRUNC(fecha)
+    """
+
+    def __init__(
+        self,
+        conexion: conexion_oracle,
+        dias_ingresos: int = 31,
+        reconciliar_seg: float = 600.0,
+    ):
+        self.db = conexion
+        self.dias_ingresos = max(1, int(dias_ingresos))
+        self.reconciliar_seg = float(reconciliar_seg)
+        self._contadores: Dict[str, _Contador] = {}
+        # stock_minimo por insumo, leído junto con el contador stock_bajo
+        self._minimos: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._cargas: Dict[str, Callable[[], Any]] = {
+            "pacientes": self._cargar_pacientes,
+            "agenda": self._cargar_agenda,
+            "stock_bajo": self._cargar_stock_bajo,
+            "ingresos": self._cargar_ingresos,
+        }
+
+    # --- deltas informados por los modelos ---
+
+    def paciente(self, delta: int) -> None:
+        self._aplicar("pacientes", lambda c: c.valor + delta)
+
+    def agenda(self, estado_anterior: Optional[str], estado_nuevo: Optional[str]) -> None:
+        def cambiar(c: _Contador) -> Dict[str, int]:
+            por_estado = c.valor
+            if estado_anterior is not None:
+                clave = _estado(estado_anterior)
+                por_estado[clave] = por_estado.get(clave, 0) - 1
+                if por_estado[clave] <= 0:
+                    del por_estado[clave]
+            if estado_nuevo is not None:
+                clave = _estado(estado_nuevo)
+                por_estado[clave] = por_estado.get(clave, 0) + 1
+            return por_estado
+
+        self._aplicar("agenda", cambiar)
+
+    def stock(self, id_insumo: int, stock: Optional[float]) -> None:
+        # stock None: el insumo se eliminó
+        def cambiar(c: _Contador) -> Set[int]:
+            if stock is None:
+                self._minimos.pop(id_insumo, None)
+                c.valor.discard(id_insumo)
+            elif stock < self._minimos.setdefault(id_insumo, STOCK_MINIMO_DEFECTO):
+                c.valor.add(id_insumo)
+            else:
+                c.valor.discard(id_insumo)
+            return c.valor
+
+        self._aplicar("stock_bajo", cambiar)
+
+    def stock_minimo(self, id_insumo: int, stock_minimo: int) -> None:
+        # sin el stock a mano no se sabe de qué lado del nuevo mínimo quedó: se relee
+        self.marcar_sucio("stock_bajo")
+
+    def ingreso(self, fecha: Optional[date], valor: Optional[float]) -> None:
+        # valor negativo para descontar (edición o eliminación de una consulta)
+        if fecha is None or not valor:
+            return
+        dia = _dia(fecha)
+
+        def cambiar(c: _Contador) -> Dict[date, float]:
+            if dia >= self._inicio_ventana():
+                c.valor[dia] = c.valor.get(dia, 0) + valor
+            return c.valor
+
+        self._aplicar("ingresos", cambiar)
+
+    def marcar_sucio(self, nombre: str) -> None:
+        # el contador se recalcula en la próxima lectura
+        def olvidar() -> None:
+            with self._lock:
+                self._contadores.pop(nombre, None)
+
+        self.db.despues_de_confirmar(olvidar)
+
+    def _aplicar(self, nombre: str, cambiar: Callable[[_Contador], Any]) -> None:
+        def aplicar() -> None:
+            with self._lock:
+                contador = self._contadores.get(nombre)
+                # sin cargar todavía: la primera lectura ya verá la escritura
+                if contador is not None:
+                    contador.valor = cambiar(contador)
+
+        self.db.despues_de_confirmar(aplicar)
+
+    # --- lecturas del panel ---
+
+    def pacientes(self) -> int:
+        return self._leer("pacientes")
+
+    def agenda_por_estado(self) -> Dict[str, int]:
+        return dict(self._leer("agenda"))
+
+    def insumos_stock_bajo(self) -> List[int]:
+        return sorted(self._leer("stock_bajo"))
+
+    def ingresos_del_dia(self, dia: Optional[date] = None) -> float:
+        dia = _dia(dia or date.today())
+        if dia < self._inicio_ventana():
+            print(f"[ERROR]: El panel sólo guarda los ingresos de los últimos {self.dias_ingresos} días")
+            return 0
+        return self._leer("ingresos").get(dia, 0)
+
+    def resumen(self) -> Dict[str, Any]:
+        stock_bajo = self.insumos_stock_bajo()
+        return {
+            "pacientes": self.pacientes(),
+            "agenda_por_estado": self.agenda_por_estado(),
+            "insumos_stock_bajo": len(stock_bajo),
+            "ids_stock_bajo": stock_bajo,
+            "ingresos_hoy": self.ingresos_del_dia(),
+        }
+
+    def reconciliar(self, nombre: Optional[str] = None) -> None:
+        for clave in [nombre] if nombre else list(self._cargas):
+            valor = self._cargas[clave]()
+            with self._lock:
+                self._contadores[clave] = _Contador(valor)
+
+    def _leer(self, nombre: str) -> Any:
+        with self._lock:
+            contador = self._contadores.get(nombre)
+            vigente = contador is not None and time.monotonic() - contador.cargado_en < self.reconciliar_seg
+            if vigente:
+                return contador.valor
+        self.reconciliar(nombre)
+        with self._lock:
+            return self._contadores[nombre].valor
+
+    # --- reconciliación contra las tablas ---
+
+    def _cargar_pacientes(self) -> int:
+        with self.db.cursor() as cursor:
+            cursor.execute(self.CONSULTA_PACIENTES)
+            return cursor.fetchone()[0]
+
+    def _cargar_agenda(self) -> Dict[str, int]:
+        with self.db.cursor() as cursor:
+            cursor.execute(self.CONSULTA_AGENDA)
+            return {_estado(estado): cantidad for estado, cantidad in cursor.fetchall()}
+
+    def _cargar_stock_bajo(self) -> Set[int]:
+        with self.db.cursor() as cursor:
+            cursor.arraysize = 500
+            cursor.execute(self.CONSULTA_STOCK_BAJO)
+            filas = cursor.fetchall()
+        with self._lock:
+            self._minimos = {id_insumo: minimo for id_insumo, _, minimo in filas}
+        return {id_insumo for id_insumo, stock, minimo in filas if stock < minimo}
+
+    def _cargar_ingresos(self) -> Dict[date, float]:
+        with self.db.cursor() as cursor:
+            cursor.execute(self.CONSULTA_INGRESOS, (datetime.combine(self._inicio_ventana(), datetime.min.time()),))
+            return {_dia(dia): total for dia, total in cursor.fetchall()}
+
+    def _inicio_ventana(self) -> date:
+        return date.today() - timedelta(days=self.dias_ingresos - 1)
+
+
+def _estado(estado: Any) -> str:
+    return str(estado or "").strip().lower()
+
+
+def _dia(valor: date) -> date:
+    return valor.date() if isinstance(valor, datetime) else valor
@@ -0,0 +1,167 @@
+import functools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class CacheTTL:
+    # LRU acotado a max_items; cada entrada además vence a los ttl_seg
+    def __init__(self, max_items: int = 64, ttl_seg: float = 300.0):
+        self.max_items = max(1, int(max_items))
+        self.ttl_seg = float(ttl_seg)
+        self._datos: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def obtener(self, clave: Hashable, cargar: Callable[[], Any]) -> Any:
+        valor = self.buscar(clave)
+        if valor is not None:
+            return valor
+
+        valor = cargar()
+        # las listas vacías no se guardan: los modelos también devuelven [] ante un error
+        if valor:
+            self.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl_seg, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def buscar(self, clave: Hashable) -> Any:
+        # None si no está o ya venció (nunca se guardan valores vacíos)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            self.fallos += 1
+            return None
+
+    def quitar(self, clave: Hashable) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "entradas": len(self._datos),
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            }
+
+
+def cacheado(metodo: Callable) -> Callable:
+    # lectura a través de self.cache; sin cache el método se ejecuta tal cual
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        cache = getattr(self, "cache", None)
+        if cache is None:
+            return metodo(self, *args, **kwargs)
+        clave = (metodo.__name__, args, tuple(sorted(kwargs.items())))
+        return cache.obtener(clave, lambda: metodo(self, *args, **kwargs))
+
+    return envoltura
+
+
+# caches agrupadas por tabla: una escritura en la tabla vacía todas las caches
+# que la leen, aunque sean de otro modelo (ej. los listados de médicos hacen
+# JOIN con tv_usuario y UsuarioModel.editar_item debe invalidarlos)
+_grupos: Dict[str, "weakref.WeakSet[CacheTTL]"] = {}
+_grupos_lock = threading.Lock()
+
+
+def agrupar_cache(cache: CacheTTL, *tablas: str) -> CacheTTL:
+    with _grupos_lock:
+        for tabla in tablas:
+            _grupos.setdefault(tabla, weakref.WeakSet()).add(cache)
+    return cache
+
+
+def caches_de(*tablas: Optional[str]) -> Set[CacheTTL]:
+    with _grupos_lock:
+        return {cache for tabla in tablas if tabla in _grupos for cache in _grupos[tabla]}
+
+
+def invalida_cache(metodo: Callable) -> Callable:
+    # vacía self.cache y las caches agrupadas bajo self.TABLA
+    return _invalidando(metodo, None)
+
+
+def invalida_tablas(*tablas: str) -> Callable[[Callable], Callable]:
+    # para métodos heredados que escriben una tabla distinta de self.TABLA
+    def decorador(metodo: Callable) -> Callable:
+        return _invalidando(metodo, tablas)
+
+    return decorador
+
+
+def _invalidando(metodo: Callable, tablas: Optional[Tuple[str, ...]]) -> Callable:
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        try:
+            return metodo(self, *args, **kwargs)
+        finally:
+            caches = caches_de(*(tablas if tablas is not None else (getattr(self, "TABLA", None),)))
+            propia = getattr(self, "cache", None)
+            if propia is not None:
+                caches.add(propia)
+            if caches:
+                _invalidar_al_confirmar(getattr(self, "db", None), caches)
+
+    return envoltura
+
+
+def _invalidar_al_confirmar(db: Any, caches: Set[CacheTTL]) -> None:
+    # dentro de una transacción se vacía tras el commit: antes, otra lectura
+    # podría volver a guardar las filas viejas; si se deshace no hay nada que vaciar
+    def invalidar() -> None:
+        for cache in caches:
+            cache.invalidar()
+
+    if db is None:
+        invalidar()
+    else:
+        db.despues_de_confirmar(invalidar)
+
+
+class MapaIdentidad:
+    # filas leídas por clave primaria durante una operación (un hilo, sin lock);
+    # None recuerda que el id no existe para no volver a preguntarlo.
+    # El espacio separa filas de distinta forma: obtener_por_ids usa
+    # (consulta, columna_id), así dos SELECT sobre la misma tabla no se mezclan
+    def __init__(self):
+        self._filas: Dict[Tuple[Hashable, Hashable], Any] = {}
+
+    def buscar(self, espacio: Hashable, ids: Iterable[Hashable]) -> Tuple[Dict[Hashable, Any], List[Hashable]]:
+        encontrados: Dict[Hashable, Any] = {}
+        faltantes: List[Hashable] = []
+        for id_item in ids:
+            clave = (espacio, id_item)
+            if clave in self._filas:
+                encontrados[id_item] = self._filas[clave]
+            else:
+                faltantes.append(id_item)
+        return encontrados, faltantes
+
+    def guardar(self, espacio: Hashable, id_item: Hashable, fila: Any) -> None:
+        self._filas[(espacio, id_item)] = fila
+
+    def olvidar(self) -> None:
+        self._filas.clear()
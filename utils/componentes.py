@@ -0,0 +1,69 @@
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Tuple
+
+
+class RegistroComponentes:
+    """
+    Clases y funciones de la aplicación resueltas en el primer uso desde una
+    única ruta explícita "paquete.modulo:Nombre". Importar main ya no carga
+    oracledb, bcrypt ni los modelos: cada módulo se importa cuando un menú lo
+    necesita, y un error de importación se informa tal cual en vez de
+    probar otros nombres. Cada importación se cronometra (tiempo acumulado,
+    con sus dependencias, como `python -X importtime`) para reporte().
+    """
+
+    def __init__(self, rutas: Mapping[str, str]):
+        self._rutas: Dict[str, Tuple[str, str]] = {}
+        for nombre, ruta in rutas.items():
+            modulo, _, atributo = ruta.partition(":")
+            self._rutas[nombre] = (modulo, atributo or nombre)
+        self._resueltos: Dict[str, Any] = {}
+        self._tiempos: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def __getattr__(self, nombre: str) -> Any:
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return self.obtener(nombre)
+
+    def obtener(self, nombre: str) -> Any:
+        try:
+            return self._resueltos[nombre]
+        except KeyError:
+            pass
+
+        if nombre not in self._rutas:
+            raise AttributeError(f"Componente no registrado: {nombre}")
+        modulo, atributo = self._rutas[nombre]
+        with self._lock:
+            valor = getattr(self.importar(modulo), atributo)
+            self._resueltos[nombre] = valor
+        return valor
+
+    def importar(self, modulo: str) -> Any:
+        # también para dependencias pesadas que no son componentes (ej. oracledb)
+        with self._lock:
+            cargado = sys.modules.get(modulo)
+            if cargado is not None:
+                return cargado
+            inicio = time.perf_counter()
+            cargado = importlib.import_module(modulo)
+            self._tiempos[modulo] = (time.perf_counter() - inicio) * 1000
+            return cargado
+
+    def cargados(self) -> List[str]:
+        return sorted(self._resueltos)
+
+    def reporte(self) -> List[Tuple[str, float]]:
+        # ms por módulo, de mayor a menor; el primero en importar una
+        # dependencia compartida se lleva su costo
+        filas = sorted(self._tiempos.items(), key=lambda t: t[1], reverse=True)
+        for modulo, ms in filas:
+            print(f"[INFO]: importación {ms:8.1f} ms | {modulo}")
+        pendientes = sorted(set(self._rutas) - set(self._resueltos))
+        if pendientes:
+            print(f"[INFO]: sin cargar: {', '.join(pendientes)}")
+        return filas
@@ -0,0 +1,224 @@
+import re
+from datetime import date
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+SUS_KEYS = [
+    r";", r"--", r"/\*", r"\bOR\b", r"\bAND\b", r"\bUNION\b",
+    r"\bSELECT\b", r"\bINSERT\b", r"\bUPDATE\b", r"\bDELETE\b",
+    r"\bDROP\b", r"\bEXEC\b"
+]
+patron = re.compile("|".join(SUS_KEYS), re.IGNORECASE)
+
+_PALABRA = re.compile(r"\w+")
+
+
+def _separar_claves(claves: Sequence[str]) -> Optional[Tuple[frozenset, Tuple[str, ...]]]:
+    # r"\bOR\b" -> palabra "OR"; r"/\*" -> literal "/*". Si alguna clave es
+    # otra cosa no hay atajo y se usa patron tal cual
+    palabras, literales = set(), []
+    for clave in claves:
+        palabra = re.fullmatch(r"\\b(\w+)\\b", clave)
+        if palabra:
+            palabras.add(palabra.group(1).upper())
+        elif re.fullmatch(r"(?:[^\\.^$*+?{}\[\]|()]|\\\W)+", clave):
+            literales.append(re.sub(r"\\(\W)", r"\1", clave))
+        else:
+            return None
+    return frozenset(palabras), tuple(literales)
+
+
+_CLAVES = _separar_claves(SUS_KEYS)
+
+
+def contiene_sql(texto: str) -> bool:
+    # equivale a patron.search(texto), pero buscar literales con `in` y cruzar
+    # las palabras con un set es varias veces más rápido que la alternancia
+    # de \b...\b del regex sobre textos largos
+    if _CLAVES is None:
+        return patron.search(texto) is not None
+    palabras, literales = _CLAVES
+    if any(literal in texto for literal in literales):
+        return True
+    return not palabras.isdisjoint(_PALABRA.findall(texto.upper()))
+
+
+MENSAJE_SQL = "No se puede ingresar código SQL en los string."
+
+# tipos de campo
+ENTERO = "entero"
+DECIMAL = "decimal"
+TEXTO = "texto"
+FECHA = "fecha"
+VALOR = "valor"
+
+_CONVERSIONES = {ENTERO: int, DECIMAL: float}
+
+Resultado = Tuple[Optional[Tuple[Any, ...]], str]
+
+
+class Campo(NamedTuple):
+    nombre: str
+    tipo: str
+    opcional: bool = False  # acepta None
+    minimo: Optional[float] = None  # ENTERO/DECIMAL
+    vacio: bool = False  # TEXTO: acepta "" (sólo espacios)
+    sql: bool = False  # se revisa contra SUS_KEYS antes de convertir
+    error: str = ""
+
+
+class Esquema:
+    """
+    Validación declarativa de una fila de entrada. Los campos se compilan una
+    sola vez en tres pasos que se aplican en orden: búsqueda de SQL (SUS_KEYS),
+    conversión de números y reglas por campo; los TEXTO se devuelven sin
+    espacios en los extremos. validar() revisa una fila y validar_lote()
+    revisa miles por columnas: una búsqueda de SQL por columna en vez de una
+    por valor, conversiones con map y reglas con all(); sólo las columnas
+    que fallan se recorren fila a fila para ubicar el error.
+    """
+
+    def __init__(self, campos: Sequence[Campo], conversion: str = "", sql: str = MENSAJE_SQL, faltante: str = ""):
+        self.campos = tuple(campos)
+        self.mensaje_conversion = conversion or "Datos con formato inválido."
+        self.mensaje_sql = sql
+        self.mensaje_faltante = faltante
+        self._compilar()
+
+    def requerido(self, *nombres: str) -> "Esquema":
+        # mismo esquema, pero los campos indicados ya no aceptan None (ej. id al editar)
+        campos = [c._replace(opcional=False) if c.nombre in nombres else c for c in self.campos]
+        return Esquema(campos, self.mensaje_conversion, self.mensaje_sql, self.mensaje_faltante)
+
+    def _compilar(self) -> None:
+        self._largo = len(self.campos)
+        self._sql = [i for i, c in enumerate(self.campos) if c.sql]
+        self._conversiones = [
+            (i, _CONVERSIONES[c.tipo], c.opcional) for i, c in enumerate(self.campos) if c.tipo in _CONVERSIONES
+        ]
+        self._reglas: List[Tuple[int, Callable[[Any], bool], str]] = []
+        for i, c in enumerate(self.campos):
+            regla = self._regla(c)
+            if regla is not None:
+                mensaje = c.error or self.mensaje_faltante or f"{c.nombre} inválido"
+                self._reglas.append((i, regla, mensaje))
+        self._textos = [i for i, c in enumerate(self.campos) if c.tipo == TEXTO]
+
+    @staticmethod
+    def _regla(campo: Campo) -> Optional[Callable[[Any], bool]]:
+        if campo.tipo in _CONVERSIONES:
+            if campo.minimo is None:
+                return None
+            minimo = campo.minimo
+            base = lambda v: v >= minimo
+        elif campo.tipo == FECHA:
+            base = lambda v: isinstance(v, date)
+        elif campo.tipo == TEXTO:
+            if campo.vacio:
+                base = lambda v: isinstance(v, str)
+            else:
+                base = lambda v: isinstance(v, str) and bool(v.strip())
+        elif campo.tipo == VALOR:
+            base = bool
+        else:
+            raise ValueError(f"Tipo de campo desconocido: {campo.tipo}")
+
+        if campo.opcional:
+            return lambda v: v is None or base(v)
+        return base
+
+    def _error_largo(self) -> str:
+        return f"Se requieren {self._largo} campos"
+
+    def validar(self, valores: Sequence[Any]) -> Resultado:
+        if len(valores) != self._largo:
+            return None, self._error_largo()
+
+        for i in self._sql:
+            if contiene_sql(str(valores[i])):
+                return None, self.mensaje_sql
+
+        fila = list(valores)
+        try:
+            for i, convertir, opcional in self._conversiones:
+                if fila[i] is not None or not opcional:
+                    fila[i] = convertir(fila[i])
+        except (ValueError, TypeError):
+            return None, self.mensaje_conversion
+
+        for i, regla, mensaje in self._reglas:
+            if not regla(fila[i]):
+                return None, mensaje
+
+        for i in self._textos:
+            if fila[i] is not None:
+                fila[i] = fila[i].strip()
+        return tuple(fila), ""
+
+    def validar_lote(self, filas: Iterable[Sequence[Any]]) -> List[Resultado]:
+        # un (fila, error) por cada fila recibida, en el mismo orden y con el
+        # mismo primer error que daría validar() sobre esa fila
+        filas = [_tupla(f) for f in filas]
+        resultados: List[Resultado] = [(None, self._error_largo())] * len(filas)
+        posiciones = [p for p, f in enumerate(filas) if len(f) == self._largo]
+        if not posiciones:
+            return resultados
+
+        columnas = [list(c) for c in zip(*(filas[p] for p in posiciones))]
+        errores = [""] * len(posiciones)
+
+        # "\n" no es parte de ninguna clave ni de una palabra: una coincidencia
+        # en la columna unida está dentro de un valor
+        for i in self._sql:
+            columna = columnas[i]
+            if contiene_sql("\n".join(map(str, columna))):
+                for k, valor in enumerate(columna):
+                    if not errores[k] and contiene_sql(str(valor)):
+                        errores[k] = self.mensaje_sql
+
+        for i, convertir, opcional in self._conversiones:
+            columna = columnas[i]
+            try:
+                if opcional:
+                    columnas[i] = [None if v is None else convertir(v) for v in columna]
+                else:
+                    columnas[i] = list(map(convertir, columna))
+                continue
+            except (ValueError, TypeError):
+                pass
+            convertida = list(columna)
+            for k, valor in enumerate(columna):
+                if errores[k] or (opcional and valor is None):
+                    continue
+                try:
+                    convertida[k] = convertir(valor)
+                except (ValueError, TypeError):
+                    errores[k] = self.mensaje_conversion
+            columnas[i] = convertida
+
+        for i, regla, mensaje in self._reglas:
+            columna = columnas[i]
+            try:
+                if all(map(regla, columna)):
+                    continue
+            except TypeError:
+                # una fila ya descartada quedó sin convertir
+                pass
+            for k, valor in enumerate(columna):
+                if not errores[k] and not regla(valor):
+                    errores[k] = mensaje
+
+        for i in self._textos:
+            columnas[i] = [v.strip() if isinstance(v, str) else v for v in columnas[i]]
+
+        for k, (p, fila) in enumerate(zip(posiciones, zip(*columnas))):
+            resultados[p] = (None, errores[k]) if errores[k] else (fila, "")
+        return resultados
+
+
+def _tupla(fila: Any) -> Tuple[Any, ...]:
+    # una fila que no es secuencia cuenta como fila sin campos
+    try:
+        return tuple(fila)
+    except TypeError:
+        return ()
@@ -0,0 +1,143 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import bcrypt
+
+
+# piso de seguridad y techo de latencia para el costo de bcrypt
+RONDAS_MIN = 12
+RONDAS_MAX = 16
+
+
+class Verificacion(NamedTuple):
+    ok: bool
+    # el hash guardado usa menos rondas que la política actual
+    rehash: bool = False
+
+
+def rondas_de(clave_hash: str) -> Optional[int]:
+    # "$2b$12$<salt+hash>" -> 12
+    partes = clave_hash.split("$")
+    if len(partes) < 4 or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+def calibrar_rondas(objetivo_ms: float = 250.0, minimo: int = RONDAS_MIN, maximo: int = RONDAS_MAX) -> int:
+    # cada ronda extra duplica el trabajo: basta medir una vez con el costo
+    # mínimo y sumar tantas rondas como duplicaciones quepan en el objetivo
+    clave = b"calibracion"
+    bcrypt.hashpw(clave, bcrypt.gensalt(rounds=4))
+    inicio = time.perf_counter()
+    bcrypt.hashpw(clave, bcrypt.gensalt(rounds=minimo))
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    rondas = minimo
+    while rondas < maximo and duracion_ms * 2 <= objetivo_ms:
+        duracion_ms *= 2
+        rondas += 1
+    return rondas
+
+
+class ServicioHash:
+    # bcrypt suelta el GIL mientras calcula, así que un pool de hilos
+    # escala con los núcleos sin pagar el costo de procesos.
+    # rondas None: se calibran para objetivo_ms al crear el servicio, durante el
+    # arranque, y no en el primer login. Nunca por debajo de RONDAS_MIN
+    def __init__(self, rondas: Optional[int] = 12, max_workers: Optional[int] = None, objetivo_ms: float = 250.0):
+        self.objetivo_ms = float(objetivo_ms)
+        if rondas is None:
+            rondas = calibrar_rondas(self.objetivo_ms)
+        self.rondas = max(RONDAS_MIN, int(rondas))
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> "ServicioHash":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def hashear(self, clave: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rondas)
+        return bcrypt.hashpw(clave.encode("utf-8"), salt).decode("utf-8")
+
+    @staticmethod
+    def verificar(clave: str, clave_hash: str) -> bool:
+        try:
+            return bcrypt.checkpw(clave.encode("utf-8"), clave_hash.encode("utf-8"))
+        except Exception:
+            return False
+
+    def verificar_con_rehash(self, clave: str, clave_hash: str) -> Verificacion:
+        if not self.verificar(clave, clave_hash):
+            return Verificacion(False)
+        # sólo se sube el costo: un hash hecho en una terminal más rápida no se degrada
+        rondas = rondas_de(clave_hash)
+        return Verificacion(True, rondas is None or rondas < self.rondas)
+
+    def rehashear(self, clave: str, guardar: Callable[[str], None]) -> Future:
+        # calcula el hash nuevo en el pool y se lo entrega a guardar() en ese mismo hilo:
+        # guardar() no debe escribir en una conexión que otro hilo tenga abierta
+        return self._pool().submit(lambda: guardar(self.hashear(clave)))
+
+    def hashear_lote(self, claves: Iterable[str]) -> List[str]:
+        return list(self.hashear_iter(claves))
+
+    def hashear_iter(self, claves: Iterable[str], ventana: Optional[int] = None) -> Iterator[str]:
+        # mantiene a lo sumo `ventana` hashes en vuelo y entrega en orden,
+        # así el consumidor recibe resultados mientras se calculan los siguientes
+        ventana = max(1, ventana or self.max_workers * 4)
+        pool = self._pool()
+        en_vuelo: Deque[Future] = deque()
+        for clave in claves:
+            en_vuelo.append(pool.submit(self.hashear, clave))
+            if len(en_vuelo) >= ventana:
+                yield en_vuelo.popleft().result()
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+
+    def cerrar(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def benchmark(rondas: int = 12, total: int = 64, workers: Optional[Iterable[int]] = None) -> Dict[int, float]:
+    nucleos = os.cpu_count() or 1
+    if workers is None:
+        workers = sorted({1, 2, max(1, nucleos // 2), nucleos})
+
+    resultados: Dict[int, float] = {}
+    for n in workers:
+        with ServicioHash(rondas=rondas, max_workers=n) as servicio:
+            inicio = time.perf_counter()
+            servicio.hashear_lote(["1234"] * total)
+            duracion = time.perf_counter() - inicio
+        resultados[n] = total / duracion if duracion > 0 else float("inf")
+        print(f"[INFO]: workers={n:>3} | {resultados[n]:8.1f} hashes/s")
+    return resultados
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark de hashing bcrypt en paralelo")
+    parser.add_argument("--rondas", type=int, default=12)
+    parser.add_argument("--total", type=int, default=64)
+    parser.add_argument("--objetivo-ms", type=float, default=None, help="sólo calibrar las rondas para esta latencia")
+    args = parser.parse_args()
+
+    if args.objetivo_ms is not None:
+        print(f"[INFO]: {calibrar_rondas(args.objetivo_ms)} rondas para ~{args.objetivo_ms:.0f} ms por hash")
+        raise SystemExit(0)
+
+    print(f"[INFO]: núcleos disponibles: {os.cpu_count()} | rondas: {args.rondas} | hashes por corrida: {args.total}")
+    benchmark(args.rondas, args.total)
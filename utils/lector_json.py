@@ -0,0 +1,122 @@
+import codecs
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+TAM_BLOQUE = 64 * 1024
+MAX_OBJETO = 16 * 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_ESPACIOS = " \t\r\n"
+
+
+def leer_json_stream(ruta: str, desde: int = 0, tam_bloque: int = TAM_BLOQUE) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lee un arreglo JSON o un archivo JSON Lines objeto por objeto.
+    Entrega (offset, objeto), donde offset es la posición en bytes justo
+    después del objeto; pasarlo como `desde` reanuda la lectura ahí.
+    """
+    with open(ruta, "rb") as f:
+        es_arreglo = _detectar_arreglo(f)
+        if desde <= 0:
+            # los offsets son en bytes del archivo: el BOM se salta con seek
+            desde = _offset_tras_corchete(f) if es_arreglo else _largo_bom(f)
+        f.seek(max(0, desde))
+
+        # utf-8-sig, igual que open(..., encoding="utf-8-sig"): un BOM nunca llega al parser
+        decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+        buffer = ""
+        base = max(0, desde)
+        fin_archivo = False
+
+        while True:
+            pos = 0
+            largo = len(buffer)
+            while pos < largo and (buffer[pos] in _ESPACIOS or (es_arreglo and buffer[pos] == ",")):
+                pos += 1
+
+            if pos < largo and es_arreglo and buffer[pos] == "]":
+                return
+
+            if pos < largo:
+                try:
+                    objeto, fin = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if fin_archivo:
+                        raise
+                    if largo - pos > MAX_OBJETO:
+                        raise ValueError(f"Objeto JSON mayor a {MAX_OBJETO} bytes cerca del offset {base}")
+                else:
+                    base += len(buffer[:fin].encode("utf-8"))
+                    buffer = buffer[fin:]
+                    yield base, objeto
+                    continue
+            else:
+                base += len(buffer[:pos].encode("utf-8"))
+                buffer = ""
+                if fin_archivo:
+                    if es_arreglo:
+                        # sin el "]" el archivo quedó truncado: no es un fin normal
+                        raise ValueError(f"Arreglo JSON sin ']' de cierre: el archivo termina en el offset {base}")
+                    return
+
+            datos = f.read(tam_bloque)
+            if not datos:
+                fin_archivo = True
+                buffer += decodificador.decode(b"", final=True)
+            else:
+                buffer += decodificador.decode(datos)
+
+
+def _detectar_arreglo(f) -> bool:
+    f.seek(0)
+    inicio = f.read(TAM_BLOQUE).lstrip(codecs.BOM_UTF8).lstrip()
+    return inicio.startswith(b"[")
+
+
+def _largo_bom(f) -> int:
+    f.seek(0)
+    return len(codecs.BOM_UTF8) if f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8 else 0
+
+
+def _offset_tras_corchete(f) -> int:
+    f.seek(0)
+    inicio = f.read(TAM_BLOQUE)
+    return inicio.index(b"[") + 1
+
+
+def agrupar(items: Iterator[Any], tam: int) -> Iterator[List[Any]]:
+    bloque: List[Any] = []
+    for item in items:
+        bloque.append(item)
+        if len(bloque) >= tam:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def leer_checkpoint(ruta_checkpoint: str) -> int:
+    if not os.path.exists(ruta_checkpoint):
+        return 0
+    try:
+        with open(ruta_checkpoint, "r", encoding="utf-8-sig") as f:
+            return int(f.read().strip() or 0)
+    except (ValueError, OSError):
+        return 0
+
+
+def guardar_checkpoint(ruta_checkpoint: str, offset: int) -> None:
+    temporal = ruta_checkpoint + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta_checkpoint)
+
+
+def borrar_checkpoint(ruta_checkpoint: str) -> None:
+    try:
+        os.remove(ruta_checkpoint)
+    except FileNotFoundError:
+        pass
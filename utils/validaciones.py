@@ -1,3 +1,16 @@
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List
+
+# separadores habituales en teléfonos, correos y RUT copiados de planillas
+_SEPARADORES_TELEFONO = str.maketrans("", "", " +-().\t/\xa0")
+_SEPARADORES_RUT = str.maketrans("", "", " .-\t\xa0")
+# no aparece en datos reales; si aparece, el lote se procesa valor a valor
+_SEP = "\x1f"
+
+_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+
 def normalizar_telefono(telefono: str) -> str:
     if not telefono:
         return ""
@@ -8,3 +21,111 @@ def normalizar_telefono(telefono: str) -> str:
         return solo_digitos[-9:]
 
     return solo_digitos
+
+
+def normalizar_email(email: str) -> str:
+    # "" si no parece un correo
+    if not email:
+        return ""
+
+    email = email.strip().lower()
+    return email if _EMAIL.fullmatch(email) else ""
+
+
+def normalizar_rut(rut: str) -> str:
+    # "12.345.678-5" -> "12345678-5" (K en mayúscula); "" si el dígito verificador no calza
+    if not rut:
+        return ""
+
+    return _rut_limpio(str(rut).translate(_SEPARADORES_RUT).upper())
+
+
+def _rut_limpio(rut: str) -> str:
+    cuerpo, dv = rut[:-1], rut[-1:]
+    if not cuerpo.isdigit() or not cuerpo.isascii() or dv != _digito_verificador(cuerpo):
+        return ""
+    return f"{int(cuerpo)}-{dv}"
+
+
+def _digito_verificador(cuerpo: str) -> str:
+    # módulo 11 con pesos 2..7 desde la derecha
+    suma = 0
+    peso = 2
+    for digito in reversed(cuerpo):
+        suma += int(digito) * peso
+        peso = peso + 1 if peso < 7 else 2
+    resto = 11 - suma % 11
+    return "0" if resto == 11 else "K" if resto == 10 else str(resto)
+
+
+# --- versiones por columna para cargas masivas ---
+# la columna entera se une en un solo string, se limpia con una pasada de
+# translate/lower en C y se vuelve a partir: el trabajo por valor queda en
+# un chequeo isdigit y un corte
+
+
+def _columna(valores: Iterable[Any]) -> List[str]:
+    return [v if isinstance(v, str) else str(v) if v else "" for v in valores]
+
+
+def _partir(columna: List[str], texto: str) -> List[str]:
+    partes = texto.split(_SEP)
+    return partes if len(partes) == len(columna) else []
+
+
+def normalizar_telefonos(telefonos: Iterable[Any]) -> List[str]:
+    columna = _columna(telefonos)
+    partes = _partir(columna, _SEP.join(columna).translate(_SEPARADORES_TELEFONO))
+    if not partes:
+        return [normalizar_telefono(t) for t in columna]
+    return [t[-9:] if t.isdigit() else normalizar_telefono(t) for t in partes]
+
+
+def normalizar_emails(emails: Iterable[Any]) -> List[str]:
+    columna = _columna(emails)
+    partes = _partir(columna, _SEP.join(columna).lower())
+    if not partes:
+        return [normalizar_email(e) for e in columna]
+    fullmatch = _EMAIL.fullmatch
+    return [e if fullmatch(e) else normalizar_email(e) for e in (p.strip() for p in partes)]
+
+
+def normalizar_ruts(ruts: Iterable[Any]) -> List[str]:
+    columna = _columna(ruts)
+    partes = _partir(columna, _SEP.join(columna).translate(_SEPARADORES_RUT).upper())
+    if not partes:
+        return [normalizar_rut(r) for r in columna]
+    return [_rut_limpio(r) if r else "" for r in partes]
+
+
+def benchmark(total: int = 1_000_000, repeticiones: int = 3) -> Dict[str, float]:
+    # compara normalizar_telefono valor a valor contra normalizar_telefonos
+    formatos = ["+56 9 {:04d} {:04d}", "(09) {:04d}-{:04d}", "9{:04d}{:04d}", "+569.{:04d}.{:04d}"]
+    telefonos = [formatos[i % len(formatos)].format(i % 10000, (i * 7) % 10000) for i in range(total)]
+
+    def medir(funcion: Callable[[], Any]) -> float:
+        mejor = float("inf")
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        return mejor
+
+    resultados = {
+        "valor_a_valor": medir(lambda: [normalizar_telefono(t) for t in telefonos]),
+        "columna": medir(lambda: normalizar_telefonos(telefonos)),
+    }
+    for nombre, segundos in resultados.items():
+        print(f"[INFO]: {nombre:>13} | {segundos * 1000:9.1f} ms | {total / segundos:12.0f} teléfonos/s")
+    return resultados
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark de normalización de teléfonos")
+    parser.add_argument("--total", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark(args.total, args.repeticiones)